@@ -1,75 +1,83 @@
-from flask import Flask, redirect, url_for, request
+import os
+import weakref
+from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
-from flask_login import LoginManager, current_user, UserMixin
-from flask_admin import Admin, AdminIndexView
-from flask_admin.contrib.sqla import ModelView
-from config import Config
+from flask_login import LoginManager
 from flask_mail import Mail # Importa Flask-Mail
-from itsdangerous import URLSafeTimedSerializer, SignatureExpired # Nueva importación
-
-# Inicialización de la aplicación Flask y sus extensiones
-app = Flask(__name__)
-app.config.from_object(Config)
+from config import Config
 
-db = SQLAlchemy(app)
-bcrypt = Bcrypt(app)
-login_manager = LoginManager(app)
-login_manager.login_view = 'login'
+# Extensiones sin aplicación asociada: create_app las inicializa con init_app.
+# Importar el paquete no crea motores de base de datos ni registra rutas, así que es barato y seguro
+# de hacer antes de un fork (gunicorn --preload 'app:create_app()').
+db = SQLAlchemy()
+bcrypt = Bcrypt()
+login_manager = LoginManager()
+login_manager.login_view = 'auth.login'
 login_manager.login_message_category = 'info'
 login_manager.login_message = "Por favor, inicia sesión para acceder a esta página."
-mail = Mail(app)
-
-# Crea una clase de vista de modelo personalizada para proteger las tablas
-class MyModelView(ModelView):
-    # Método que verifica si el usuario tiene permiso para acceder a la vista
-    def is_accessible(self):
-        # El acceso es permitido si el usuario está autenticado y su rol es 'admin'
-        return current_user.is_authenticated and current_user.rol == 'admin'
-    
-    # Método para manejar el caso cuando el usuario no tiene permisos
-    def inaccessible_callback(self, name, **kwargs):
-        # Redirige al usuario a la página de inicio de sesión
-        return redirect(url_for('login', next=request.url))
+mail = Mail()
 
-# Inicializa Flask-Admin y usa una vista personalizada para la página principal del panel
-class MyAdminIndexView(AdminIndexView):
-    def is_accessible(self):
-        return current_user.is_authenticated and current_user.rol == 'admin'
-        
-    def inaccessible_callback(self, name, **kwargs):
-        return redirect(url_for('login', next=request.url))
-
-admin = Admin(app, name='Panel de Administración', template_mode='bootstrap3', index_view=MyAdminIndexView())
-
-# Importar las rutas y los modelos después de inicializar las extensiones para evitar errores de importación circular
-from app import routes, models
 
 # Flask-Login necesita una función para cargar un usuario de la base de datos
 @login_manager.user_loader
 def load_user(user_id):
+    from app.identidad import cargar_usuario
+    # Una sola búsqueda, servida desde la caché de identidad cuando es posible.
     # Si el usuario no existe, devuelve None para indicar que la sesión es inválida
-    return Usuario.query.get(int(user_id)) if Usuario.query.get(int(user_id)) else None
+    return cargar_usuario(int(user_id))
+
+
+def _reiniciar_tras_fork(app):
+    # Los procesos hijos no deben reutilizar las conexiones del pool abiertas por el padre ni los hilos
+    # del pool de hash y del bucle asíncrono, que no sobreviven al fork: se descartan y cada hijo crea
+    # los suyos al usarlos
+    referencia = weakref.ref(app)
+
+    def despues_de_fork():
+        app = referencia()
+        if app is None:
+            return
+        app.extensions.pop('pool_hash', None)
+        app.extensions.pop('bucle_async', None)
+        with app.app_context():
+            for motor in db.engines.values():
+                motor.dispose(close=False)
+
+    os.register_at_fork(after_in_child=despues_de_fork)
+
+
+def create_app(config=Config):
+    app = Flask(__name__)
+    app.config.from_object(config)
+
+    db.init_app(app)
+    bcrypt.init_app(app)
+    login_manager.init_app(app)
+    mail.init_app(app)
+
+    # Los modelos y los módulos con eventos del ORM se importan aquí para evitar importaciones circulares
+    from app import models, fragmentos, identidad, descuentos, cache_http
+    from app import instrumentacion, estaticos, imagenes, sesiones, reposicion, comandos, vistas
 
-# Asegúrate de importar todos los modelos que quieres gestionar en el panel de administración
-from app.models import (Usuario, Producto, Categoria, Proveedor,
-                        VarianteProducto, ImagenProducto, Pedido,
-                        DetallePedido, CarritoCompras, DetalleCarrito,
-                        Resena, Descuento)
+    # Instrumentación por petición: tiempos de SQL y plantillas, Server-Timing, logs JSON y /metrics
+    instrumentacion.init_app(app)
+    # Archivos estáticos con huella de contenido, caché inmutable y versiones precomprimidas
+    estaticos.init_app(app)
+    # Variantes de las imágenes de producto, servidas desde el almacén direccionado por contenido
+    imagenes.init_app(app)
+    # Sesiones guardadas en el servidor (SQLite local o Redis); la cookie solo lleva el identificador
+    sesiones.init_app(app)
+    # Planificador de la evaluación de reposición de stock, si REPOSICION_INTERVALO_SEGUNDOS lo activa
+    reposicion.init_app(app)
+    # Rutas (blueprints auth, carrito, catalogo y la API JSON asíncrona) y comandos 'flask <grupo>'
+    vistas.init_app(app)
+    comandos.init_app(app)
 
-# Añade los modelos a Flask-Admin para crear la interfaz CRUD
-# Usa la clase MyModelView para proteger cada vista del panel
-admin.add_view(MyModelView(Usuario, db.session, name='Usuarios'))
-admin.add_view(MyModelView(Producto, db.session, name='Productos'))
-admin.add_view(MyModelView(Categoria, db.session, name='Categorías'))
-admin.add_view(MyModelView(Proveedor, db.session, name='Proveedores'))
-admin.add_view(MyModelView(VarianteProducto, db.session, name='Variantes de Producto'))
-admin.add_view(MyModelView(ImagenProducto, db.session, name='Imágenes de Producto'))
-admin.add_view(MyModelView(Pedido, db.session, name='Pedidos'))
-admin.add_view(MyModelView(DetallePedido, db.session, name='Detalles de Pedido'))
-admin.add_view(MyModelView(CarritoCompras, db.session, name='Carritos de Compras'))
-admin.add_view(MyModelView(DetalleCarrito, db.session, name='Detalles de Carrito'))
-admin.add_view(MyModelView(Resena, db.session, name='Reseñas'))
-admin.add_view(MyModelView(Descuento, db.session, name='Descuentos'))
+    # El panel de administración solo se importa y registra si está habilitado
+    if app.config['ADMIN_HABILITADO']:
+        from app import admin
+        admin.init_app(app)
 
-from app import routes
\ No newline at end of file
+    _reiniciar_tras_fork(app)
+    return app
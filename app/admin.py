@@ -0,0 +1,236 @@
+from datetime import date, timedelta
+from flask import current_app, redirect, url_for, request, Response, stream_with_context
+from flask_login import current_user
+from flask_admin import Admin, AdminIndexView, BaseView, expose
+from flask_admin.contrib.sqla import ModelView
+from sqlalchemy.orm import Query
+from app import db
+from app.models import (Usuario, Producto, Categoria, Proveedor,
+                        VarianteProducto, ImagenProducto, Pedido,
+                        DetallePedido, CarritoCompras, DetalleCarrito,
+                        Resena, Descuento)
+from app.analitica import DIMENSIONES, resumen_ventas, exportar_csv, estado_marca
+
+# Panel de administración. create_app solo importa este módulo si ADMIN_HABILITADO está activo,
+# así que Flask-Admin (y WTForms) no se cargan en los procesos que no sirven el panel.
+# Los listados están pensados para tablas grandes (pedidos y sus líneas pueden tener millones de filas):
+# - solo se ordena y filtra por columnas con índice (ver la migración 8d4f1a6c2e53);
+# - las relaciones que se muestran se cargan con joinedload en la misma consulta (column_select_related_list);
+# - el total de filas sin filtros se estima con pg_class.reltuples en lugar de un COUNT(*) de toda la tabla;
+# - la exportación CSV recorre la consulta por bloques con un cursor de servidor en lugar de cargarla entera.
+
+
+class ConteoEstimado:
+    # Sustituye a la consulta COUNT(*) de Flask-Admin. El listado le aplica los mismos filter() y join() que a
+    # una Query (se delegan en la consulta envuelta); al pedir el total con scalar():
+    # - sin filtros ni búsqueda, si la tabla tiene al menos ADMIN_CONTEO_ESTIMADO_MINIMO filas según las
+    #   estadísticas de PostgreSQL, se devuelve esa estimación;
+    # - con filtros, se cuentan como mucho ADMIN_CONTEO_MAXIMO filas (el paginador no pasa de ahí).
+    def __init__(self, consulta, tabla, filtrada=False):
+        self._consulta = consulta
+        self._tabla = tabla
+        self._filtrada = filtrada
+
+    def __getattr__(self, nombre):
+        atributo = getattr(self._consulta, nombre)
+        if not callable(atributo):
+            return atributo
+
+        def delegar(*args, **kwargs):
+            resultado = atributo(*args, **kwargs)
+            return ConteoEstimado(resultado, self._tabla, True) if isinstance(resultado, Query) else resultado
+        return delegar
+
+    def scalar(self):
+        config = current_app.config
+        sesion = self._consulta.session
+        if not self._filtrada:
+            estimacion = sesion.scalar(db.text('SELECT reltuples::bigint FROM pg_class '
+                                               'WHERE oid = CAST(:tabla AS regclass)'), {'tabla': self._tabla})
+            # reltuples es -1 si la tabla nunca se ha analizado
+            if estimacion is not None and estimacion >= config['ADMIN_CONTEO_ESTIMADO_MINIMO']:
+                return estimacion
+            consulta = self._consulta
+        else:
+            consulta = self._consulta.limit(config['ADMIN_CONTEO_MAXIMO'])
+        return sesion.query(db.func.count()).select_from(consulta.subquery()).scalar()
+
+
+# Crea una clase de vista de modelo personalizada para proteger las tablas
+class MyModelView(ModelView):
+    can_export = True
+    page_size = 50
+
+    # Método que verifica si el usuario tiene permiso para acceder a la vista
+    def is_accessible(self):
+        # El acceso es permitido si el usuario está autenticado y su rol es 'admin'
+        return current_user.is_authenticated and current_user.rol == 'admin'
+
+    # Método para manejar el caso cuando el usuario no tiene permisos
+    def inaccessible_callback(self, name, **kwargs):
+        # Redirige al usuario a la página de inicio de sesión
+        return redirect(url_for('auth.login', next=request.url))
+
+    def get_count_query(self):
+        return ConteoEstimado(self.session.query(db.literal(1)).select_from(self.model), self.model.__tablename__)
+
+    def _export_data(self):
+        # Como en Flask-Admin, pero sin ejecutar la consulta: _export_csv la recorre mientras escribe la respuesta
+        # y yield_per la lee por bloques con un cursor de servidor
+        view_args = self._get_list_extra_args()
+        sort_column = self._get_column_by_idx(view_args.sort)
+        if sort_column is not None:
+            sort_column = sort_column[0]
+        count, consulta = self.get_list(0, sort_column, view_args.sort_desc, view_args.search, view_args.filters,
+                                        execute=False, page_size=self.export_max_rows)
+        return count, consulta.yield_per(current_app.config['ADMIN_EXPORTAR_LOTE'])
+
+
+class UsuarioView(MyModelView):
+    column_list = ('id', 'nombre', 'email', 'rol', 'email_confirmado', 'creado_en')
+    column_sortable_list = ('id', 'email', 'creado_en')
+    column_filters = ('rol', 'email_confirmado')
+    column_default_sort = ('id', True)
+    column_export_exclude_list = ('password_hash',)
+
+
+class ProductoView(MyModelView):
+    column_list = ('id', 'sku', 'nombre', 'categoria.nombre', 'proveedor.nombre', 'precio_venta', 'stock',
+                   'num_resenas', 'calificacion_promedio')
+    column_labels = {'categoria.nombre': 'Categoría', 'proveedor.nombre': 'Proveedor'}
+    column_select_related_list = (Producto.categoria, Producto.proveedor)
+    column_sortable_list = ('id', 'sku', 'nombre', 'calificacion_promedio')
+    column_filters = ('id_categoria', 'id_proveedor')
+    column_default_sort = ('id', True)
+    column_export_list = ('id', 'sku', 'nombre', 'descripcion', 'categoria.nombre', 'proveedor.nombre',
+                          'precio_compra', 'precio_venta', 'stock', 'num_resenas', 'calificacion_promedio')
+    # Columnas calculadas o mantenidas por triggers y relaciones con muchas filas: fuera del formulario
+    form_excluded_columns = ('busqueda', 'num_resenas', 'suma_calificaciones', 'calificacion_promedio',
+                             'pedidos_detalle', 'resenas', 'carrito_detalle')
+
+
+class VarianteProductoView(MyModelView):
+    column_list = ('id', 'producto.nombre', 'nombre_variante', 'valor_variante', 'precio_adicional',
+                   'stock_variante')
+    column_labels = {'producto.nombre': 'Producto'}
+    column_select_related_list = (VarianteProducto.producto,)
+    column_sortable_list = ('id',)
+    column_filters = ('id_producto',)
+
+
+class ImagenProductoView(MyModelView):
+    column_list = ('id', 'producto.nombre', 'url_imagen', 'es_principal', 'procesada_en')
+    column_labels = {'producto.nombre': 'Producto'}
+    column_select_related_list = (ImagenProducto.producto,)
+    column_sortable_list = ('id',)
+    column_filters = ('id_producto',)
+    form_excluded_columns = ('hash_contenido', 'variantes', 'procesada_en')
+
+
+class PedidoView(MyModelView):
+    column_list = ('id', 'fecha', 'id_usuario', 'total', 'estado_pedido', 'metodo_pago', 'metodo_envio',
+                   'numero_seguimiento')
+    column_sortable_list = ('id', 'fecha')
+    column_filters = ('estado_pedido', 'fecha', 'id_usuario')
+    column_default_sort = ('fecha', True)
+
+
+class DetallePedidoView(MyModelView):
+    column_list = ('id', 'id_pedido', 'producto.nombre', 'cantidad', 'precio_unitario')
+    column_labels = {'producto.nombre': 'Producto'}
+    column_select_related_list = (DetallePedido.producto,)
+    column_sortable_list = ('id', 'id_pedido')
+    column_filters = ('id_pedido', 'id_producto')
+    column_default_sort = ('id', True)
+
+
+class CarritoComprasView(MyModelView):
+    column_list = ('id', 'id_usuario', 'creado_en')
+    column_sortable_list = ('id',)
+    column_filters = ('id_usuario',)
+
+
+class DetalleCarritoView(MyModelView):
+    column_list = ('id', 'id_carrito', 'producto.nombre', 'cantidad')
+    column_labels = {'producto.nombre': 'Producto'}
+    column_select_related_list = (DetalleCarrito.producto,)
+    column_sortable_list = ('id',)
+    column_filters = ('id_carrito',)
+
+
+class ResenaView(MyModelView):
+    column_list = ('id', 'producto.nombre', 'id_usuario', 'calificacion', 'comentario', 'fecha_resena')
+    column_labels = {'producto.nombre': 'Producto'}
+    column_select_related_list = (Resena.producto,)
+    column_sortable_list = ('id',)
+    column_filters = ('id_producto', 'id_usuario')
+    column_default_sort = ('id', True)
+
+
+# Vista personalizada para la página principal del panel
+class MyAdminIndexView(AdminIndexView):
+    def is_accessible(self):
+        return current_user.is_authenticated and current_user.rol == 'admin'
+
+    def inaccessible_callback(self, name, **kwargs):
+        return redirect(url_for('auth.login', next=request.url))
+
+
+# Panel de ventas: se sirve desde los agregados diarios (app/analitica.py), no desde las líneas de pedido
+class VentasView(BaseView):
+    def is_accessible(self):
+        return current_user.is_authenticated and current_user.rol == 'admin'
+
+    def inaccessible_callback(self, name, **kwargs):
+        return redirect(url_for('auth.login', next=request.url))
+
+    def _filtros(self):
+        dimension = request.args.get('dimension', 'categoria')
+        dimension = dimension if dimension in DIMENSIONES else 'categoria'
+        hasta = _leer_fecha(request.args.get('hasta')) or date.today()
+        desde = _leer_fecha(request.args.get('desde')) or hasta - timedelta(days=29)
+        return dimension, desde, hasta
+
+    @expose('/')
+    def index(self):
+        dimension, desde, hasta = self._filtros()
+        filas = resumen_ventas(dimension, desde, hasta, limite=500)
+        totales = {medida: sum((getattr(fila, medida) or 0 for fila in filas), 0)
+                   for medida in ('unidades', 'ingresos', 'coste', 'margen')}
+        return self.render('admin/ventas.html', filas=filas, totales=totales, dimension=dimension,
+                           dimensiones=DIMENSIONES, desde=desde, hasta=hasta, marca=estado_marca())
+
+    @expose('/csv')
+    def csv(self):
+        dimension, desde, hasta = self._filtros()
+        nombre = f'ventas_{dimension}_{desde.isoformat()}_{hasta.isoformat()}.csv'
+        return Response(stream_with_context(exportar_csv(dimension, desde, hasta)), mimetype='text/csv',
+                        headers={'Content-Disposition': f'attachment; filename={nombre}'})
+
+
+def _leer_fecha(texto):
+    try:
+        return date.fromisoformat(texto) if texto else None
+    except ValueError:
+        return None
+
+
+def init_app(app):
+    admin = Admin(app, name='Panel de Administración', template_mode='bootstrap3', index_view=MyAdminIndexView())
+
+    # Añade los modelos a Flask-Admin para crear la interfaz CRUD
+    # Usa la clase MyModelView para proteger cada vista del panel
+    admin.add_view(UsuarioView(Usuario, db.session, name='Usuarios'))
+    admin.add_view(ProductoView(Producto, db.session, name='Productos'))
+    admin.add_view(MyModelView(Categoria, db.session, name='Categorías'))
+    admin.add_view(MyModelView(Proveedor, db.session, name='Proveedores'))
+    admin.add_view(VarianteProductoView(VarianteProducto, db.session, name='Variantes de Producto'))
+    admin.add_view(ImagenProductoView(ImagenProducto, db.session, name='Imágenes de Producto'))
+    admin.add_view(PedidoView(Pedido, db.session, name='Pedidos'))
+    admin.add_view(DetallePedidoView(DetallePedido, db.session, name='Detalles de Pedido'))
+    admin.add_view(CarritoComprasView(CarritoCompras, db.session, name='Carritos de Compras'))
+    admin.add_view(DetalleCarritoView(DetalleCarrito, db.session, name='Detalles de Carrito'))
+    admin.add_view(ResenaView(Resena, db.session, name='Reseñas'))
+    admin.add_view(MyModelView(Descuento, db.session, name='Descuentos'))
+    admin.add_view(VentasView(name='Ventas', endpoint='ventas'))
+    return admin
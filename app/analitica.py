@@ -0,0 +1,152 @@
+import csv
+import io
+from datetime import timedelta
+from flask import current_app
+from app import db
+from app.models import VentaDiaria, Producto, Categoria, Proveedor
+
+# Agregados de ventas para los paneles de administración.
+# La tabla ventas_diarias guarda, por día y producto, las líneas, unidades, ingresos y coste vendidos, con la
+# categoría y el proveedor del producto copiados; los informes por producto, categoría, proveedor o día agrupan
+# esas filas (unas pocas por producto y día) en lugar de recorrer todas las líneas de pedido.
+# La actualización es incremental: la marca de agua 'ventas_diarias' guarda hasta cuándo se agregó. Cada
+# ejecución recalcula completos los días desde (marca - ANALITICA_RETRASO_MINUTOS), porque Pedido.fecha la pone
+# la aplicación antes del COMMIT y un pedido puede hacerse visible con una fecha algo anterior a la marca.
+# Borrar y reinsertar esos días en una transacción hace la actualización idempotente; los lectores siguen
+# viendo los agregados anteriores hasta el COMMIT. La fila de la marca se bloquea con FOR UPDATE para que dos
+# ejecuciones simultáneas no se solapen.
+
+MARCA = 'ventas_diarias'
+DIMENSIONES = ('dia', 'producto', 'categoria', 'proveedor')
+
+_AGREGAR = """
+    INSERT INTO ventas_diarias (dia, id_producto, id_categoria, id_proveedor, lineas, unidades, ingresos, coste)
+    SELECT (p.fecha AT TIME ZONE :zona)::date, d.id_producto, pr.id_categoria, pr.id_proveedor,
+           count(*), sum(d.cantidad), sum(d.cantidad * d.precio_unitario), sum(d.cantidad * pr.precio_compra)
+    FROM pedidos p
+    JOIN detalle_pedidos d ON d.id_pedido = p.id
+    JOIN productos pr ON pr.id = d.id_producto
+    WHERE p.fecha >= (CAST(:desde AS date)::timestamp AT TIME ZONE :zona)
+      AND coalesce(p.estado_pedido, '') <> ALL(CAST(:excluidos AS text[]))
+    GROUP BY 1, 2, 3, 4
+"""
+
+
+def actualizar_ventas(reconstruir=False):
+    # Agrega los pedidos nuevos en ventas_diarias; devuelve {'desde': primer día recalculado, 'filas': n}.
+    # reconstruir=True recalcula todo el histórico (por ejemplo tras cancelar pedidos antiguos).
+    config = current_app.config
+    marca = db.session.scalar(db.text('SELECT valor FROM marcas_agua WHERE nombre = :nombre FOR UPDATE'),
+                              {'nombre': MARCA})
+    hasta = db.session.scalar(db.text('SELECT now()'))
+
+    if reconstruir or marca is None:
+        desde = db.session.scalar(db.text('SELECT (min(fecha) AT TIME ZONE :zona)::date FROM pedidos'),
+                                  {'zona': config['ANALITICA_ZONA_HORARIA']})
+    else:
+        desde = db.session.scalar(db.text('SELECT (CAST(:instante AS timestamptz) AT TIME ZONE :zona)::date'),
+                                  {'instante': marca - timedelta(minutes=config['ANALITICA_RETRASO_MINUTOS']),
+                                   'zona': config['ANALITICA_ZONA_HORARIA']})
+
+    filas = 0
+    if desde is not None:
+        db.session.execute(db.delete(VentaDiaria).where(VentaDiaria.dia >= desde))
+        filas = db.session.execute(db.text(_AGREGAR), {
+            'desde': desde,
+            'zona': config['ANALITICA_ZONA_HORARIA'],
+            'excluidos': list(config['ANALITICA_ESTADOS_EXCLUIDOS']),
+        }).rowcount
+    db.session.execute(db.text('UPDATE marcas_agua SET valor = :hasta, actualizado_en = now() '
+                               'WHERE nombre = :nombre'), {'hasta': hasta, 'nombre': MARCA})
+    db.session.commit()
+    return {'desde': desde, 'filas': filas}
+
+
+def estado_marca():
+    return db.session.execute(db.text('SELECT valor, actualizado_en FROM marcas_agua WHERE nombre = :nombre'),
+                              {'nombre': MARCA}).mappings().first()
+
+
+def _medidas(unidades, ingresos, coste):
+    return (db.func.sum(unidades).label('unidades'),
+            db.func.sum(ingresos).label('ingresos'),
+            db.func.sum(coste).label('coste'),
+            (db.func.sum(ingresos) - db.func.sum(coste)).label('margen'))
+
+
+def consulta_resumen(dimension, desde, hasta):
+    # Ventas agregadas desde ventas_diarias entre dos días (incluidos), una fila por clave de la dimensión:
+    # (clave, nombre, unidades, ingresos, coste, margen), ordenadas por ingresos salvo la dimensión 'dia'
+    medidas = _medidas(VentaDiaria.unidades, VentaDiaria.ingresos, VentaDiaria.coste)
+    if dimension == 'dia':
+        consulta = db.select(VentaDiaria.dia.label('clave'), db.null().label('nombre'), *medidas)
+    elif dimension == 'producto':
+        consulta = (db.select(VentaDiaria.id_producto.label('clave'), Producto.nombre.label('nombre'), *medidas)
+                    .join(Producto, Producto.id == VentaDiaria.id_producto))
+    elif dimension == 'categoria':
+        consulta = (db.select(VentaDiaria.id_categoria.label('clave'), Categoria.nombre.label('nombre'), *medidas)
+                    .outerjoin(Categoria, Categoria.id == VentaDiaria.id_categoria))
+    elif dimension == 'proveedor':
+        consulta = (db.select(VentaDiaria.id_proveedor.label('clave'), Proveedor.nombre.label('nombre'), *medidas)
+                    .outerjoin(Proveedor, Proveedor.id == VentaDiaria.id_proveedor))
+    else:
+        raise ValueError(f'Dimensión desconocida: {dimension}')
+
+    consulta = consulta.where(VentaDiaria.dia.between(desde, hasta)).group_by(db.text('1, 2'))
+    return consulta.order_by(db.text('1') if dimension == 'dia' else db.text('ingresos DESC, 1'))
+
+
+def resumen_ventas(dimension, desde, hasta, limite=None):
+    consulta = consulta_resumen(dimension, desde, hasta)
+    if limite:
+        consulta = consulta.limit(limite)
+    return db.session.execute(consulta).all()
+
+
+def resumen_en_bruto(dimension, desde, hasta):
+    # El mismo informe calculado directamente sobre pedidos y líneas de pedido. Solo se usa para comprobar los
+    # agregados y en el benchmark (benchmarks/bench_analitica.py): recorre todas las líneas del periodo.
+    config = current_app.config
+    clave, nombre, union = {
+        'dia': ('(p.fecha AT TIME ZONE :zona)::date', 'NULL', ''),
+        'producto': ('pr.id', 'pr.nombre', ''),
+        'categoria': ('pr.id_categoria', 'c.nombre', 'LEFT JOIN categorias c ON c.id = pr.id_categoria'),
+        'proveedor': ('pr.id_proveedor', 'pv.nombre', 'LEFT JOIN proveedores pv ON pv.id = pr.id_proveedor'),
+    }[dimension]
+    sql = f"""
+        SELECT {clave} AS clave, {nombre} AS nombre, sum(d.cantidad) AS unidades,
+               sum(d.cantidad * d.precio_unitario) AS ingresos, sum(d.cantidad * pr.precio_compra) AS coste,
+               sum(d.cantidad * d.precio_unitario) - sum(d.cantidad * pr.precio_compra) AS margen
+        FROM pedidos p
+        JOIN detalle_pedidos d ON d.id_pedido = p.id
+        JOIN productos pr ON pr.id = d.id_producto
+        {union}
+        WHERE p.fecha >= (CAST(:desde AS date)::timestamp AT TIME ZONE :zona)
+          AND p.fecha < ((CAST(:hasta AS date) + 1)::timestamp AT TIME ZONE :zona)
+          AND coalesce(p.estado_pedido, '') <> ALL(CAST(:excluidos AS text[]))
+        GROUP BY 1, 2
+        ORDER BY {'1' if dimension == 'dia' else 'ingresos DESC, 1'}
+    """
+    return db.session.execute(db.text(sql), {
+        'desde': desde, 'hasta': hasta, 'zona': config['ANALITICA_ZONA_HORARIA'],
+        'excluidos': list(config['ANALITICA_ESTADOS_EXCLUIDOS']),
+    }).all()
+
+
+def exportar_csv(dimension, desde, hasta, lote=2000):
+    # Generador de líneas CSV para una respuesta en streaming; lee los agregados por bloques
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+
+    def vaciar():
+        datos = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return datos
+
+    escritor.writerow([dimension, 'nombre', 'unidades', 'ingresos', 'coste', 'margen'])
+    yield vaciar()
+    resultado = db.session.execute(consulta_resumen(dimension, desde, hasta).execution_options(yield_per=lote))
+    for bloque in resultado.partitions():
+        escritor.writerows(bloque)
+        yield vaciar()
@@ -0,0 +1,78 @@
+import asyncio
+import threading
+from flask import current_app
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+# Acceso asíncrono a la base de datos para la API JSON (/api/v1).
+# Las vistas asíncronas de Flask se ejecutan cada una en un bucle de eventos nuevo, y las conexiones de asyncpg
+# pertenecen al bucle que las creó, así que un pool no podría compartirse entre peticiones. Por eso cada
+# proceso mantiene un único bucle en un hilo propio con un motor create_async_engine (asyncpg) y su pool;
+# las vistas le envían corrutinas y esperan el resultado sin bloquear su propio bucle.
+# consultar_en_paralelo() abre una sesión (y una conexión) por consulta y las lanza con asyncio.gather, de
+# modo que, por ejemplo, el producto, sus variantes, imágenes y reseñas se leen a la vez.
+# Tras un fork el hilo no existe en el hijo: create_app descarta el bucle y el hijo crea el suyo al usarlo.
+
+
+class BucleAsincrono:
+    def __init__(self, url, opciones):
+        self.bucle = asyncio.new_event_loop()
+        self._hilo = threading.Thread(target=self.bucle.run_forever, name='bucle-api-async', daemon=True)
+        self._hilo.start()
+        self.motor = create_async_engine(url, **opciones)
+        self.sesiones = async_sessionmaker(self.motor, expire_on_commit=False)
+
+    async def _ejecutar(self, funcion, *args):
+        # Cada llamada usa su propia sesión: una AsyncSession no admite consultas concurrentes
+        async with self.sesiones() as sesion:
+            return await funcion(sesion, *args)
+
+    async def _en_paralelo(self, llamadas):
+        return await asyncio.gather(*(self._ejecutar(funcion, *args) for funcion, *args in llamadas))
+
+    def enviar(self, corrutina):
+        # Programa la corrutina en el bucle del hilo y devuelve un concurrent.futures.Future
+        return asyncio.run_coroutine_threadsafe(corrutina, self.bucle)
+
+
+def url_asincrona(url):
+    # La misma base de datos que SQLALCHEMY_DATABASE_URI, con el controlador asyncpg
+    return make_url(url).set(drivername='postgresql+asyncpg')
+
+
+_candado = threading.Lock()
+
+
+def _bucle():
+    bucle = current_app.extensions.get('bucle_async')
+    if bucle is None:
+        with _candado:
+            bucle = current_app.extensions.get('bucle_async')
+            if bucle is None:
+                config = current_app.config
+                url = config['API_ASYNC_DATABASE_URI'] or url_asincrona(config['SQLALCHEMY_DATABASE_URI'])
+                bucle = BucleAsincrono(url, {
+                    'pool_size': config['API_ASYNC_POOL_SIZE'],
+                    'max_overflow': config['API_ASYNC_MAX_OVERFLOW'],
+                    'pool_recycle': config['BD_POOL_RECYCLE'],
+                    'pool_timeout': config['BD_POOL_TIMEOUT'],
+                    'pool_pre_ping': config['BD_POOL_PRE_PING'],
+                    'connect_args': {'server_settings': {
+                        'application_name': f"{config['BD_APPLICATION_NAME']}-api",
+                        'statement_timeout': str(config['BD_STATEMENT_TIMEOUT_MS']),
+                    }},
+                })
+                current_app.extensions['bucle_async'] = bucle
+    return bucle
+
+
+async def consultar(funcion, *args):
+    # Ejecuta 'await funcion(sesion, *args)' en el bucle de la base de datos y devuelve su resultado
+    bucle = _bucle()
+    return await asyncio.wrap_future(bucle.enviar(bucle._ejecutar(funcion, *args)))
+
+
+async def consultar_en_paralelo(*llamadas):
+    # Cada llamada es una tupla (funcion, *args); devuelve los resultados en el mismo orden
+    bucle = _bucle()
+    return await asyncio.wrap_future(bucle.enviar(bucle._en_paralelo(llamadas)))
@@ -0,0 +1,35 @@
+from flask import current_app
+from app import db
+from app.models import Producto
+from app.catalogo import opciones_lectura
+
+# Búsqueda de productos.
+# Combina dos criterios, ambos resueltos con índices GIN:
+#   - texto completo en español sobre la columna generada 'busqueda' (nombre con peso A, descripción con peso B),
+#     sin acentos gracias a inmutable_unaccent();
+#   - similitud por trigramas sobre el nombre (operador <% de pg_trgm) para tolerar errores como "lapis" -> "lápiz".
+# Los resultados se ordenan por relevancia del texto completo y luego por similitud.
+
+
+def buscar_productos(texto, limite=None):
+    # Devuelve una lista de tuplas (producto, rango, similitud)
+    texto = (texto or '').strip()
+    if not texto:
+        return []
+    limite = max(1, min(limite or current_app.config['BUSQUEDA_LIMITE'], current_app.config['CATALOGO_MAX_POR_PAGINA']))
+
+    consulta_ts = db.func.websearch_to_tsquery('spanish', db.func.inmutable_unaccent(texto))
+    texto_normalizado = db.func.inmutable_unaccent(db.func.lower(texto))
+    nombre_normalizado = db.func.inmutable_unaccent(db.func.lower(Producto.nombre))
+
+    rango = db.func.ts_rank_cd(Producto.busqueda, consulta_ts)
+    similitud = db.func.word_similarity(texto_normalizado, nombre_normalizado)
+
+    consulta = (
+        db.select(Producto, rango.label('rango'), similitud.label('similitud'))
+        .where(db.or_(Producto.busqueda.op('@@')(consulta_ts),
+                      texto_normalizado.op('<%')(nombre_normalizado)))
+        .order_by(rango.desc(), similitud.desc(), Producto.id)
+        .limit(limite)
+    )
+    return db.session.execute(consulta, bind_arguments=opciones_lectura()).all()
@@ -0,0 +1,119 @@
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import redis
+except ImportError:  # Redis es opcional; solo se necesita con el backend 'redis'
+    redis = None
+
+# Backends de caché intercambiables.
+# CacheLRU vive en la memoria del proceso (cada proceso de gunicorn tiene la suya); CacheRedis usa un
+# servidor compatible con Redis compartido entre procesos. Ambos ofrecen la misma interfaz:
+# obtener/obtener_varios/guardar/eliminar para valores y contador/contadores/incrementar para
+# contadores de versión, que nunca expiran ni se desalojan.
+
+
+class CacheLRU:
+    # Caché con expiración (TTL) y desalojo del elemento menos usado (LRU), segura entre hilos
+    def __init__(self, maximo=1024, ttl=60):
+        self.maximo = maximo
+        self.ttl = ttl
+        self._datos = OrderedDict()
+        self._contadores = {}
+        self._candado = threading.Lock()
+
+    def obtener(self, clave):
+        # Devuelve el valor guardado o None si no existe o ya expiró
+        with self._candado:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return None
+            valor, expira = entrada
+            if expira is not None and expira < time.monotonic():
+                del self._datos[clave]
+                return None
+            self._datos.move_to_end(clave)
+            return valor
+
+    def obtener_varios(self, claves):
+        return [self.obtener(clave) for clave in claves]
+
+    def guardar(self, clave, valor, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expira = time.monotonic() + ttl if ttl else None
+        with self._candado:
+            self._datos[clave] = (valor, expira)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.maximo:
+                self._datos.popitem(last=False)
+
+    def eliminar(self, clave):
+        with self._candado:
+            self._datos.pop(clave, None)
+
+    def limpiar(self):
+        with self._candado:
+            self._datos.clear()
+            self._contadores.clear()
+
+    def contador(self, clave):
+        return self._contadores.get(clave, 0)
+
+    def contadores(self, claves):
+        return [self._contadores.get(clave, 0) for clave in claves]
+
+    def incrementar(self, clave):
+        with self._candado:
+            self._contadores[clave] = self._contadores.get(clave, 0) + 1
+            return self._contadores[clave]
+
+    def __len__(self):
+        return len(self._datos)
+
+
+class CacheRedis:
+    # Caché sobre un cliente compatible con Redis (redis.Redis o un sustituto local en pruebas)
+    def __init__(self, cliente, prefijo='tienda:', ttl=300):
+        self.cliente = cliente
+        self.prefijo = prefijo
+        self.ttl = ttl
+
+    @classmethod
+    def desde_url(cls, url, **kwargs):
+        if redis is None:
+            raise RuntimeError('El backend de caché "redis" requiere el paquete redis (pip install redis).')
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def _clave(self, clave):
+        return f'{self.prefijo}{clave}'
+
+    @staticmethod
+    def _texto(valor):
+        return valor.decode('utf-8') if isinstance(valor, bytes) else valor
+
+    def obtener(self, clave):
+        return self._texto(self.cliente.get(self._clave(clave)))
+
+    def obtener_varios(self, claves):
+        if not claves:
+            return []
+        return [self._texto(valor) for valor in self.cliente.mget([self._clave(c) for c in claves])]
+
+    def guardar(self, clave, valor, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        self.cliente.set(self._clave(clave), valor, ex=ttl or None)
+
+    def eliminar(self, clave):
+        self.cliente.delete(self._clave(clave))
+
+    def contador(self, clave):
+        return int(self.cliente.get(self._clave(clave)) or 0)
+
+    def contadores(self, claves):
+        if not claves:
+            return []
+        return [int(valor or 0) for valor in self.cliente.mget([self._clave(c) for c in claves])]
+
+    def incrementar(self, clave):
+        return self.cliente.incr(self._clave(clave))
@@ -0,0 +1,107 @@
+import hashlib
+from flask import request, session, make_response
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from app import db
+from app.estaticos import huella_construccion
+from app.models import Producto, ImagenProducto, VarianteProducto, Resena
+
+# Modelos cuyas escrituras cambian las páginas del catálogo
+MODELOS_CATALOGO = (Producto, ImagenProducto, VarianteProducto, Resena)
+
+# Respuestas condicionales (ETag) para las páginas del catálogo.
+# La secuencia version_catalogo_seq avanza después del COMMIT de cada escritura en productos, imagenes_producto,
+# variantes_producto o resenas (que actualiza el resumen de reseñas del producto). El ETag combina esa versión
+# con la URL y el usuario, así que si el navegador envía un If-None-Match que coincide, se responde 304 sin
+# consultar productos ni renderizar.
+# La versión no puede avanzar antes del COMMIT: nextval() es visible para las demás sesiones en el acto, y una
+# petición que leyera la versión nueva junto con las filas anteriores guardaría la página antigua con el ETag
+# nuevo, que seguiría validándose hasta la siguiente escritura. Por eso los cambios del ORM solo se anotan en
+# session.info y la secuencia se incrementa tras el COMMIT (o nada, si la transacción se deshace). Las
+# escrituras con SQL que no pasan por la sesión deben llamar a incrementar_version_catalogo() tras su COMMIT.
+# También incluye la huella de lo desplegado (estáticos, plantillas y VERSION_APLICACION): tras un despliegue
+# las páginas guardadas, que enlazan a los estáticos anteriores por su huella, dejan de validarse.
+
+
+def version_catalogo():
+    # Se lee siempre del servidor principal: en una réplica, last_value solo avanza cada 32 valores
+    # (PostgreSQL registra las secuencias en el WAL por bloques). Con réplica, una página generada durante
+    # el retraso de replicación puede conservar su ETag hasta la siguiente escritura del catálogo.
+    return db.session.scalar(db.text('SELECT last_value FROM version_catalogo_seq'))
+
+
+def incrementar_version_catalogo():
+    # En su propia conexión: se llama después del COMMIT, cuando la sesión ya no puede ejecutar SQL
+    with db.engine.connect() as conexion:
+        conexion.execute(db.text("SELECT nextval('version_catalogo_seq')"))
+
+
+def etag_catalogo(*extra):
+    usuario = current_user.get_id() if current_user.is_authenticated else 'anonimo'
+    partes = [huella_construccion(), str(version_catalogo()), request.full_path, usuario]
+    partes += [str(parte) for parte in extra]
+    return hashlib.sha1('|'.join(partes).encode('utf-8')).hexdigest()
+
+
+def no_modificado(etag):
+    # Los mensajes flash pendientes cambian la página aunque el catálogo no haya cambiado
+    if session.get('_flashes'):
+        return False
+    return request.if_none_match.contains(etag)
+
+
+def respuesta_304(etag):
+    respuesta = make_response('', 304)
+    return con_etag(respuesta, etag)
+
+
+def con_etag(respuesta, etag):
+    # private: la página depende de la sesión; no-cache: el navegador puede guardarla pero debe revalidarla
+    respuesta = make_response(respuesta)
+    respuesta.set_etag(etag)
+    respuesta.headers['Cache-Control'] = 'private, no-cache'
+    respuesta.vary.add('Cookie')
+    return respuesta
+
+
+# Escrituras a través de la sesión: objetos del ORM (eventos del mapper, en el flush) y sentencias
+# db.insert/update/delete de los modelos del catálogo ejecutadas con session.execute (do_orm_execute)
+def marcar_catalogo_modificado(sesion):
+    sesion.info['catalogo_modificado'] = True
+
+
+@event.listens_for(Producto, 'after_insert')
+@event.listens_for(Producto, 'after_update')
+@event.listens_for(Producto, 'after_delete')
+@event.listens_for(ImagenProducto, 'after_insert')
+@event.listens_for(ImagenProducto, 'after_update')
+@event.listens_for(ImagenProducto, 'after_delete')
+@event.listens_for(VarianteProducto, 'after_insert')
+@event.listens_for(VarianteProducto, 'after_update')
+@event.listens_for(VarianteProducto, 'after_delete')
+@event.listens_for(Resena, 'after_insert')
+@event.listens_for(Resena, 'after_update')
+@event.listens_for(Resena, 'after_delete')
+def _objeto_modificado(mapper, connection, target):
+    sesion = object_session(target)
+    if sesion is not None:
+        marcar_catalogo_modificado(sesion)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _sentencia_de_catalogo(estado):
+    if (estado.is_insert or estado.is_update or estado.is_delete) and estado.bind_mapper is not None \
+            and estado.bind_mapper.class_ in MODELOS_CATALOGO:
+        marcar_catalogo_modificado(estado.session)
+
+
+@event.listens_for(Session, 'after_commit')
+def _incrementar_tras_commit(sesion):
+    if sesion.info.pop('catalogo_modificado', False):
+        incrementar_version_catalogo()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_tras_rollback(sesion):
+    sesion.info.pop('catalogo_modificado', None)
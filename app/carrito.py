@@ -0,0 +1,243 @@
+from collections import namedtuple
+from decimal import Decimal
+from flask import current_app, session
+from sqlalchemy import values, column, Integer
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import contains_eager
+from app import db
+from app.models import Producto, CarritoCompras, DetalleCarrito
+
+# Consultas y operaciones del carrito de compras.
+# Las líneas del carrito se cargan junto con sus productos en una sola consulta (JOIN),
+# evitando un SELECT adicional por cada línea al acceder a detalle.producto.
+# Las modificaciones (añadir, actualizar, eliminar) se hacen con una única sentencia SQL cada una,
+# de modo que dos clics simultáneos no compiten por la restricción única (id_carrito, id_producto).
+#
+# Los visitantes sin cuenta guardan su carrito en la sesión como {id_producto: cantidad}; al iniciar sesión
+# se fusiona con el carrito de la base de datos en una sola sentencia. El número de artículos que muestra
+# la barra de navegación también vive en la sesión ('carrito_cantidad'), así que renderizarlo no consulta
+# PostgreSQL: se recalcula solo cuando el propio usuario modifica su carrito.
+
+LineaCarrito = namedtuple('LineaCarrito', 'producto cantidad')
+
+
+def consulta_detalles_carrito(id_usuario):
+    # Las líneas del carrito del usuario con su producto ya cargado (también la usa la API asíncrona)
+    return (
+        db.select(DetalleCarrito)
+        .join(CarritoCompras, DetalleCarrito.id_carrito == CarritoCompras.id)
+        .join(DetalleCarrito.producto)
+        .options(contains_eager(DetalleCarrito.producto))
+        .where(CarritoCompras.id_usuario == id_usuario)
+        .order_by(DetalleCarrito.id)
+    )
+
+
+def obtener_detalles_carrito(id_usuario):
+    return db.session.scalars(consulta_detalles_carrito(id_usuario)).all()
+
+
+def calcular_total_carrito(id_usuario):
+    # Calcula el total del carrito en la base de datos: SUM(precio_venta * cantidad)
+    consulta = (
+        db.select(db.func.coalesce(db.func.sum(Producto.precio_venta * DetalleCarrito.cantidad), 0))
+        .select_from(DetalleCarrito)
+        .join(CarritoCompras, DetalleCarrito.id_carrito == CarritoCompras.id)
+        .join(Producto, DetalleCarrito.id_producto == Producto.id)
+        .where(CarritoCompras.id_usuario == id_usuario)
+    )
+    return Decimal(db.session.scalar(consulta))
+
+
+def _carrito_cte(id_usuario):
+    # WITH carrito AS (INSERT ... ON CONFLICT (id_usuario) DO UPDATE ... RETURNING id): el carrito del usuario,
+    # creado si no existía. El DO UPDATE renueva actualizado_en, la fecha por la que se limpian los carritos
+    # abandonados (app/limpieza.py)
+    insercion_carrito = pg_insert(CarritoCompras).values(id_usuario=id_usuario, creado_en=db.func.now(),
+                                                         actualizado_en=db.func.now())
+    return (
+        insercion_carrito
+        .on_conflict_do_update(index_elements=['id_usuario'],
+                               set_={'actualizado_en': insercion_carrito.excluded.actualizado_en})
+        .returning(CarritoCompras.id)
+        .cte('carrito')
+    )
+
+
+def sentencia_anadir(id_usuario, id_producto, cantidad):
+    # Crea el carrito (si no existe) y la línea (o suma la cantidad) en una sola sentencia:
+    #   WITH carrito AS (INSERT INTO carrito_compras ... ON CONFLICT (id_usuario) DO UPDATE ... RETURNING id)
+    #   INSERT INTO detalle_carrito SELECT ... FROM carrito JOIN productos
+    #   ON CONFLICT (id_carrito, id_producto) DO UPDATE SET cantidad = detalle_carrito.cantidad + excluded.cantidad
+    # El DO UPDATE del carrito (que solo renueva actualizado_en) permite que RETURNING devuelva el id existente.
+    # RETURNING no devuelve filas si el producto no existe (el SELECT no produce filas).
+    carrito_cte = _carrito_cte(id_usuario)
+    filas = (
+        db.select(carrito_cte.c.id, Producto.id, db.literal(cantidad, db.Integer))
+        .where(Producto.id == id_producto)
+    )
+    insercion_detalle = pg_insert(DetalleCarrito).from_select(['id_carrito', 'id_producto', 'cantidad'], filas)
+    insercion_detalle = (
+        insercion_detalle
+        .on_conflict_do_update(index_elements=['id_carrito', 'id_producto'],
+                               set_={'cantidad': DetalleCarrito.cantidad + insercion_detalle.excluded.cantidad})
+        .returning(DetalleCarrito.id)
+    )
+    return insercion_detalle
+
+
+def anadir_producto(id_usuario, id_producto, cantidad):
+    # Devuelve False si el producto no existe
+    id_detalle = db.session.execute(sentencia_anadir(id_usuario, id_producto, cantidad)).scalar()
+    db.session.commit()
+    return id_detalle is not None
+
+
+def actualizar_cantidad(id_usuario, id_producto, cantidad):
+    # UPDATE detalle_carrito SET cantidad = ... FROM carrito_compras WHERE ...
+    # Devuelve False si el producto no estaba en el carrito del usuario
+    sentencia = (
+        db.update(DetalleCarrito)
+        .where(DetalleCarrito.id_carrito == CarritoCompras.id,
+               CarritoCompras.id_usuario == id_usuario,
+               DetalleCarrito.id_producto == id_producto)
+        .values(cantidad=cantidad)
+        .execution_options(synchronize_session=False)
+    )
+    resultado = db.session.execute(sentencia)
+    db.session.commit()
+    return resultado.rowcount > 0
+
+
+def eliminar_producto(id_usuario, id_producto):
+    # DELETE FROM detalle_carrito USING carrito_compras WHERE ...
+    # Devuelve False si el producto no estaba en el carrito del usuario
+    sentencia = (
+        db.delete(DetalleCarrito)
+        .where(DetalleCarrito.id_carrito == CarritoCompras.id,
+               CarritoCompras.id_usuario == id_usuario,
+               DetalleCarrito.id_producto == id_producto)
+        .execution_options(synchronize_session=False)
+    )
+    resultado = db.session.execute(sentencia)
+    db.session.commit()
+    return resultado.rowcount > 0
+
+
+def consulta_contar_articulos(id_usuario):
+    return (
+        db.select(db.func.coalesce(db.func.sum(DetalleCarrito.cantidad), 0))
+        .select_from(DetalleCarrito)
+        .join(CarritoCompras, DetalleCarrito.id_carrito == CarritoCompras.id)
+        .where(CarritoCompras.id_usuario == id_usuario)
+    )
+
+
+def contar_articulos(id_usuario):
+    return int(db.session.scalar(consulta_contar_articulos(id_usuario)))
+
+
+def sentencia_fusionar(id_usuario, lineas):
+    # Vuelca el carrito del visitante ({id_producto: cantidad}) en el del usuario con un único upsert:
+    #   WITH carrito AS (...) INSERT INTO detalle_carrito SELECT carrito.id, p.id, v.cantidad
+    #   FROM carrito JOIN productos p ON true JOIN (VALUES ...) v ON v.id_producto = p.id
+    #   ON CONFLICT (id_carrito, id_producto) DO UPDATE SET cantidad = detalle_carrito.cantidad + excluded.cantidad
+    # Los productos que ya no existen se descartan en el JOIN.
+    carrito_cte = _carrito_cte(id_usuario)
+    invitado = values(column('id_producto', Integer), column('cantidad', Integer), name='v').data(
+        [(int(id_producto), cantidad) for id_producto, cantidad in lineas.items()]
+    )
+    filas = (
+        db.select(carrito_cte.c.id, Producto.id, invitado.c.cantidad)
+        .select_from(carrito_cte)
+        .join(Producto, db.true())
+        .join(invitado, invitado.c.id_producto == Producto.id)
+    )
+    insercion = pg_insert(DetalleCarrito).from_select(['id_carrito', 'id_producto', 'cantidad'], filas)
+    return insercion.on_conflict_do_update(index_elements=['id_carrito', 'id_producto'],
+                                           set_={'cantidad': DetalleCarrito.cantidad + insercion.excluded.cantidad})
+
+
+def fusionar_carrito(id_usuario, lineas):
+    if not lineas:
+        return
+    db.session.execute(sentencia_fusionar(id_usuario, lineas))
+    db.session.commit()
+
+
+# -- Carrito de los visitantes (en la sesión) --
+
+def carrito_invitado():
+    # Las claves son cadenas: la sesión se serializa en JSON
+    return session.get('carrito', {})
+
+
+def anadir_invitado(id_producto, cantidad, existe=None):
+    # Devuelve False si el producto no existe o el carrito ya tiene el máximo de productos distintos.
+    # 'existe' permite a quien llama haber comprobado ya el producto (la API asíncrona lo hace con su motor).
+    carrito = dict(carrito_invitado())
+    clave = str(id_producto)
+    if clave not in carrito:
+        if len(carrito) >= current_app.config['CARRITO_INVITADO_MAX_LINEAS']:
+            return False
+        if existe is None:
+            existe = db.session.scalar(db.select(Producto.id).where(Producto.id == id_producto)) is not None
+        if not existe:
+            return False
+    carrito[clave] = carrito.get(clave, 0) + cantidad
+    session['carrito'] = carrito
+    return True
+
+
+def actualizar_invitado(id_producto, cantidad):
+    carrito = dict(carrito_invitado())
+    if str(id_producto) not in carrito:
+        return False
+    carrito[str(id_producto)] = cantidad
+    session['carrito'] = carrito
+    return True
+
+
+def eliminar_invitado(id_producto):
+    carrito = dict(carrito_invitado())
+    if carrito.pop(str(id_producto), None) is None:
+        return False
+    session['carrito'] = carrito
+    return True
+
+
+def consulta_productos_invitado(carrito):
+    return (db.select(Producto).where(Producto.id.in_([int(id_producto) for id_producto in carrito]))
+            .order_by(Producto.id))
+
+
+def lineas_invitado(carrito, productos):
+    return [LineaCarrito(producto, carrito[str(producto.id)]) for producto in productos]
+
+
+def obtener_detalles_invitado():
+    # Carga los productos del carrito del visitante en una sola consulta
+    carrito = carrito_invitado()
+    if not carrito:
+        return []
+    return lineas_invitado(carrito, db.session.scalars(consulta_productos_invitado(carrito)).all())
+
+
+def calcular_total_lineas(lineas):
+    return sum((linea.producto.precio_venta * linea.cantidad for linea in lineas), Decimal(0))
+
+
+# -- Número de artículos para la barra de navegación --
+
+def cantidad_en_carrito(usuario):
+    # Se sirve desde la sesión; solo se consulta la base de datos si la sesión aún no lo tiene
+    if not usuario.is_authenticated:
+        return sum(carrito_invitado().values())
+    if 'carrito_cantidad' not in session:
+        session['carrito_cantidad'] = contar_articulos(usuario.id)
+    return session['carrito_cantidad']
+
+
+def recordar_cantidad(id_usuario, cantidad=None):
+    # Tras modificar el carrito del usuario se guarda el nuevo total de artículos en su sesión
+    session['carrito_cantidad'] = contar_articulos(id_usuario) if cantidad is None else cantidad
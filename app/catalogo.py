@@ -0,0 +1,172 @@
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from flask import current_app
+from sqlalchemy.orm import joinedload, selectinload
+from app import db
+from app.models import Producto, Resena, Usuario
+
+# Consultas del catálogo de productos.
+# El listado usa paginación por clave (keyset / "seek"): en lugar de OFFSET, cada página
+# pide los productos cuyo id es mayor que el último id de la página anterior. Así PostgreSQL
+# salta directamente al punto correcto del índice y las páginas profundas cuestan lo mismo
+# que la primera, sin cargar el catálogo completo en Python.
+# Las consultas de solo lectura del catálogo se envían a la réplica cuando está configurada (BD_REPLICA_URI).
+
+
+def opciones_lectura():
+    # Argumentos de enlace para ejecutar una consulta de solo lectura en la réplica, si existe
+    replica = db.engines.get('replica')
+    return {'bind': replica} if replica is not None else {}
+
+
+def _leer_cursor(cursor, orden):
+    # El cursor es el id del último producto ('recientes') o "<calificación>_<id>" ('calificacion').
+    # Un cursor mal formado se trata como si no hubiera cursor (primera página).
+    if not cursor:
+        return None
+    try:
+        if orden == 'calificacion':
+            calificacion, id_producto = str(cursor).split('_', 1)
+            return Decimal(calificacion), int(id_producto)
+        return int(cursor)
+    except (ValueError, InvalidOperation):
+        return None
+
+
+def consulta_catalogo(despues_de=None, id_categoria=None, id_proveedor=None, por_pagina=None,
+                      orden='recientes', calificacion_minima=None):
+    # Construye la consulta de una página del catálogo y devuelve (consulta, por_pagina).
+    # orden='recientes' recorre por id; orden='calificacion' recorre por (calificacion_promedio, id) descendente,
+    # ambos con índice, de modo que ordenar por valoración tampoco necesita OFFSET ni leer la tabla resenas.
+    # La usan tanto paginar_productos como la API asíncrona, que la ejecuta con su propio motor.
+    por_pagina = por_pagina or current_app.config['CATALOGO_POR_PAGINA']
+    por_pagina = max(1, min(por_pagina, current_app.config['CATALOGO_MAX_POR_PAGINA']))
+    cursor = _leer_cursor(despues_de, orden)
+
+    consulta = db.select(Producto)
+    if id_categoria is not None:
+        consulta = consulta.where(Producto.id_categoria == id_categoria)
+    if id_proveedor is not None:
+        consulta = consulta.where(Producto.id_proveedor == id_proveedor)
+    if calificacion_minima is not None:
+        consulta = consulta.where(Producto.calificacion_promedio >= calificacion_minima)
+
+    if orden == 'calificacion':
+        if cursor is not None:
+            consulta = consulta.where(db.tuple_(Producto.calificacion_promedio, Producto.id) < db.tuple_(*cursor))
+        consulta = consulta.order_by(Producto.calificacion_promedio.desc(), Producto.id.desc())
+    else:
+        if cursor is not None:
+            consulta = consulta.where(Producto.id > cursor)
+        consulta = consulta.order_by(Producto.id)
+
+    # Pedimos un registro extra para saber si existe una página siguiente sin hacer un COUNT(*)
+    return consulta.limit(por_pagina + 1), por_pagina
+
+
+def cortar_pagina(productos, por_pagina, orden='recientes'):
+    # Separa el registro extra y devuelve (productos, siguiente_cursor). El cursor es None en la última página.
+    siguiente_cursor = None
+    if len(productos) > por_pagina:
+        productos = productos[:por_pagina]
+        ultimo = productos[-1]
+        siguiente_cursor = (f'{ultimo.calificacion_promedio}_{ultimo.id}' if orden == 'calificacion'
+                            else str(ultimo.id))
+    return productos, siguiente_cursor
+
+
+def paginar_productos(despues_de=None, id_categoria=None, id_proveedor=None, por_pagina=None,
+                      orden='recientes', calificacion_minima=None):
+    # Devuelve una tupla (productos, siguiente_cursor). El cursor es None en la última página.
+    consulta, por_pagina = consulta_catalogo(despues_de, id_categoria, id_proveedor, por_pagina,
+                                             orden, calificacion_minima)
+    productos = db.session.scalars(consulta, bind_arguments=opciones_lectura()).all()
+    return cortar_pagina(productos, por_pagina, orden)
+
+
+def cargar_detalle_producto(id_producto):
+    # Producto con su categoría y proveedor (JOIN) y todas sus variantes e imágenes (una consulta IN por
+    # relación): siempre tres consultas, tenga el producto las variantes que tenga.
+    # Se lee del servidor principal: el resultado se cachea con la versión actual del producto y una réplica
+    # retrasada dejaría guardada una versión antigua con la clave nueva.
+    return db.session.scalar(
+        db.select(Producto)
+        .where(Producto.id == id_producto)
+        .options(joinedload(Producto.categoria), joinedload(Producto.proveedor),
+                 selectinload(Producto.variantes), selectinload(Producto.imagenes))
+    )
+
+
+def _leer_cursor_resenas(cursor):
+    # El cursor de reseñas es "<fecha_resena ISO>_<id>" de la última reseña de la página anterior
+    if not cursor:
+        return None
+    try:
+        fecha, id_resena = str(cursor).rsplit('_', 1)
+        return datetime.fromisoformat(fecha), int(id_resena)
+    except ValueError:
+        return None
+
+
+def pagina_resenas(id_producto, despues_de=None, por_pagina=None):
+    # Reseñas de un producto de la más reciente a la más antigua, con el nombre de su autor.
+    # Paginación por clave sobre (fecha_resena, id) con el índice ix_resenas_producto_fecha: cada página cuesta
+    # lo mismo aunque el producto tenga miles de reseñas. Devuelve ([(resena, nombre)], siguiente_cursor).
+    # fecha_resena es NOT NULL, así que ninguna reseña queda fuera de la comparación con el cursor.
+    por_pagina = por_pagina or current_app.config['RESENAS_POR_PAGINA']
+    consulta = (db.select(Resena, Usuario.nombre)
+                .join(Usuario, Usuario.id == Resena.id_usuario)
+                .where(Resena.id_producto == id_producto))
+    cursor = _leer_cursor_resenas(despues_de)
+    if cursor is not None:
+        consulta = consulta.where(db.tuple_(Resena.fecha_resena, Resena.id) < db.tuple_(*cursor))
+    filas = db.session.execute(consulta.order_by(Resena.fecha_resena.desc(), Resena.id.desc())
+                               .limit(por_pagina + 1)).all()
+
+    siguiente_cursor = None
+    if len(filas) > por_pagina:
+        filas = filas[:por_pagina]
+        ultima = filas[-1][0]
+        siguiente_cursor = f'{ultima.fecha_resena.isoformat()}_{ultima.id}'
+    return filas, siguiente_cursor
+
+
+def producto_a_dict(producto):
+    # Representación JSON de un producto para la API del catálogo
+    return {
+        'id': producto.id,
+        'nombre': producto.nombre,
+        'descripcion': producto.descripcion,
+        'precio_venta': str(producto.precio_venta),
+        'stock': producto.stock,
+        'id_categoria': producto.id_categoria,
+        'id_proveedor': producto.id_proveedor,
+        'num_resenas': producto.num_resenas,
+        'calificacion_promedio': str(producto.calificacion_promedio),
+    }
+
+
+def detalle_a_dict(producto, resenas, siguiente):
+    # Representación JSON del detalle de producto (/api/productos/<id>)
+    return dict(
+        producto_a_dict(producto),
+        categoria=producto.categoria.nombre if producto.categoria else None,
+        proveedor=producto.proveedor.nombre if producto.proveedor else None,
+        variantes=[{'id': v.id, 'nombre': v.nombre_variante, 'valor': v.valor_variante,
+                    'precio_adicional': str(v.precio_adicional), 'stock': v.stock_variante}
+                   for v in ordenar_variantes(producto.variantes)],
+        imagenes=[{'id': i.id, 'url': i.url_imagen, 'es_principal': i.es_principal, 'variantes': i.variantes}
+                  for i in ordenar_imagenes(producto.imagenes)],
+        resenas=[{'id': r.id, 'usuario': nombre, 'calificacion': r.calificacion, 'comentario': r.comentario,
+                  'fecha': r.fecha_resena.isoformat() if r.fecha_resena else None} for r, nombre in resenas],
+        siguiente=siguiente,
+    )
+
+
+def ordenar_variantes(variantes):
+    return sorted(variantes, key=lambda v: (v.nombre_variante, v.id))
+
+
+def ordenar_imagenes(imagenes):
+    # La principal primero
+    return sorted(imagenes, key=lambda i: (not i.es_principal, i.id))
@@ -0,0 +1,310 @@
+import csv
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import time
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from app import db
+from app.models import Producto, ImagenProducto
+from app.analitica import actualizar_ventas
+from app.correo import despachar_lote
+from app.estaticos import precomprimir
+from app.fragmentos import invalidar_todo, invalidar_producto, invalidacion_compartida
+from app.imagenes import procesar_pendientes, guardar_original
+from app.importacion import importar_catalogo, exportar_catalogo
+from app.limpieza import limpiar, registro_limpieza
+from app.reposicion import evaluar_reposicion
+from app.resenas import detectar_desviaciones, reconstruir_resumenes
+
+# Comandos de línea de órdenes de la aplicación (flask <grupo> <comando>); create_app los registra con init_app
+
+
+def _cache_fragmentos_compartida():
+    # Este proceso no es un worker web: con la caché de fragmentos en memoria sus invalidaciones (explícitas o
+    # de los eventos del ORM) no alcanzan la de los workers, así que se avisa de cuánto tardarán en expirar
+    if invalidacion_compartida():
+        return True
+    click.echo('Aviso: la caché de fragmentos es de cada proceso (CACHE_FRAGMENTOS_BACKEND=memoria); los '
+               'workers web pueden mostrar las páginas anteriores durante '
+               f"{current_app.config['CACHE_FRAGMENTOS_TTL']} s (CACHE_FRAGMENTOS_TTL) o hasta reiniciarlos.",
+               err=True)
+    return False
+
+
+def _invalidar_fragmentos(ids_productos=None):
+    # Invalida las tarjetas cacheadas de los productos indicados (o todas) si la caché es compartida
+    if not _cache_fragmentos_compartida():
+        return
+    if ids_productos is None:
+        invalidar_todo()
+    else:
+        for id_producto in ids_productos:
+            invalidar_producto(id_producto)
+
+
+@click.group(cls=AppGroup)
+def correo():
+    """Gestión de la bandeja de salida de correos."""
+
+
+@correo.command('despachar')
+@click.option('--continuo', is_flag=True, help='Sigue procesando la bandeja de salida hasta que se interrumpa.')
+@click.option('--intervalo', default=5.0, show_default=True, help='Segundos de espera cuando no hay correos pendientes.')
+@click.option('--lote', default=None, type=int, help='Correos por conexión SMTP (por defecto CORREO_LOTE).')
+def despachar(continuo, intervalo, lote):
+    """Envía los correos pendientes de la bandeja de salida."""
+    while True:
+        enviados = despachar_lote(lote)
+        if enviados:
+            click.echo(f'{enviados} correo(s) enviados.')
+        if not continuo:
+            break
+        if not enviados:
+            time.sleep(intervalo)
+
+
+@click.group(cls=AppGroup)
+def catalog():
+    """Importación y exportación masiva del catálogo."""
+
+
+def _formato(ruta, formato):
+    if formato:
+        return formato
+    return 'jsonl' if ruta.endswith(('.jsonl', '.ndjson')) else 'csv'
+
+
+@catalog.command('import')
+@click.argument('archivo', type=click.File('r', encoding='utf-8'))
+@click.option('--formato', type=click.Choice(['csv', 'jsonl']), help='Por defecto se deduce de la extensión.')
+@click.option('--lote', default=5000, show_default=True, help='Filas por cada COPY a la tabla de staging.')
+@click.option('--errores', type=click.File('w', encoding='utf-8'),
+              help='Archivo CSV donde guardar las filas rechazadas (por defecto, la salida de errores).')
+def importar(archivo, formato, lote, errores):
+    """Importa productos, variantes e imágenes desde un archivo CSV o JSONL."""
+    escritor_errores = csv.writer(errores) if errores else None
+    if escritor_errores:
+        escritor_errores.writerow(['linea', 'error'])
+
+    def al_error(numero, mensaje):
+        if escritor_errores:
+            escritor_errores.writerow([numero, mensaje])
+        else:
+            click.echo(f'Línea {numero}: {mensaje}', file=sys.stderr)
+
+    def al_progresar(filas, fallidas):
+        click.echo(f'{filas} filas importadas, {fallidas} con errores...')
+
+    resumen = importar_catalogo(archivo, _formato(archivo.name, formato), lote, al_progresar, al_error)
+    # La carga masiva no pasa por los eventos del ORM: se invalidan todas las tarjetas cacheadas
+    _invalidar_fragmentos()
+    click.echo(f"Importación terminada: {resumen['filas']} filas importadas, {resumen['errores']} con errores.")
+
+
+@catalog.command('export')
+@click.argument('archivo', type=click.File('w', encoding='utf-8'), default='-')
+@click.option('--formato', type=click.Choice(['csv', 'jsonl']), help='Por defecto se deduce de la extensión.')
+@click.option('--lote', default=5000, show_default=True, help='Filas leídas de la base de datos en cada bloque.')
+def exportar(archivo, formato, lote):
+    """Exporta el catálogo (una fila por variante) a CSV o JSONL."""
+    def al_progresar(total):
+        click.echo(f'{total} filas exportadas...', err=True)
+
+    total = exportar_catalogo(archivo, _formato(archivo.name, formato), lote, al_progresar)
+    click.echo(f'Exportación terminada: {total} filas.', err=True)
+
+
+@click.group(cls=AppGroup)
+def resenas():
+    """Mantenimiento del resumen de reseñas de los productos."""
+
+
+@resenas.command('reconciliar')
+@click.option('--corregir', is_flag=True, help='Reescribe los resúmenes desviados además de informar.')
+def reconciliar(corregir):
+    """Compara el resumen de reseñas de cada producto con sus reseñas reales."""
+    desviaciones = detectar_desviaciones()
+    for fila in desviaciones:
+        click.echo(f"Producto {fila['id_producto']}: {fila['num_resenas']} reseñas / suma {fila['suma_calificaciones']} "
+                   f"(real: {fila['num_resenas_real']} / {fila['suma_calificaciones_real']})")
+    click.echo(f'{len(desviaciones)} producto(s) con desviación.')
+
+    if corregir and desviaciones:
+        corregidos = reconstruir_resumenes()
+        _invalidar_fragmentos(corregidos)
+        click.echo(f'{len(corregidos)} producto(s) corregidos.')
+
+
+@click.group(cls=AppGroup)
+def estaticos():
+    """Construcción de los archivos estáticos."""
+
+
+@estaticos.command('construir')
+@click.option('--sin-tailwind', is_flag=True, help='Solo precomprime, sin compilar la hoja de Tailwind.')
+def construir(sin_tailwind):
+    """Compila y purga la hoja de Tailwind y precomprime los estáticos (gzip/brotli)."""
+    raiz = os.path.dirname(current_app.root_path)
+    if not sin_tailwind:
+        # Usa el binario independiente de Tailwind si está instalado; si no, el paquete de npm a través de npx
+        ejecutable = shutil.which('tailwindcss')
+        comando = [ejecutable] if ejecutable else ['npx', '--yes', 'tailwindcss@3']
+        comando += ['-c', os.path.join(raiz, 'tailwind.config.js'),
+                    '-i', os.path.join(current_app.static_folder, 'css', 'tailwind.src.css'),
+                    '-o', os.path.join(current_app.static_folder, 'css', 'tailwind.css'),
+                    '--minify']
+        try:
+            subprocess.run(comando, check=True, cwd=raiz)
+        except (OSError, subprocess.CalledProcessError) as error:
+            raise click.ClickException(f'No se pudo compilar Tailwind: {error}')
+
+    generados = precomprimir(current_app.static_folder)
+    click.echo(f'{len(generados)} archivo(s) precomprimidos. Reinicia la aplicación para actualizar las huellas.')
+
+
+@click.group(cls=AppGroup)
+def imagenes():
+    """Procesado de las imágenes de producto (tamaños WebP y JPEG)."""
+
+
+def _ejecutar_procesado(**opciones):
+    def al_error(id_imagen, mensaje):
+        click.echo(f'Imagen {id_imagen}: {mensaje}', file=sys.stderr)
+
+    def al_progresar(resumen):
+        click.echo(f"{resumen['procesadas']} procesadas, {resumen['sin_cambios']} sin cambios, "
+                   f"{resumen['errores']} con errores...")
+
+    try:
+        resumen = procesar_pendientes(al_progresar=al_progresar, al_error=al_error, **opciones)
+    except RuntimeError as error:
+        raise click.ClickException(str(error))
+    # procesar_pendientes invalida las tarjetas de los productos con imágenes nuevas en la caché de fragmentos
+    if resumen['procesadas']:
+        _cache_fragmentos_compartida()
+    return resumen
+
+
+@imagenes.command('procesar')
+@click.option('--todas', is_flag=True, help='Revisa todas las imágenes; se saltan las que no han cambiado.')
+@click.option('--forzar', is_flag=True, help='Regenera todos los tamaños aunque el original no haya cambiado.')
+@click.option('--trabajadores', type=int, help='Procesos del pool (por defecto IMAGENES_TRABAJADORES).')
+@click.option('--lote', default=100, show_default=True, help='Imágenes guardadas en cada transacción.')
+def procesar(todas, forzar, trabajadores, lote):
+    """Genera los tamaños de las imágenes pendientes de procesar."""
+    resumen = _ejecutar_procesado(todas=todas, forzar=forzar, trabajadores=trabajadores, lote=lote)
+    click.echo(f"Procesado terminado: {resumen['procesadas']} procesadas, {resumen['sin_cambios']} sin cambios, "
+               f"{resumen['errores']} con errores.")
+
+
+@imagenes.command('subir')
+@click.argument('id_producto', type=int)
+@click.argument('archivos', nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option('--principal', is_flag=True, help='Marca la primera imagen como principal del producto.')
+def subir(id_producto, archivos, principal):
+    """Añade imágenes a un producto a partir de archivos locales y genera sus tamaños."""
+    if db.session.get(Producto, id_producto) is None:
+        raise click.ClickException(f'No existe el producto {id_producto}.')
+    if principal:
+        db.session.execute(db.update(ImagenProducto).where(ImagenProducto.id_producto == id_producto)
+                           .values(es_principal=False))
+    nuevas = [ImagenProducto(id_producto=id_producto, url_imagen=guardar_original(ruta),
+                             es_principal=principal and posicion == 0)
+              for posicion, ruta in enumerate(archivos)]
+    db.session.add_all(nuevas)
+    db.session.commit()
+    resumen = _ejecutar_procesado(ids=[imagen.id for imagen in nuevas])
+    click.echo(f"{len(nuevas)} imagen(es) añadidas al producto {id_producto}; {resumen['errores']} con errores.")
+
+
+@click.group(cls=AppGroup)
+def analitica():
+    """Agregados de ventas para los paneles de administración."""
+
+
+@analitica.command('actualizar')
+@click.option('--reconstruir', is_flag=True, help='Recalcula todo el histórico en lugar de solo los días recientes.')
+@click.option('--continuo', is_flag=True, help='Repite la actualización hasta que se interrumpa.')
+@click.option('--intervalo', default=300.0, show_default=True, help='Segundos entre actualizaciones con --continuo.')
+def actualizar(reconstruir, continuo, intervalo):
+    """Agrega los pedidos nuevos en la tabla ventas_diarias."""
+    while True:
+        resumen = actualizar_ventas(reconstruir=reconstruir)
+        if resumen['desde'] is None:
+            click.echo('No hay pedidos que agregar.')
+        else:
+            click.echo(f"Días recalculados desde {resumen['desde']}: {resumen['filas']} fila(s) de ventas_diarias.")
+        if not continuo:
+            break
+        reconstruir = False
+        time.sleep(intervalo)
+
+
+@click.group(cls=AppGroup)
+def reposicion():
+    """Alertas de stock bajo y sugerencias de reposición por proveedor."""
+
+
+@reposicion.command('evaluar')
+@click.option('--completo', is_flag=True, help='Reevalúa todos los productos con stock bajo, no solo los cambiados.')
+@click.option('--sin-correo', is_flag=True, help='No encola los resúmenes por correo (REPOSICION_DESTINATARIOS).')
+@click.option('--continuo', is_flag=True, help='Repite la evaluación hasta que se interrumpa.')
+@click.option('--intervalo', default=600.0, show_default=True, help='Segundos entre pasadas con --continuo.')
+def evaluar(completo, sin_correo, continuo, intervalo):
+    """Calcula las sugerencias de reposición y muestra un resumen de pedido por proveedor."""
+    while True:
+        resultado = evaluar_reposicion(completo=completo, enviar=not sin_correo)
+        if resultado is None:
+            click.echo('Otra evaluación está en curso; se omite esta pasada.')
+        else:
+            click.echo(f"{resultado['evaluados']} producto(s) evaluados, {resultado['retirados']} sin stock bajo ya.")
+            for resumen in resultado['resumenes']:
+                click.echo(f"\n{resumen['proveedor']}: {len(resumen['lineas'])} producto(s), "
+                           f"{resumen['unidades']} unidades, coste estimado {resumen['coste']:.2f}")
+                for linea in resumen['lineas']:
+                    click.echo(f"  {linea['sku'] or linea['id_producto']:<16} {linea['nombre'][:40]:<40} "
+                               f"stock {linea['stock']:>5}  pedir {linea['cantidad_sugerida']:>5}")
+                for variante in resumen['variantes']:
+                    click.echo(f"  variante {variante['nombre'][:30]} {variante['nombre_variante']}="
+                               f"{variante['valor_variante']}: stock {variante['stock_variante']}")
+            if resultado['correos']:
+                click.echo(f"\n{resultado['correos']} resumen(es) encolados por correo.")
+        if not continuo:
+            break
+        completo = False
+        time.sleep(intervalo)
+
+
+@click.group(cls=AppGroup)
+def limpieza():
+    """Limpieza de carritos abandonados y cuentas sin confirmar."""
+
+
+@limpieza.command('ejecutar')
+@click.option('--simular', is_flag=True, help='Solo cuenta las filas que se borrarían.')
+@click.option('--lote', type=int, help='Filas borradas por transacción (por defecto LIMPIEZA_LOTE).')
+@click.option('--pausa', type=float, help='Segundos entre lotes (por defecto LIMPIEZA_PAUSA_SEGUNDOS).')
+@click.option('--max-lotes', type=int, help='Lotes como máximo por cada tipo de fila en esta ejecución.')
+def ejecutar(simular, lote, pausa, max_lotes):
+    """Borra por lotes los carritos abandonados y las cuentas sin confirmar antiguas."""
+    # La línea JSON con el resumen va a la salida de errores si nadie configuró el logger
+    if not registro_limpieza.handlers:
+        registro_limpieza.addHandler(logging.StreamHandler())
+        registro_limpieza.setLevel(logging.INFO)
+
+    def al_progresar(totales):
+        click.echo(', '.join(f'{filas} {tabla}' for tabla, filas in totales.items()) + ' borrados...')
+
+    resumen = limpiar(simular=simular, lote=lote, pausa=pausa, max_lotes=max_lotes, al_progresar=al_progresar)
+    verbo = 'se borrarían' if simular else 'borrados'
+    click.echo(f"{resumen['carritos']} carrito(s) con {resumen['lineas']} línea(s) y {resumen['usuarios']} "
+               f"cuenta(s) sin confirmar {verbo} en {resumen['segundos']} s.")
+
+
+def init_app(app):
+    for grupo in (correo, catalog, resenas, estaticos, imagenes, analitica, reposicion, limpieza):
+        app.cli.add_command(grupo)
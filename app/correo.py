@@ -0,0 +1,83 @@
+import smtplib
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from flask_mail import Message
+from app import db, mail
+from app.models import CorreoSaliente
+
+# Bandeja de salida de correos.
+# Las rutas solo guardan el mensaje con encolar_correo() (un INSERT dentro de su propia transacción)
+# y responden de inmediato. El despachador (flask correo despachar) envía los pendientes por lotes
+# reutilizando una sola conexión SMTP, y reprograma los fallos con espera exponencial.
+
+
+def encolar_correo(asunto, destinatarios, cuerpo=None, html=None, remitente=None):
+    # Añade el correo a la sesión; quien llama se encarga del commit junto con el resto de su trabajo
+    correo = CorreoSaliente(
+        asunto=asunto,
+        remitente=remitente or current_app.config['MAIL_USERNAME'],
+        destinatarios=list(destinatarios),
+        cuerpo=cuerpo,
+        html=html,
+    )
+    db.session.add(correo)
+    return correo
+
+
+def _a_mensaje(correo):
+    mensaje = Message(subject=correo.asunto, sender=correo.remitente, recipients=correo.destinatarios)
+    mensaje.body = correo.cuerpo
+    mensaje.html = correo.html
+    return mensaje
+
+
+def _registrar_fallo(correo, error):
+    # Reprograma el correo con espera exponencial o lo marca como fallido al agotar los intentos
+    correo.intentos += 1
+    correo.ultimo_error = str(error)[:1000]
+    if correo.intentos >= current_app.config['CORREO_MAX_INTENTOS']:
+        correo.estado = 'fallido'
+    else:
+        espera = current_app.config['CORREO_REINTENTO_SEGUNDOS'] * 2 ** (correo.intentos - 1)
+        correo.proximo_intento = datetime.now(timezone.utc) + timedelta(seconds=espera)
+
+
+def despachar_lote(limite=None):
+    # Envía un lote de correos pendientes por una única conexión SMTP y devuelve cuántos se enviaron.
+    # FOR UPDATE SKIP LOCKED permite ejecutar varios despachadores en paralelo sin enviar dos veces el mismo correo.
+    limite = limite or current_app.config['CORREO_LOTE']
+    consulta = (
+        db.select(CorreoSaliente)
+        .where(CorreoSaliente.estado == 'pendiente', CorreoSaliente.proximo_intento <= db.func.now())
+        .order_by(CorreoSaliente.id)
+        .limit(limite)
+        .with_for_update(skip_locked=True)
+    )
+    pendientes = db.session.scalars(consulta).all()
+    if not pendientes:
+        db.session.commit()
+        return 0
+
+    enviados = 0
+    procesados = set()
+    try:
+        with mail.connect() as conexion:
+            for correo in pendientes:
+                procesados.add(correo.id)
+                try:
+                    conexion.send(_a_mensaje(correo))
+                except (smtplib.SMTPException, OSError) as error:
+                    _registrar_fallo(correo, error)
+                    continue
+                correo.estado = 'enviado'
+                correo.enviado_en = datetime.now(timezone.utc)
+                enviados += 1
+    except (smtplib.SMTPException, OSError) as error:
+        # No se pudo abrir (o se perdió) la conexión: se reprograman los correos que quedaron sin procesar
+        current_app.logger.warning('Fallo de conexión SMTP: %s', error)
+        for correo in pendientes:
+            if correo.id not in procesados:
+                _registrar_fallo(correo, error)
+
+    db.session.commit()
+    return enviados
@@ -0,0 +1,141 @@
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+from decimal import Decimal
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from app import db
+from app.models import Descuento
+
+# Códigos de descuento.
+# Los códigos vigentes se guardan en una caché en memoria del proceso para evaluar el carrito sin consultar
+# la base de datos en cada visita. La caché se recarga al caducar DESCUENTOS_CACHE_TTL o en cuanto se confirma
+# la creación, modificación o borrado de un descuento a través del ORM (por ejemplo, desde el panel de
+# administración).
+# El canje es la única operación autoritativa: un UPDATE condicional que incrementa usos_actuales solo si
+# el código sigue vigente y no ha alcanzado usos_maximos, de modo que el límite se respeta con cualquier
+# número de compras simultáneas.
+
+CodigoDescuento = namedtuple('CodigoDescuento', 'id codigo tipo valor inicio fin usos_maximos usos_actuales')
+
+
+class DescuentoInvalido(Exception):
+    pass
+
+
+class CacheDescuentos:
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._codigos = {}
+        self._cargado_en = None
+        # Cuenta las invalidaciones, para no dar por vigente una carga que empezó antes de la última
+        self._generacion = 0
+        self._candado = threading.Lock()
+
+    def invalidar(self):
+        with self._candado:
+            self._cargado_en = None
+            self._generacion += 1
+
+    def obtener(self, codigo):
+        # La consulta se hace fuera del candado: los demás hilos siguen leyendo la copia anterior mientras
+        # tanto. Si varios hilos la encuentran caducada a la vez, cada uno recarga, y se guarda la última carga.
+        # Una carga que empezó antes de una invalidación no se marca como vigente.
+        with self._candado:
+            vigente = self._cargado_en is not None and time.monotonic() - self._cargado_en <= self.ttl
+            codigos, generacion = self._codigos, self._generacion
+        if not vigente:
+            codigos = self._cargar()
+            with self._candado:
+                self._codigos = codigos
+                if generacion == self._generacion:
+                    self._cargado_en = time.monotonic()
+        return codigos.get(codigo.strip().upper())
+
+    @staticmethod
+    def _cargar():
+        # Solo los códigos que no han caducado; los futuros se incluyen y se rechazan al evaluarlos
+        descuentos = db.session.execute(
+            db.select(Descuento.id, Descuento.codigo, Descuento.tipo_descuento, Descuento.valor,
+                      Descuento.fecha_inicio, Descuento.fecha_fin, Descuento.usos_maximos, Descuento.usos_actuales)
+            .where(db.or_(Descuento.fecha_fin.is_(None), Descuento.fecha_fin >= db.func.now()))
+        ).all()
+        return {fila.codigo.upper(): CodigoDescuento(*fila) for fila in descuentos}
+
+
+def _cache():
+    cache = current_app.extensions.get('cache_descuentos')
+    if cache is None:
+        cache = CacheDescuentos(current_app.config['DESCUENTOS_CACHE_TTL'])
+        current_app.extensions['cache_descuentos'] = cache
+    return cache
+
+
+def buscar_codigo(codigo):
+    # Devuelve el código vigente o lanza DescuentoInvalido con el motivo
+    descuento = _cache().obtener(codigo or '')
+    ahora = datetime.now(timezone.utc)
+    if descuento is None:
+        raise DescuentoInvalido('El código de descuento no existe o ha caducado.')
+    if descuento.inicio and descuento.inicio > ahora:
+        raise DescuentoInvalido('El código de descuento todavía no está activo.')
+    if descuento.fin and descuento.fin < ahora:
+        raise DescuentoInvalido('El código de descuento ha caducado.')
+    if descuento.usos_maximos is not None and (descuento.usos_actuales or 0) >= descuento.usos_maximos:
+        raise DescuentoInvalido('El código de descuento ya no tiene usos disponibles.')
+    return descuento
+
+
+def calcular_descuento(descuento, subtotal):
+    # 'porcentaje' aplica un porcentaje del subtotal; cualquier otro tipo se trata como un importe fijo
+    if descuento.tipo == 'porcentaje':
+        monto = (subtotal * descuento.valor / Decimal(100)).quantize(Decimal('0.01'))
+    else:
+        monto = Decimal(descuento.valor)
+    return min(monto, subtotal)
+
+
+def canjear(descuento):
+    # UPDATE condicional dentro de la transacción de quien llama; lanza DescuentoInvalido si ya no quedan usos
+    canjeado = db.session.execute(
+        db.update(Descuento)
+        .where(Descuento.id == descuento.id,
+               db.or_(Descuento.usos_maximos.is_(None),
+                      db.func.coalesce(Descuento.usos_actuales, 0) < Descuento.usos_maximos),
+               db.or_(Descuento.fecha_inicio.is_(None), Descuento.fecha_inicio <= db.func.now()),
+               db.or_(Descuento.fecha_fin.is_(None), Descuento.fecha_fin >= db.func.now()))
+        .values(usos_actuales=db.func.coalesce(Descuento.usos_actuales, 0) + 1)
+        .returning(Descuento.id)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+    if canjeado is None:
+        # La copia en caché estaba desactualizada: se recarga en la siguiente consulta
+        _cache().invalidar()
+        raise DescuentoInvalido('El código de descuento ya no tiene usos disponibles.')
+
+
+# Los eventos del mapper se disparan en el flush, antes del COMMIT: una recarga hecha entre el flush y el
+# COMMIT leería la fila anterior y quedaría como vigente hasta el TTL. Por eso solo se anota el cambio en
+# session.info y la caché se invalida tras el COMMIT; si la transacción se deshace, se descarta.
+@event.listens_for(Descuento, 'after_insert')
+@event.listens_for(Descuento, 'after_update')
+@event.listens_for(Descuento, 'after_delete')
+def _descuento_modificado(mapper, connection, target):
+    sesion = object_session(target)
+    if sesion is not None:
+        sesion.info['descuentos_modificados'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidar_tras_commit(sesion):
+    if sesion.info.pop('descuentos_modificados', False):
+        cache = current_app.extensions.get('cache_descuentos')
+        if cache is not None:
+            cache.invalidar()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_tras_rollback(sesion):
+    sesion.info.pop('descuentos_modificados', None)
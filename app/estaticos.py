@@ -0,0 +1,125 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+from flask import current_app, request, send_from_directory, url_for
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # La compresión brotli es opcional; sin el paquete solo se generan archivos .gz
+    brotli = None
+
+# Archivos estáticos con huella de contenido.
+# Al arrancar se calcula un hash corto de cada archivo de static/. La función de plantilla estatico('css/x.css')
+# genera la URL /static/css/x.css?v=<hash>; como la URL cambia cuando cambia el contenido, esas respuestas se
+# sirven con Cache-Control inmutable de un año. Si existe una versión precomprimida (.br o .gz, generada con
+# 'flask estaticos construir'), no es más antigua que el original y el navegador la acepta, se envía esa en
+# lugar del original.
+
+EXTENSIONES_COMPRIMIBLES = ('.css', '.js', '.svg', '.html', '.json', '.txt')
+UN_ANIO = 31536000
+
+
+def calcular_manifiesto(carpeta):
+    manifiesto = {}
+    for raiz, _, archivos in os.walk(carpeta):
+        for nombre in archivos:
+            if nombre.endswith(('.gz', '.br')):
+                continue
+            ruta = os.path.join(raiz, nombre)
+            with open(ruta, 'rb') as archivo:
+                huella = hashlib.md5(archivo.read()).hexdigest()[:12]
+            manifiesto[os.path.relpath(ruta, carpeta).replace(os.sep, '/')] = huella
+    return manifiesto
+
+
+def precomprimir(carpeta):
+    # Genera .gz (y .br si está disponible brotli) junto a cada archivo comprimible; devuelve los generados
+    generados = []
+    for raiz, _, archivos in os.walk(carpeta):
+        for nombre in archivos:
+            if not nombre.endswith(EXTENSIONES_COMPRIMIBLES):
+                continue
+            ruta = os.path.join(raiz, nombre)
+            with open(ruta, 'rb') as archivo:
+                contenido = archivo.read()
+            with open(ruta + '.gz', 'wb') as archivo:
+                archivo.write(gzip.compress(contenido, compresslevel=9, mtime=0))
+            generados.append(ruta + '.gz')
+            if brotli is not None:
+                with open(ruta + '.br', 'wb') as archivo:
+                    archivo.write(brotli.compress(contenido, quality=11))
+                generados.append(ruta + '.br')
+    return generados
+
+
+def _precomprimido_vigente(carpeta, nombre, extension):
+    # La versión .br/.gz solo se sirve si es al menos tan reciente como el original: si el original se editó
+    # sin volver a ejecutar 'flask estaticos construir', la URL con la huella nueva (inmutable durante un año)
+    # no debe quedar asociada al contenido anterior
+    original = safe_join(carpeta, nombre)
+    if original is None:
+        return False
+    try:
+        return os.stat(original + extension).st_mtime >= os.stat(original).st_mtime
+    except OSError:
+        return False
+
+
+def calcular_huella_construccion(app, manifiesto):
+    # Identifica lo desplegado: cambia con cualquier archivo estático o plantilla, o con VERSION_APLICACION.
+    # Forma parte de los ETag de las páginas, que enlazan a los estáticos por su huella.
+    resumen = hashlib.md5(app.config['VERSION_APLICACION'].encode('utf-8'))
+    plantillas = calcular_manifiesto(os.path.join(app.root_path, app.template_folder))
+    for prefijo, archivos in (('static', manifiesto), ('templates', plantillas)):
+        for nombre, huella in sorted(archivos.items()):
+            resumen.update(f'{prefijo}/{nombre}={huella}\n'.encode('utf-8'))
+    return resumen.hexdigest()[:12]
+
+
+def huella_construccion():
+    app = current_app
+    if app.debug:
+        return calcular_huella_construccion(app, calcular_manifiesto(app.static_folder))
+    return app.extensions['huella_construccion']
+
+
+def init_app(app):
+    app.extensions['manifiesto_estaticos'] = calcular_manifiesto(app.static_folder)
+    app.extensions['huella_construccion'] = calcular_huella_construccion(app, app.extensions['manifiesto_estaticos'])
+
+    def manifiesto_actual():
+        # En modo depuración los archivos cambian mientras el servidor corre: se recalcula en cada uso
+        if app.debug:
+            return calcular_manifiesto(app.static_folder)
+        return app.extensions['manifiesto_estaticos']
+
+    def estatico(nombre):
+        huella = manifiesto_actual().get(nombre)
+        return url_for('static', filename=nombre, v=huella) if huella else url_for('static', filename=nombre)
+
+    @app.context_processor
+    def variables_estaticos():
+        # Si la hoja de Tailwind compilada existe, las plantillas la usan en lugar del script del CDN
+        return {'estatico': estatico, 'tailwind_compilado': 'css/tailwind.css' in manifiesto_actual()}
+
+    def servir_estatico(filename):
+        aceptadas = request.accept_encodings
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        respuesta = None
+        for codificacion, extension in (('br', '.br'), ('gzip', '.gz')):
+            if aceptadas[codificacion] and _precomprimido_vigente(app.static_folder, filename, extension):
+                respuesta = send_from_directory(app.static_folder, filename + extension, mimetype=mimetype)
+                respuesta.headers['Content-Encoding'] = codificacion
+                break
+        if respuesta is None:
+            respuesta = send_from_directory(app.static_folder, filename)
+        respuesta.vary.add('Accept-Encoding')
+
+        # Solo las URL con huella vigente son inmutables; el resto conserva el comportamiento por defecto
+        if request.args.get('v') and request.args.get('v') == manifiesto_actual().get(filename):
+            respuesta.headers['Cache-Control'] = f'public, max-age={UN_ANIO}, immutable'
+        return respuesta
+
+    app.view_functions['static'] = servir_estatico
@@ -0,0 +1,169 @@
+import threading
+from flask import current_app, render_template
+from markupsafe import Markup
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from app import db
+from app.cache import CacheLRU, CacheRedis
+from app.catalogo import opciones_lectura
+from app.models import Producto, ImagenProducto, VarianteProducto, Resena
+
+# Caché de fragmentos HTML para las tarjetas de producto del catálogo.
+# Cada tarjeta se guarda ya renderizada con la clave tarjeta:<global>:<id>:<versión>; es la misma para
+# clientes y visitantes, que también pueden añadir productos al carrito.
+# Cuando un producto, una de sus imágenes, variantes o reseñas cambia, su contador de versión se incrementa al
+# confirmarse la transacción; las tarjetas antiguas dejan de consultarse y acaban desalojadas o expiradas.
+# invalidar_todo() incrementa el contador global (útil tras cargas masivas que no pasan por el ORM).
+# Con el backend 'memoria' los contadores son de cada proceso: una invalidación solo llega a la caché del proceso
+# que la hace. Los comandos de línea de órdenes, que corren en su propio proceso, solo pueden invalidar las
+# tarjetas de los workers web con el backend 'redis' (ver invalidacion_compartida()).
+
+
+class CacheFragmentos:
+    def __init__(self, backend):
+        self.backend = backend
+        self.aciertos = 0
+        self.fallos = 0
+        self._candado = threading.Lock()
+
+    def _contar(self, aciertos, fallos):
+        with self._candado:
+            self.aciertos += aciertos
+            self.fallos += fallos
+
+    def estadisticas(self):
+        total = self.aciertos + self.fallos
+        return {
+            'backend': type(self.backend).__name__,
+            'aciertos': self.aciertos,
+            'fallos': self.fallos,
+            'tasa_aciertos': round(self.aciertos / total, 4) if total else None,
+        }
+
+
+def _cache():
+    cache = current_app.extensions.get('cache_fragmentos')
+    if cache is None:
+        config = current_app.config
+        if config['CACHE_FRAGMENTOS_BACKEND'] == 'redis':
+            backend = CacheRedis.desde_url(config['CACHE_REDIS_URL'], ttl=config['CACHE_FRAGMENTOS_TTL'])
+        else:
+            backend = CacheLRU(maximo=config['CACHE_FRAGMENTOS_MAXIMO'], ttl=config['CACHE_FRAGMENTOS_TTL'])
+        cache = CacheFragmentos(backend)
+        current_app.extensions['cache_fragmentos'] = cache
+    return cache
+
+
+def renderizar_tarjetas(productos):
+    # Devuelve el HTML de las tarjetas en el mismo orden que 'productos'.
+    # Se hacen dos lecturas agrupadas al backend (versiones y fragmentos) y solo se renderizan los fallos.
+    cache = _cache()
+    backend = cache.backend
+
+    versiones = backend.contadores(['version:catalogo'] + [f'version:producto:{p.id}' for p in productos])
+    version_global, versiones = versiones[0], versiones[1:]
+    claves = [f'tarjeta:{version_global}:{p.id}:{v}' for p, v in zip(productos, versiones)]
+
+    tarjetas = backend.obtener_varios(claves)
+    pendientes = [p.id for p, tarjeta in zip(productos, tarjetas) if tarjeta is None]
+    imagenes = imagenes_principales(pendientes) if pendientes else {}
+    for posicion, (producto, clave) in enumerate(zip(productos, claves)):
+        if tarjetas[posicion] is None:
+            tarjetas[posicion] = render_template('_tarjeta_producto.html', producto=producto,
+                                                 imagen=imagenes.get(producto.id))
+            backend.guardar(clave, tarjetas[posicion])
+    cache._contar(len(productos) - len(pendientes), len(pendientes))
+
+    return [Markup(tarjeta) for tarjeta in tarjetas]
+
+
+def fragmento_producto(id_producto, nombre, generar):
+    # Texto cacheado que depende de un solo producto (por ejemplo su página de detalle), con la clave
+    # <nombre>:<global>:<id>:<versión>. 'generar' se llama solo en un fallo y devuelve el texto, o None si el
+    # producto no existe (no se guarda). Las versiones se leen antes de generar y los contadores solo suben
+    # después del COMMIT de cada cambio: si el producto cambia mientras tanto, el resultado queda guardado con
+    # la versión anterior y no se vuelve a servir. Las escrituras que no pasan por el ORM deben llamar a
+    # invalidar_producto() también después de su COMMIT.
+    cache = _cache()
+    backend = cache.backend
+    version_global, version = backend.contadores(['version:catalogo', f'version:producto:{id_producto}'])
+    clave = f'{nombre}:{version_global}:{id_producto}:{version}'
+    texto = backend.obtener(clave)
+    if texto is not None:
+        cache._contar(1, 0)
+        return texto
+    cache._contar(0, 1)
+    texto = generar()
+    if texto is not None:
+        backend.guardar(clave, texto)
+    return texto
+
+
+def imagenes_principales(ids_productos):
+    # Imagen principal (o la primera) de cada producto en una sola consulta: {id_producto: ImagenProducto}
+    consulta = (db.select(ImagenProducto)
+                .where(ImagenProducto.id_producto.in_(ids_productos))
+                .order_by(ImagenProducto.id_producto, ImagenProducto.es_principal.desc().nulls_last(),
+                          ImagenProducto.id)
+                .distinct(ImagenProducto.id_producto))
+    return {imagen.id_producto: imagen
+            for imagen in db.session.scalars(consulta, bind_arguments=opciones_lectura())}
+
+
+def estadisticas_fragmentos():
+    return _cache().estadisticas()
+
+
+def invalidar_producto(id_producto):
+    if id_producto is not None:
+        _cache().backend.incrementar(f'version:producto:{id_producto}')
+
+
+def invalidar_todo():
+    _cache().backend.incrementar('version:catalogo')
+
+
+def invalidacion_compartida():
+    # True si las invalidaciones de este proceso llegan a los demás (backend compartido)
+    return current_app.config['CACHE_FRAGMENTOS_BACKEND'] == 'redis'
+
+
+# Invalidación por escritura: cualquier cambio del producto o de sus imágenes, variantes y reseñas.
+# Los eventos del mapper se disparan en el flush, antes del COMMIT: si el contador subiera entonces, otra
+# petición podría leer la versión nueva junto con la fila anterior (aún no confirmada la nueva) y guardar HTML
+# desactualizado con la clave nueva. Por eso solo se anotan los productos en session.info y los contadores
+# se incrementan tras el COMMIT; si la transacción se deshace, se descartan.
+def _anotar_producto(target, id_producto):
+    sesion = object_session(target)
+    if sesion is not None and id_producto is not None:
+        sesion.info.setdefault('productos_modificados', set()).add(id_producto)
+
+
+@event.listens_for(Producto, 'after_update')
+@event.listens_for(Producto, 'after_delete')
+def _producto_modificado(mapper, connection, target):
+    _anotar_producto(target, target.id)
+
+
+@event.listens_for(ImagenProducto, 'after_insert')
+@event.listens_for(ImagenProducto, 'after_update')
+@event.listens_for(ImagenProducto, 'after_delete')
+@event.listens_for(VarianteProducto, 'after_insert')
+@event.listens_for(VarianteProducto, 'after_update')
+@event.listens_for(VarianteProducto, 'after_delete')
+@event.listens_for(Resena, 'after_insert')
+@event.listens_for(Resena, 'after_update')
+@event.listens_for(Resena, 'after_delete')
+def _hijo_de_producto_modificado(mapper, connection, target):
+    _anotar_producto(target, target.id_producto)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidar_tras_commit(sesion):
+    for id_producto in sesion.info.pop('productos_modificados', ()):
+        invalidar_producto(id_producto)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_tras_rollback(sesion):
+    sesion.info.pop('productos_modificados', None)
@@ -0,0 +1,82 @@
+from flask import current_app
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session
+from app import db
+from app.cache import CacheLRU
+from app.models import Usuario
+
+# Caché de identidad del usuario de la sesión.
+# Flask-Login reconstruye current_user en cada petición autenticada; para no pagar un viaje a la base
+# de datos cada vez, se guarda una copia de las columnas del usuario en una caché LRU con TTL del proceso.
+# Al recuperarla se vuelve a asociar a la sesión con merge(load=False), que no emite ninguna consulta.
+# La caché es de cada proceso: un cambio hecho en otro worker solo llega a esta copia al cumplirse el TTL.
+# Por eso no guarda los datos de autorización (rol y password_hash): quedan expirados en el usuario
+# reconstruido y se leen de la base de datos cuando se usan (panel de administración, perfil), así que
+# degradar a un administrador o cambiar una contraseña tiene efecto inmediato en todos los procesos.
+# Las páginas normales (catálogo, carrito) solo usan el id y el nombre y no consultan nada.
+# En este proceso la entrada se invalida cuando el usuario se modifica o se elimina a través del ORM, después
+# del COMMIT: invalidar en el flush dejaría que otra petición volviera a cachear la fila anterior.
+
+# Columnas que no se guardan en la caché
+NO_CACHEADAS = ('rol', 'password_hash')
+
+
+def _cache():
+    cache = current_app.extensions.get('cache_usuarios')
+    if cache is None:
+        cache = CacheLRU(maximo=current_app.config['USUARIOS_CACHE_MAXIMO'],
+                         ttl=current_app.config['USUARIOS_CACHE_TTL'])
+        current_app.extensions['cache_usuarios'] = cache
+    return cache
+
+
+def _columnas(usuario):
+    return {atributo.key: getattr(usuario, atributo.key) for atributo in inspect(Usuario).column_attrs
+            if atributo.key not in NO_CACHEADAS}
+
+
+def cargar_usuario(id_usuario):
+    # Devuelve el usuario asociado a la sesión actual, consultando la base de datos solo si no está en caché
+    cache = _cache()
+    datos = cache.obtener(id_usuario)
+    if datos is not None:
+        usuario = Usuario(**datos)
+        make_transient_to_detached(usuario)
+        usuario = db.session.merge(usuario, load=False)
+        # Las columnas no cacheadas quedan expiradas: el primer acceso las carga con un SELECT
+        pendientes = set(NO_CACHEADAS) & inspect(usuario).unloaded
+        if pendientes:
+            db.session.expire(usuario, pendientes)
+        return usuario
+
+    usuario = db.session.get(Usuario, id_usuario)
+    if usuario is not None:
+        cache.guardar(id_usuario, _columnas(usuario))
+    return usuario
+
+
+def invalidar_usuario(id_usuario):
+    cache = current_app.extensions.get('cache_usuarios')
+    if cache is not None:
+        cache.eliminar(id_usuario)
+
+
+# Cualquier UPDATE o DELETE de un usuario a través del ORM invalida su entrada en la caché cuando la
+# transacción se confirma; si se deshace, no hay nada que invalidar
+@event.listens_for(Usuario, 'after_update')
+@event.listens_for(Usuario, 'after_delete')
+def _usuario_modificado(mapper, connection, target):
+    sesion = object_session(target)
+    if sesion is not None:
+        sesion.info.setdefault('usuarios_modificados', set()).add(target.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidar_tras_commit(sesion):
+    for id_usuario in sesion.info.pop('usuarios_modificados', ()):
+        invalidar_usuario(id_usuario)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_tras_rollback(sesion):
+    sesion.info.pop('usuarios_modificados', None)
@@ -0,0 +1,200 @@
+import hashlib
+import multiprocessing
+import os
+import shutil
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from io import BytesIO
+from flask import current_app, send_from_directory
+from app import db
+from app.models import ImagenProducto
+from app.fragmentos import invalidar_producto
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow solo hace falta para procesar imágenes ('flask imagenes ...'), no para servirlas
+    Image = ImageOps = None
+
+# Procesado de las imágenes de producto.
+# A partir del original de cada ImagenProducto (un archivo subido con 'flask imagenes subir' o una URL externa)
+# se generan los tamaños de IMAGENES_TAMANOS en WebP y JPEG. El trabajo de Pillow es intensivo en CPU y se
+# reparte en un pool de procesos; el proceso principal solo lee de la base de datos y guarda los resultados.
+# Los archivos se guardan direccionados por contenido, <h[:2]>/<h>/<tamaño>.<formato> con h = SHA-256 del
+# original: la misma foto subida dos veces comparte archivos y una URL nunca cambia de contenido, así que se
+# sirven con caché inmutable de un año. El hash se guarda en hash_contenido; al reprocesar, las imágenes cuyo
+# original no ha cambiado (y cuyos archivos siguen en disco) se saltan sin decodificarlas.
+# Las plantillas usan el macro de _imagen.html, que genera <picture> con srcset y loading="lazy".
+
+PREFIJO_URL = '/imagenes/'
+FORMATOS = (('webp', 'WEBP'), ('jpeg', 'JPEG'))
+EXTENSIONES = {'webp': '.webp', 'jpeg': '.jpg'}
+UN_ANIO = 31536000
+
+
+def directorio_imagenes(app=None):
+    app = app or current_app
+    return app.config['IMAGENES_DIRECTORIO'] or os.path.join(app.instance_path, 'imagenes')
+
+
+def hash_archivo(ruta):
+    sha = hashlib.sha256()
+    with open(ruta, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(1 << 16), b''):
+            sha.update(bloque)
+    return sha.hexdigest()
+
+
+def _ruta_variante(huella, nombre, formato):
+    return f'{huella[:2]}/{huella}/{nombre}{EXTENSIONES[formato]}'
+
+
+def _leer_original(origen, directorio):
+    # Devuelve el contenido del original: una ruta servida por la tienda (/imagenes/...) o una URL http(s)
+    if origen.startswith(PREFIJO_URL):
+        with open(os.path.join(directorio, origen[len(PREFIJO_URL):]), 'rb') as archivo:
+            return archivo.read()
+    if origen.startswith(('http://', 'https://')):
+        with urllib.request.urlopen(origen, timeout=30) as respuesta:
+            return respuesta.read()
+    raise ValueError(f'Origen de imagen no admitido: {origen}')
+
+
+def _guardar(imagen, ruta, formato_pil, calidad):
+    # Escritura atómica: otro proceso (o el servidor) nunca ve un archivo a medias
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    temporal = f'{ruta}.{os.getpid()}.tmp'
+    opciones = {'quality': calidad}
+    if formato_pil == 'JPEG':
+        opciones.update(optimize=True, progressive=True)
+    else:
+        opciones.update(method=4)
+    imagen.save(temporal, formato_pil, **opciones)
+    os.replace(temporal, ruta)
+
+
+def procesar_imagen(id_imagen, origen, hash_anterior, variantes_anteriores, directorio, tamanos, calidad, forzar=False):
+    # Se ejecuta en un proceso del pool; no usa la base de datos ni la aplicación.
+    # Devuelve (id_imagen, hash, variantes); variantes es None si la imagen no ha cambiado.
+    contenido = _leer_original(origen, directorio)
+    huella = hashlib.sha256(contenido).hexdigest()
+    if (not forzar and huella == hash_anterior and variantes_anteriores
+            and all(os.path.isfile(os.path.join(directorio, variante[formato]))
+                    for variante in variantes_anteriores.values() for formato, _ in FORMATOS)):
+        return id_imagen, huella, None
+
+    with Image.open(BytesIO(contenido)) as original:
+        original = ImageOps.exif_transpose(original)
+        # JPEG no admite transparencia: se compone sobre fondo blanco. WebP la conserva.
+        con_alfa = original.mode in ('RGBA', 'LA') or (original.mode == 'P' and 'transparency' in original.info)
+        original = original.convert('RGBA' if con_alfa else 'RGB')
+
+        variantes = {}
+        for nombre, lado in sorted(tamanos.items(), key=lambda tamano: tamano[1]):
+            copia = original.copy()
+            # thumbnail conserva la proporción y nunca amplía una imagen más pequeña que el tamaño pedido
+            copia.thumbnail((lado, lado), Image.Resampling.LANCZOS)
+            variante = {'ancho': copia.width, 'alto': copia.height}
+            for formato, formato_pil in FORMATOS:
+                relativa = _ruta_variante(huella, nombre, formato)
+                ruta = os.path.join(directorio, relativa)
+                if forzar or not os.path.isfile(ruta):
+                    if formato == 'jpeg' and con_alfa:
+                        fondo = Image.new('RGB', copia.size, (255, 255, 255))
+                        fondo.paste(copia, mask=copia.getchannel('A'))
+                        _guardar(fondo, ruta, formato_pil, calidad[formato])
+                    else:
+                        _guardar(copia, ruta, formato_pil, calidad[formato])
+                variante[formato] = relativa
+            variantes[nombre] = variante
+    return id_imagen, huella, variantes
+
+
+def guardar_original(ruta):
+    # Copia un archivo subido al almacén (originales/<h[:2]>/<h><ext>) y devuelve su URL para url_imagen
+    huella = hash_archivo(ruta)
+    extension = os.path.splitext(ruta)[1].lower() or '.img'
+    relativa = f'originales/{huella[:2]}/{huella}{extension}'
+    destino = os.path.join(directorio_imagenes(), relativa)
+    if not os.path.isfile(destino):
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        temporal = f'{destino}.{os.getpid()}.tmp'
+        shutil.copyfile(ruta, temporal)
+        os.replace(temporal, destino)
+    return PREFIJO_URL + relativa
+
+
+def _guardar_resultados(resultados):
+    # UPDATE por clave primaria de todo el lote; no pasa por los eventos del ORM, así que las tarjetas de los
+    # productos afectados se invalidan a mano (en los demás procesos, solo con la caché de fragmentos en redis)
+    if not resultados:
+        return
+    ahora = datetime.now(timezone.utc)
+    db.session.execute(db.update(ImagenProducto), [
+        {'id': id_imagen, 'hash_contenido': huella, 'variantes': variantes, 'procesada_en': ahora}
+        for id_imagen, huella, variantes in resultados
+    ])
+    productos = db.session.scalars(db.select(ImagenProducto.id_producto).distinct()
+                                   .where(ImagenProducto.id.in_([fila[0] for fila in resultados]))).all()
+    db.session.commit()
+    for id_producto in productos:
+        invalidar_producto(id_producto)
+
+
+def procesar_pendientes(todas=False, forzar=False, trabajadores=None, lote=100, ids=None,
+                        al_progresar=None, al_error=None):
+    # Procesa las imágenes sin procesar (o todas con todas=True, saltando las que no han cambiado).
+    # Devuelve un resumen con el número de imágenes procesadas, sin cambios y con errores.
+    if Image is None:
+        raise RuntimeError('El procesado de imágenes necesita Pillow (pip install Pillow).')
+    config = current_app.config
+    directorio = directorio_imagenes()
+    tamanos = config['IMAGENES_TAMANOS']
+    calidad = {'webp': config['IMAGENES_CALIDAD_WEBP'], 'jpeg': config['IMAGENES_CALIDAD_JPEG']}
+    trabajadores = trabajadores or config['IMAGENES_TRABAJADORES'] or os.cpu_count()
+
+    consulta = db.select(ImagenProducto.id, ImagenProducto.url_imagen, ImagenProducto.hash_contenido,
+                         ImagenProducto.variantes).order_by(ImagenProducto.id)
+    if ids is not None:
+        consulta = consulta.where(ImagenProducto.id.in_(ids))
+    elif not (todas or forzar):
+        consulta = consulta.where(ImagenProducto.variantes.is_(None))
+    pendientes = db.session.execute(consulta).all()
+    db.session.rollback()
+
+    resumen = {'procesadas': 0, 'sin_cambios': 0, 'errores': 0}
+    # 'spawn': los hijos no heredan el pool de conexiones ni los hilos de la aplicación (importar app es barato)
+    with ProcessPoolExecutor(max_workers=trabajadores, mp_context=multiprocessing.get_context('spawn')) as pool:
+        for inicio in range(0, len(pendientes), lote):
+            futuros = [pool.submit(procesar_imagen, fila.id, fila.url_imagen, fila.hash_contenido, fila.variantes,
+                                   directorio, tamanos, calidad, forzar)
+                       for fila in pendientes[inicio:inicio + lote]]
+            resultados = []
+            for fila, futuro in zip(pendientes[inicio:inicio + lote], futuros):
+                try:
+                    id_imagen, huella, variantes = futuro.result()
+                except Exception as error:
+                    resumen['errores'] += 1
+                    if al_error:
+                        al_error(fila.id, str(error))
+                    continue
+                if variantes is None:
+                    resumen['sin_cambios'] += 1
+                else:
+                    resultados.append((id_imagen, huella, variantes))
+            _guardar_resultados(resultados)
+            resumen['procesadas'] += len(resultados)
+            if al_progresar:
+                al_progresar(resumen)
+    return resumen
+
+
+def init_app(app):
+    directorio = directorio_imagenes(app)
+
+    # Los archivos están direccionados por contenido: una URL siempre devuelve los mismos bytes
+    @app.route(PREFIJO_URL + '<path:ruta>', endpoint='imagen')
+    def imagen(ruta):
+        respuesta = send_from_directory(directorio, ruta, max_age=UN_ANIO)
+        respuesta.headers['Cache-Control'] = f'public, max-age={UN_ANIO}, immutable'
+        return respuesta
@@ -0,0 +1,305 @@
+import csv
+import io
+import json
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from app import db
+from app.cache_http import incrementar_version_catalogo
+
+# Importación y exportación masiva del catálogo.
+# El archivo (CSV o JSONL, una fila por producto o por variante de producto) se procesa como una cadena de
+# generadores: leer_filas -> normalizar_filas -> lotes. Cada lote se carga con COPY en una tabla temporal de
+# staging y desde ahí se aplica un upsert basado en conjuntos a productos, variantes_producto e
+# imagenes_producto. Solo un lote vive en memoria a la vez, así que el consumo no depende del tamaño del archivo.
+# Las categorías y proveedores se resuelven por nombre con un mapa en memoria; los que no existen se crean.
+
+COLUMNAS = ['sku', 'nombre', 'descripcion', 'precio_compra', 'precio_venta', 'stock', 'categoria', 'proveedor',
+            'nombre_variante', 'valor_variante', 'precio_adicional', 'stock_variante', 'url_imagen']
+
+_COLUMNAS_STAGING = ['linea', 'sku', 'nombre', 'descripcion', 'precio_compra', 'precio_venta', 'stock',
+                     'id_categoria', 'id_proveedor', 'nombre_variante', 'valor_variante', 'precio_adicional',
+                     'stock_variante', 'url_imagen']
+
+_CREAR_STAGING = """
+    CREATE TEMPORARY TABLE IF NOT EXISTS staging_productos (
+        linea integer NOT NULL,
+        sku varchar(64) NOT NULL,
+        nombre varchar(100) NOT NULL,
+        descripcion text,
+        precio_compra numeric(10, 2) NOT NULL,
+        precio_venta numeric(10, 2) NOT NULL,
+        stock integer NOT NULL,
+        id_categoria integer,
+        id_proveedor integer,
+        nombre_variante varchar(50),
+        valor_variante varchar(50),
+        precio_adicional numeric(10, 2),
+        stock_variante integer,
+        url_imagen varchar(255)
+    )
+"""
+
+# Si un SKU aparece en varias filas, gana la última del archivo (linea DESC)
+_UPSERT_PRODUCTOS = """
+    INSERT INTO productos (sku, nombre, descripcion, precio_compra, precio_venta, stock, id_categoria, id_proveedor)
+    SELECT DISTINCT ON (sku) sku, nombre, descripcion, precio_compra, precio_venta, stock, id_categoria, id_proveedor
+    FROM staging_productos
+    ORDER BY sku, linea DESC
+    ON CONFLICT (sku) DO UPDATE SET
+        nombre = EXCLUDED.nombre,
+        descripcion = EXCLUDED.descripcion,
+        precio_compra = EXCLUDED.precio_compra,
+        precio_venta = EXCLUDED.precio_venta,
+        stock = EXCLUDED.stock,
+        id_categoria = EXCLUDED.id_categoria,
+        id_proveedor = EXCLUDED.id_proveedor
+"""
+
+_UPSERT_VARIANTES = """
+    INSERT INTO variantes_producto (id_producto, nombre_variante, valor_variante, precio_adicional, stock_variante)
+    SELECT DISTINCT ON (p.id, s.nombre_variante, s.valor_variante)
+           p.id, s.nombre_variante, s.valor_variante, coalesce(s.precio_adicional, 0), coalesce(s.stock_variante, 0)
+    FROM staging_productos s
+    JOIN productos p ON p.sku = s.sku
+    WHERE s.nombre_variante IS NOT NULL AND s.valor_variante IS NOT NULL
+    ORDER BY p.id, s.nombre_variante, s.valor_variante, s.linea DESC
+    ON CONFLICT (id_producto, nombre_variante, valor_variante) DO UPDATE SET
+        precio_adicional = EXCLUDED.precio_adicional,
+        stock_variante = EXCLUDED.stock_variante
+"""
+
+_INSERTAR_IMAGENES = """
+    INSERT INTO imagenes_producto (id_producto, url_imagen, es_principal)
+    SELECT DISTINCT p.id, s.url_imagen, false
+    FROM staging_productos s
+    JOIN productos p ON p.sku = s.sku
+    WHERE s.url_imagen IS NOT NULL
+      AND NOT EXISTS (SELECT 1 FROM imagenes_producto i WHERE i.id_producto = p.id AND i.url_imagen = s.url_imagen)
+"""
+
+_EXPORTAR = """
+    SELECT p.sku, p.nombre, p.descripcion, p.precio_compra, p.precio_venta, p.stock,
+           c.nombre AS categoria, pr.nombre AS proveedor,
+           v.nombre_variante, v.valor_variante, v.precio_adicional, v.stock_variante,
+           i.url_imagen
+    FROM productos p
+    LEFT JOIN categorias c ON c.id = p.id_categoria
+    LEFT JOIN proveedores pr ON pr.id = p.id_proveedor
+    LEFT JOIN variantes_producto v ON v.id_producto = p.id
+    LEFT JOIN LATERAL (
+        SELECT url_imagen FROM imagenes_producto
+        WHERE id_producto = p.id ORDER BY es_principal DESC, id LIMIT 1
+    ) i ON true
+    ORDER BY p.id, v.id
+"""
+
+
+# Límites de las columnas de destino: numeric(10, 2) para los importes e integer para las cantidades. Se validan
+# aquí para que una fila fuera de rango se notifique como error de esa fila y no haga fallar el COPY del lote.
+CENTIMO = Decimal('0.01')
+MAXIMO_IMPORTE = Decimal('99999999.99')
+MAXIMO_ENTERO = 2 ** 31 - 1
+
+
+class ErrorFila(Exception):
+    pass
+
+
+def leer_filas(archivo, formato):
+    # Genera tuplas (número de línea, diccionario) a partir de un archivo CSV con cabecera o JSONL
+    if formato == 'jsonl':
+        for numero, linea in enumerate(archivo, start=1):
+            if linea.strip():
+                try:
+                    yield numero, json.loads(linea)
+                except json.JSONDecodeError as error:
+                    yield numero, ErrorFila(f'JSON inválido: {error.msg}')
+    else:
+        for numero, fila in enumerate(csv.DictReader(archivo), start=2):
+            yield numero, fila
+
+
+class ResolutorNombres:
+    # Mapa en memoria nombre -> id para categorías y proveedores; crea los que no existen
+    def __init__(self, conexion):
+        self.conexion = conexion
+        self.categorias = dict(conexion.execute(db.text('SELECT nombre, id FROM categorias')).all())
+        self.proveedores = {}
+        for nombre, id_proveedor in conexion.execute(db.text('SELECT nombre, id FROM proveedores ORDER BY id')):
+            self.proveedores.setdefault(nombre, id_proveedor)
+
+    def categoria(self, nombre):
+        if not nombre:
+            return None
+        if nombre not in self.categorias:
+            self.categorias[nombre] = self.conexion.execute(db.text(
+                'INSERT INTO categorias (nombre) VALUES (:nombre) '
+                'ON CONFLICT (nombre) DO UPDATE SET nombre = EXCLUDED.nombre RETURNING id'), {'nombre': nombre}).scalar()
+        return self.categorias[nombre]
+
+    def proveedor(self, nombre):
+        if not nombre:
+            return None
+        if nombre not in self.proveedores:
+            self.proveedores[nombre] = self.conexion.execute(db.text(
+                'INSERT INTO proveedores (nombre) VALUES (:nombre) RETURNING id'), {'nombre': nombre}).scalar()
+        return self.proveedores[nombre]
+
+
+def _texto(fila, campo, maximo=None, obligatorio=False):
+    valor = fila.get(campo)
+    valor = str(valor).strip() if valor not in (None, '') else None
+    if obligatorio and not valor:
+        raise ErrorFila(f'falta el campo "{campo}"')
+    if valor and maximo and len(valor) > maximo:
+        raise ErrorFila(f'"{campo}" supera los {maximo} caracteres')
+    return valor
+
+
+def _decimal(fila, campo, obligatorio=False):
+    # Importe con dos decimales que cabe en numeric(10, 2)
+    valor = _texto(fila, campo, obligatorio=obligatorio)
+    if valor is None:
+        return None
+    try:
+        numero = Decimal(valor.replace(',', '.'))
+    except InvalidOperation:
+        raise ErrorFila(f'"{campo}" no es un número: {valor}')
+    if not numero.is_finite():
+        raise ErrorFila(f'"{campo}" no es un número: {valor}')
+    if numero < 0:
+        raise ErrorFila(f'"{campo}" no puede ser negativo')
+    # Se compara antes de redondear: quantize() falla con números de más de 28 cifras
+    if numero >= MAXIMO_IMPORTE + 1 or numero.quantize(CENTIMO) > MAXIMO_IMPORTE:
+        raise ErrorFila(f'"{campo}" supera el máximo de {MAXIMO_IMPORTE}')
+    return numero.quantize(CENTIMO)
+
+
+def _entero(fila, campo, obligatorio=False):
+    # Cantidad no negativa que cabe en una columna integer
+    valor = _texto(fila, campo, obligatorio=obligatorio)
+    if valor is None:
+        return None
+    try:
+        numero = int(valor)
+    except ValueError:
+        raise ErrorFila(f'"{campo}" no es un número entero: {valor}')
+    if numero < 0:
+        raise ErrorFila(f'"{campo}" no puede ser negativo')
+    if numero > MAXIMO_ENTERO:
+        raise ErrorFila(f'"{campo}" supera el máximo de {MAXIMO_ENTERO}')
+    return numero
+
+
+def normalizar_filas(filas, resolutor, al_error):
+    # Valida cada fila y la convierte en una tupla con el orden de la tabla de staging.
+    # Las filas inválidas se notifican a al_error(línea, mensaje) y se descartan.
+    # La categoría y el proveedor se resuelven (y se crean si no existen) solo cuando el resto de la fila es
+    # válido: una fila rechazada no deja categorías ni proveedores huérfanos.
+    for numero, fila in filas:
+        try:
+            if isinstance(fila, ErrorFila):
+                raise fila
+            if not isinstance(fila, dict):
+                raise ErrorFila('la fila no es un objeto JSON')
+            sku = _texto(fila, 'sku', 64, obligatorio=True)
+            nombre = _texto(fila, 'nombre', 100, obligatorio=True)
+            descripcion = _texto(fila, 'descripcion')
+            precio_compra = _decimal(fila, 'precio_compra', obligatorio=True)
+            precio_venta = _decimal(fila, 'precio_venta', obligatorio=True)
+            stock = _entero(fila, 'stock') or 0
+            categoria = _texto(fila, 'categoria', 50)
+            proveedor = _texto(fila, 'proveedor', 100)
+            nombre_variante = _texto(fila, 'nombre_variante', 50)
+            valor_variante = _texto(fila, 'valor_variante', 50)
+            precio_adicional = _decimal(fila, 'precio_adicional')
+            stock_variante = _entero(fila, 'stock_variante')
+            url_imagen = _texto(fila, 'url_imagen', 255)
+        except ErrorFila as error:
+            al_error(numero, str(error))
+            continue
+        yield (numero, sku, nombre, descripcion, precio_compra, precio_venta, stock,
+               resolutor.categoria(categoria), resolutor.proveedor(proveedor),
+               nombre_variante, valor_variante, precio_adicional, stock_variante, url_imagen)
+
+
+def lotes(iterable, tamano):
+    iterador = iter(iterable)
+    while True:
+        lote = list(islice(iterador, tamano))
+        if not lote:
+            return
+        yield lote
+
+
+def _copiar_lote(cursor, lote):
+    # COPY ... FROM STDIN desde un búfer con las filas del lote en formato CSV
+    bufer = io.StringIO()
+    escritor = csv.writer(bufer)
+    for fila in lote:
+        escritor.writerow(['' if valor is None else valor for valor in fila])
+    bufer.seek(0)
+    cursor.copy_expert(
+        f"COPY staging_productos ({', '.join(_COLUMNAS_STAGING)}) FROM STDIN WITH (FORMAT csv, NULL '')", bufer)
+
+
+def importar_catalogo(archivo, formato='csv', tamano_lote=5000, al_progresar=None, al_error=None):
+    # Importa el archivo y devuelve un diccionario con el número de filas cargadas y con error.
+    # Cada lote se confirma por separado para que el progreso sea visible y duradero.
+    resumen = {'filas': 0, 'errores': 0}
+
+    def registrar_error(numero, mensaje):
+        resumen['errores'] += 1
+        if al_error:
+            al_error(numero, mensaje)
+
+    with db.engine.connect() as conexion:
+        conexion.execute(db.text(_CREAR_STAGING))
+        resolutor = ResolutorNombres(conexion)
+        filas = normalizar_filas(leer_filas(archivo, formato), resolutor, registrar_error)
+
+        for lote in lotes(filas, tamano_lote):
+            cursor = conexion.connection.dbapi_connection.cursor()
+            try:
+                _copiar_lote(cursor, lote)
+            finally:
+                cursor.close()
+            conexion.execute(db.text(_UPSERT_PRODUCTOS))
+            conexion.execute(db.text(_UPSERT_VARIANTES))
+            conexion.execute(db.text(_INSERTAR_IMAGENES))
+            conexion.execute(db.text('TRUNCATE staging_productos'))
+            conexion.commit()
+            # La conexión no es la sesión del ORM: la versión del catálogo se incrementa a mano tras cada COMMIT
+            incrementar_version_catalogo()
+
+            resumen['filas'] += len(lote)
+            if al_progresar:
+                al_progresar(resumen['filas'], resumen['errores'])
+
+        conexion.execute(db.text('DROP TABLE IF EXISTS staging_productos'))
+        conexion.commit()
+    return resumen
+
+
+def exportar_catalogo(archivo, formato='csv', tamano_lote=5000, al_progresar=None):
+    # Escribe el catálogo leyendo con un cursor del lado del servidor, de tamano_lote en tamano_lote filas
+    escritor = None
+    if formato != 'jsonl':
+        escritor = csv.writer(archivo)
+        escritor.writerow(COLUMNAS)
+
+    total = 0
+    with db.engine.connect() as conexion:
+        resultado = conexion.execution_options(stream_results=True, yield_per=tamano_lote).execute(db.text(_EXPORTAR))
+        for particion in resultado.partitions():
+            for fila in particion:
+                if escritor:
+                    escritor.writerow(['' if valor is None else valor for valor in fila])
+                else:
+                    datos = {columna: (str(valor) if isinstance(valor, Decimal) else valor)
+                             for columna, valor in zip(COLUMNAS, fila)}
+                    archivo.write(json.dumps(datos, ensure_ascii=False) + '\n')
+            total += len(particion)
+            if al_progresar:
+                al_progresar(total)
+    return total
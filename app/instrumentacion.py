@@ -0,0 +1,246 @@
+import hashlib
+import hmac
+import json
+import logging
+import re
+import threading
+import time
+from collections import defaultdict
+from flask import Response, current_app, g, has_request_context, request, abort, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Instrumentación por petición.
+# Para cada petición se registra el número de consultas SQL, el tiempo total en la base de datos, la consulta
+# más lenta, el tiempo de renderizado de plantillas y la latencia total. Los datos se exponen de tres formas:
+#   - cabecera Server-Timing (visible en las herramientas de desarrollo del navegador);
+#   - una línea de log en JSON por petición (logger 'tienda.peticiones');
+#   - el endpoint /metrics en formato de texto de Prometheus (métricas acumuladas de este proceso), que exige
+#     INSTRUMENTACION_METRICAS_TOKEN o, si no está definido, solo responde a peticiones locales.
+# Las consultas que superan INSTRUMENTACION_CONSULTA_LENTA_MS se registran en el logger 'tienda.consultas_lentas'
+# junto con su huella: la sentencia normalizada (literales sustituidos por ?) y un hash corto de la misma.
+
+registro_peticiones = logging.getLogger('tienda.peticiones')
+registro_consultas_lentas = logging.getLogger('tienda.consultas_lentas')
+
+# Clientes a los que se sirve /metrics cuando no hay INSTRUMENTACION_METRICAS_TOKEN
+DIRECCIONES_LOCALES = ('127.0.0.1', '::1')
+
+# Límites superiores (en segundos) de los buckets del histograma de latencia
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_LITERAL_TEXTO = re.compile(r"'(?:[^']|'')*'")
+_LITERAL_NUMERO = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PARAMETRO = re.compile(r'%\(\w+\)s|%s|\$\d+')
+_LISTA_IN = re.compile(r'\bIN\s*\((?:\s*\?\s*,?)+\)', re.IGNORECASE)
+_ESPACIOS = re.compile(r'\s+')
+
+
+def huella_sentencia(sentencia):
+    # Normaliza la sentencia para agrupar las que solo difieren en sus valores
+    normalizada = _LITERAL_TEXTO.sub('?', sentencia)
+    normalizada = _PARAMETRO.sub('?', normalizada)
+    normalizada = _LITERAL_NUMERO.sub('?', normalizada)
+    normalizada = _LISTA_IN.sub('IN (...)', normalizada)
+    normalizada = _ESPACIOS.sub(' ', normalizada).strip()
+    return normalizada, hashlib.md5(normalizada.encode('utf-8')).hexdigest()[:12]
+
+
+class Metricas:
+    # Acumulador de métricas del proceso, con etiquetas (endpoint, método, estado)
+    def __init__(self):
+        self._candado = threading.Lock()
+        self.peticiones = defaultdict(int)
+        self.histograma = defaultdict(lambda: [0] * (len(BUCKETS) + 1))
+        self.suma_duracion = defaultdict(float)
+        self.consultas = defaultdict(int)
+        self.tiempo_sql = defaultdict(float)
+        self.tiempo_plantillas = defaultdict(float)
+        self.consultas_lentas = 0
+
+    def registrar(self, endpoint, metodo, estado, duracion, consultas, tiempo_sql, tiempo_plantillas):
+        with self._candado:
+            self.peticiones[(endpoint, metodo, estado)] += 1
+            cubetas = self.histograma[endpoint]
+            for posicion, limite in enumerate(BUCKETS):
+                if duracion <= limite:
+                    cubetas[posicion] += 1
+                    break
+            else:
+                cubetas[-1] += 1
+            self.suma_duracion[endpoint] += duracion
+            self.consultas[endpoint] += consultas
+            self.tiempo_sql[endpoint] += tiempo_sql
+            self.tiempo_plantillas[endpoint] += tiempo_plantillas
+
+    def registrar_consulta_lenta(self):
+        with self._candado:
+            self.consultas_lentas += 1
+
+    def exportar(self):
+        # Formato de exposición de texto de Prometheus
+        lineas = []
+        with self._candado:
+            lineas.append('# HELP tienda_peticiones_total Peticiones HTTP atendidas.')
+            lineas.append('# TYPE tienda_peticiones_total counter')
+            for (endpoint, metodo, estado), valor in sorted(self.peticiones.items()):
+                lineas.append(f'tienda_peticiones_total{{endpoint="{endpoint}",metodo="{metodo}",estado="{estado}"}} {valor}')
+
+            lineas.append('# HELP tienda_peticion_duracion_segundos Latencia total de las peticiones.')
+            lineas.append('# TYPE tienda_peticion_duracion_segundos histogram')
+            for endpoint, cubetas in sorted(self.histograma.items()):
+                acumulado = 0
+                for limite, valor in zip(BUCKETS, cubetas):
+                    acumulado += valor
+                    lineas.append(f'tienda_peticion_duracion_segundos_bucket{{endpoint="{endpoint}",le="{limite}"}} {acumulado}')
+                acumulado += cubetas[-1]
+                lineas.append(f'tienda_peticion_duracion_segundos_bucket{{endpoint="{endpoint}",le="+Inf"}} {acumulado}')
+                lineas.append(f'tienda_peticion_duracion_segundos_sum{{endpoint="{endpoint}"}} {self.suma_duracion[endpoint]:.6f}')
+                lineas.append(f'tienda_peticion_duracion_segundos_count{{endpoint="{endpoint}"}} {acumulado}')
+
+            for nombre, ayuda, datos in (
+                ('tienda_sql_consultas_total', 'Consultas SQL ejecutadas.', self.consultas),
+                ('tienda_sql_duracion_segundos_total', 'Tiempo total en la base de datos.', self.tiempo_sql),
+                ('tienda_plantillas_duracion_segundos_total', 'Tiempo total renderizando plantillas.', self.tiempo_plantillas),
+            ):
+                lineas.append(f'# HELP {nombre} {ayuda}')
+                lineas.append(f'# TYPE {nombre} counter')
+                for endpoint, valor in sorted(datos.items()):
+                    lineas.append(f'{nombre}{{endpoint="{endpoint}"}} {valor:.6f}' if isinstance(valor, float)
+                                  else f'{nombre}{{endpoint="{endpoint}"}} {valor}')
+
+            lineas.append('# HELP tienda_sql_consultas_lentas_total Consultas que superaron el umbral de consulta lenta.')
+            lineas.append('# TYPE tienda_sql_consultas_lentas_total counter')
+            lineas.append(f'tienda_sql_consultas_lentas_total {self.consultas_lentas}')
+        return '\n'.join(lineas) + '\n'
+
+
+def _antes_de_consulta(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._inicio_instrumentacion = time.perf_counter()
+
+
+def _despues_de_consulta(conn, cursor, statement, parameters, context, executemany):
+    inicio = getattr(context, '_inicio_instrumentacion', None)
+    if inicio is None:
+        return
+    duracion = time.perf_counter() - inicio
+    if not has_request_context() or 'instrumentacion' not in g:
+        return
+
+    datos = g.instrumentacion
+    datos['consultas'] += 1
+    datos['tiempo_sql'] += duracion
+    if duracion > datos['consulta_mas_lenta'][0]:
+        datos['consulta_mas_lenta'] = (duracion, statement)
+
+    umbral = current_app.config['INSTRUMENTACION_CONSULTA_LENTA_MS'] / 1000
+    if umbral and duracion >= umbral:
+        normalizada, huella = huella_sentencia(statement)
+        current_app.extensions['metricas'].registrar_consulta_lenta()
+        registro_consultas_lentas.warning(json.dumps({
+            'huella': huella,
+            'duracion_ms': round(duracion * 1000, 3),
+            'endpoint': request.endpoint,
+            'sentencia': normalizada,
+        }, ensure_ascii=False))
+
+
+def _antes_de_plantilla(app, template, context, **extra):
+    if has_request_context() and 'instrumentacion' in g:
+        g.instrumentacion['plantillas_pila'].append(time.perf_counter())
+
+
+def _despues_de_plantilla(app, template, context, **extra):
+    if not has_request_context() or 'instrumentacion' not in g:
+        return
+    pila = g.instrumentacion['plantillas_pila']
+    if pila:
+        inicio = pila.pop()
+        # Solo se suma el tiempo de las plantillas de primer nivel para no contar dos veces las anidadas
+        if not pila:
+            g.instrumentacion['tiempo_plantillas'] += time.perf_counter() - inicio
+
+
+def _inicio_peticion():
+    g.instrumentacion = {
+        'inicio': time.perf_counter(),
+        'consultas': 0,
+        'tiempo_sql': 0.0,
+        'consulta_mas_lenta': (0.0, None),
+        'tiempo_plantillas': 0.0,
+        'plantillas_pila': [],
+    }
+
+
+def _fin_peticion(respuesta):
+    datos = g.pop('instrumentacion', None)
+    if datos is None:
+        return respuesta
+
+    duracion = time.perf_counter() - datos['inicio']
+    endpoint = request.endpoint or 'desconocido'
+    current_app.extensions['metricas'].registrar(endpoint, request.method, respuesta.status_code, duracion,
+                                                 datos['consultas'], datos['tiempo_sql'], datos['tiempo_plantillas'])
+
+    if current_app.config['INSTRUMENTACION_SERVER_TIMING']:
+        respuesta.headers.add('Server-Timing', ', '.join([
+            f'db;dur={datos["tiempo_sql"] * 1000:.2f};desc="{datos["consultas"]} consultas"',
+            f'tpl;dur={datos["tiempo_plantillas"] * 1000:.2f}',
+            f'total;dur={duracion * 1000:.2f}',
+        ]))
+
+    lenta_duracion, lenta_sentencia = datos['consulta_mas_lenta']
+    registro_peticiones.info(json.dumps({
+        'metodo': request.method,
+        'ruta': request.path,
+        'endpoint': endpoint,
+        'estado': respuesta.status_code,
+        'duracion_ms': round(duracion * 1000, 3),
+        'consultas': datos['consultas'],
+        'sql_ms': round(datos['tiempo_sql'] * 1000, 3),
+        'plantillas_ms': round(datos['tiempo_plantillas'] * 1000, 3),
+        'consulta_mas_lenta_ms': round(lenta_duracion * 1000, 3),
+        'consulta_mas_lenta': huella_sentencia(lenta_sentencia)[1] if lenta_sentencia else None,
+    }, ensure_ascii=False))
+    return respuesta
+
+
+def _metricas_permitidas():
+    # Con INSTRUMENTACION_METRICAS_TOKEN, /metrics exige la cabecera "Authorization: Bearer <token>".
+    # Sin token solo se sirve a peticiones locales que no llegan a través de un proxy (un proxy inverso en la
+    # misma máquina también conecta desde 127.0.0.1, pero añade X-Forwarded-For)
+    token = current_app.config['INSTRUMENTACION_METRICAS_TOKEN']
+    if token:
+        return hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    reenviada = any(cabecera in request.headers for cabecera in ('X-Forwarded-For', 'X-Real-IP', 'Forwarded'))
+    return request.remote_addr in DIRECCIONES_LOCALES and not reenviada
+
+
+def metricas():
+    if not _metricas_permitidas():
+        abort(401 if current_app.config['INSTRUMENTACION_METRICAS_TOKEN'] else 403)
+    return Response(current_app.extensions['metricas'].exportar(), mimetype='text/plain; version=0.0.4')
+
+
+def init_app(app):
+    if not app.config['INSTRUMENTACION_HABILITADA']:
+        return
+    app.extensions['metricas'] = Metricas()
+
+    # Si nadie configuró los loggers de instrumentación, se envían a la salida de errores en formato JSON
+    for registro in (registro_peticiones, registro_consultas_lentas):
+        if not registro.handlers:
+            registro.addHandler(logging.StreamHandler())
+            registro.setLevel(app.config['INSTRUMENTACION_LOG_NIVEL'])
+
+    # Los eventos se registran sobre la clase Engine para cubrir el motor principal y la réplica
+    if not event.contains(Engine, 'before_cursor_execute', _antes_de_consulta):
+        event.listen(Engine, 'before_cursor_execute', _antes_de_consulta)
+        event.listen(Engine, 'after_cursor_execute', _despues_de_consulta)
+
+    before_render_template.connect(_antes_de_plantilla, app)
+    template_rendered.connect(_despues_de_plantilla, app)
+    app.before_request(_inicio_peticion)
+    app.after_request(_fin_peticion)
+    app.add_url_rule('/metrics', 'metricas', metricas)
@@ -0,0 +1,145 @@
+import json
+import logging
+import time
+from datetime import timedelta
+from flask import current_app
+from app import db
+from app.identidad import invalidar_usuario
+
+# Limpieza periódica de filas que ya no sirven: carritos abandonados (con sus líneas) y cuentas que nunca se
+# confirmaron. Se ejecuta con 'flask limpieza ejecutar' (por ejemplo desde cron).
+# El borrado va por lotes de LIMPIEZA_LOTE filas, cada uno en su propia transacción, de modo que ningún lote
+# mantiene bloqueos mucho tiempo ni genera de golpe todo el WAL de la limpieza; entre lotes se espera
+# LIMPIEZA_PAUSA_SEGUNDOS para que las réplicas y el autovacuum sigan el ritmo. Cada lote elige sus filas con
+# FOR UPDATE SKIP LOCKED: las que otra transacción está usando (un carrito al que se están añadiendo productos,
+# una fila que otra limpieza ya está borrando) se saltan y se recogen en la siguiente ejecución.
+# - Carritos: los que no reciben productos desde hace LIMPIEZA_CARRITOS_DIAS (CarritoCompras.actualizado_en).
+# - Usuarios: los que siguen sin confirmar el email LIMPIEZA_USUARIOS_SIN_CONFIRMAR_DIAS después de registrarse
+#   y no tienen pedidos ni reseñas. Sus carritos se borran con ellos.
+# Las líneas y carritos se borran explícitamente en la misma sentencia, sin depender de ON DELETE CASCADE.
+# Cada ejecución deja una línea JSON con las filas borradas en el logger 'tienda.limpieza'.
+# Las cuentas borradas se quitan de la caché de identidad de este proceso; en los demás su copia caduca con
+# USUARIOS_CACHE_TTL, y la copia no incluye el rol ni la contraseña (ver app/identidad.py).
+
+registro_limpieza = logging.getLogger('tienda.limpieza')
+
+_CARRITOS_CADUCADOS = """
+    FROM carrito_compras c
+    WHERE c.actualizado_en < :corte
+"""
+
+_USUARIOS_SIN_CONFIRMAR = """
+    FROM usuarios u
+    WHERE NOT u.email_confirmado AND u.creado_en < :corte
+      AND NOT EXISTS (SELECT 1 FROM pedidos p WHERE p.id_usuario = u.id)
+      AND NOT EXISTS (SELECT 1 FROM resenas r WHERE r.id_usuario = u.id)
+"""
+
+_BORRAR_CARRITOS = f"""
+    WITH lote AS (
+        SELECT c.id {_CARRITOS_CADUCADOS}
+        ORDER BY c.actualizado_en
+        LIMIT :lote
+        FOR UPDATE SKIP LOCKED
+    ),
+    lineas AS (
+        DELETE FROM detalle_carrito d USING lote WHERE d.id_carrito = lote.id RETURNING d.id
+    ),
+    carritos AS (
+        DELETE FROM carrito_compras c USING lote WHERE c.id = lote.id RETURNING c.id
+    )
+    SELECT (SELECT count(*) FROM carritos) AS carritos, (SELECT count(*) FROM lineas) AS lineas
+"""
+
+_BORRAR_USUARIOS = f"""
+    WITH lote AS (
+        SELECT u.id {_USUARIOS_SIN_CONFIRMAR}
+        ORDER BY u.creado_en
+        LIMIT :lote
+        FOR UPDATE SKIP LOCKED
+    ),
+    carritos_lote AS (
+        SELECT c.id FROM carrito_compras c JOIN lote ON c.id_usuario = lote.id
+    ),
+    lineas AS (
+        DELETE FROM detalle_carrito d USING carritos_lote WHERE d.id_carrito = carritos_lote.id RETURNING d.id
+    ),
+    carritos AS (
+        DELETE FROM carrito_compras c USING carritos_lote WHERE c.id = carritos_lote.id RETURNING c.id
+    ),
+    usuarios AS (
+        DELETE FROM usuarios u USING lote WHERE u.id = lote.id RETURNING u.id
+    )
+    SELECT (SELECT count(*) FROM usuarios) AS usuarios, (SELECT count(*) FROM carritos) AS carritos,
+           (SELECT count(*) FROM lineas) AS lineas, (SELECT array_agg(id) FROM usuarios) AS ids_usuarios
+"""
+
+_CONTAR_CARRITOS = f"""
+    SELECT count(*) AS carritos,
+           (SELECT count(*) FROM detalle_carrito d
+            WHERE d.id_carrito IN (SELECT c.id {_CARRITOS_CADUCADOS})) AS lineas
+    {_CARRITOS_CADUCADOS}
+"""
+
+_CONTAR_USUARIOS = f"""
+    SELECT count(*) AS usuarios {_USUARIOS_SIN_CONFIRMAR}
+"""
+
+
+def _borrar_por_lotes(sql, parametros, lote, pausa, max_lotes, al_progresar):
+    # Repite el borrado hasta que un lote sale incompleto; devuelve las filas borradas por tabla y los lotes
+    totales = {}
+    lotes = 0
+    while max_lotes is None or lotes < max_lotes:
+        fila = dict(db.session.execute(db.text(sql), dict(parametros, lote=lote)).mappings().one())
+        ids_usuarios = fila.pop('ids_usuarios', None)
+        db.session.commit()
+        # El DELETE masivo no pasa por los eventos del ORM: se invalidan a mano las cuentas borradas
+        for id_usuario in ids_usuarios or ():
+            invalidar_usuario(id_usuario)
+        lotes += 1
+        for tabla, filas in fila.items():
+            totales[tabla] = totales.get(tabla, 0) + filas
+        if al_progresar:
+            al_progresar(dict(totales))
+        # El recuento de la tabla principal del lote (la primera columna) decide si quedan filas
+        if next(iter(fila.values())) < lote:
+            break
+        if pausa:
+            time.sleep(pausa)
+    return totales, lotes
+
+
+def limpiar(simular=False, lote=None, pausa=None, max_lotes=None, al_progresar=None):
+    # Borra carritos abandonados y cuentas sin confirmar. Devuelve {'carritos', 'lineas', 'usuarios', 'lotes',
+    # 'segundos', 'simulacion'}; con simular=True solo cuenta las filas que se borrarían, sin bloquear ninguna.
+    config = current_app.config
+    lote = lote or config['LIMPIEZA_LOTE']
+    pausa = config['LIMPIEZA_PAUSA_SEGUNDOS'] if pausa is None else pausa
+    inicio = time.perf_counter()
+    ahora = db.session.scalar(db.text('SELECT now()'))
+    corte_carritos = {'corte': ahora - timedelta(days=config['LIMPIEZA_CARRITOS_DIAS'])}
+    corte_usuarios = {'corte': ahora - timedelta(days=config['LIMPIEZA_USUARIOS_SIN_CONFIRMAR_DIAS'])}
+
+    if simular:
+        carritos = db.session.execute(db.text(_CONTAR_CARRITOS), corte_carritos).mappings().one()
+        usuarios = db.session.execute(db.text(_CONTAR_USUARIOS), corte_usuarios).mappings().one()
+        db.session.rollback()
+        # Los carritos de las cuentas sin confirmar que aún no han caducado por su fecha no entran en el recuento
+        resumen = {'carritos': carritos['carritos'], 'lineas': carritos['lineas'], 'usuarios': usuarios['usuarios'],
+                   'lotes': 0}
+    else:
+        carritos, lotes_carritos = _borrar_por_lotes(_BORRAR_CARRITOS, corte_carritos, lote, pausa, max_lotes,
+                                                     al_progresar)
+        usuarios, lotes_usuarios = _borrar_por_lotes(_BORRAR_USUARIOS, corte_usuarios, lote, pausa, max_lotes,
+                                                     al_progresar)
+        resumen = {
+            'carritos': carritos.get('carritos', 0) + usuarios.get('carritos', 0),
+            'lineas': carritos.get('lineas', 0) + usuarios.get('lineas', 0),
+            'usuarios': usuarios.get('usuarios', 0),
+            'lotes': lotes_carritos + lotes_usuarios,
+        }
+
+    resumen.update(segundos=round(time.perf_counter() - inicio, 3), simulacion=simular)
+    registro_limpieza.info(json.dumps(resumen, ensure_ascii=False))
+    return resumen
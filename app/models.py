@@ -1,7 +1,7 @@
 from app import db, login_manager
 from flask_login import UserMixin
 from datetime import datetime
-from sqlalchemy.dialects.postgresql import ENUM
+from sqlalchemy.dialects.postgresql import ENUM, ARRAY, TSVECTOR, JSONB
 
 # El mixin UserMixin de Flask-Login proporciona métodos esenciales para la autenticación
 class Usuario(db.Model, UserMixin):
@@ -17,6 +17,11 @@ class Usuario(db.Model, UserMixin):
     creado_en = db.Column(db.TIMESTAMP(timezone=True), default=datetime.now)
     # Nuevo campo para la confirmación de email
     email_confirmado = db.Column(db.Boolean, nullable=False, default=False)
+    __table_args__ = (
+        db.Index('ix_usuarios_creado_en', 'creado_en'),
+        # Cuentas sin confirmar por antigüedad, para la limpieza periódica (app/limpieza.py)
+        db.Index('ix_usuarios_sin_confirmar', 'creado_en', postgresql_where=db.text('NOT email_confirmado')),
+    )
 
     def __repr__(self):
         return f"Usuario('{self.nombre}', '{self.email}')"
@@ -39,19 +44,44 @@ class Proveedor(db.Model):
 class Producto(db.Model):
     __tablename__ = 'productos'
     id = db.Column(db.Integer, primary_key=True)
+    # Código de referencia del proveedor (SKU); clave natural usada por la importación masiva del catálogo
+    sku = db.Column(db.String(64), unique=True)
     nombre = db.Column(db.String(100), nullable=False)
     descripcion = db.Column(db.Text)
     precio_compra = db.Column(db.Numeric(10, 2), nullable=False)
     precio_venta = db.Column(db.Numeric(10, 2), nullable=False)
     stock = db.Column(db.Integer, nullable=False, default=0)
+    # Por debajo de este nivel el producto entra en las sugerencias de reposición (app/reposicion.py)
+    stock_minimo = db.Column(db.Integer, nullable=False, default=5, server_default='5')
     id_categoria = db.Column(db.Integer, db.ForeignKey('categorias.id'))
     id_proveedor = db.Column(db.Integer, db.ForeignKey('proveedores.id'))
+    # Resumen de reseñas desnormalizado; lo mantiene un trigger de PostgreSQL sobre la tabla resenas
+    num_resenas = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    suma_calificaciones = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    calificacion_promedio = db.Column(db.Numeric(3, 2), nullable=False, default=0, server_default='0')
+    # Vector de búsqueda de texto completo calculado por PostgreSQL a partir del nombre y la descripción
+    busqueda = db.Column(TSVECTOR, db.Computed(
+        "setweight(to_tsvector('spanish', inmutable_unaccent(coalesce(nombre, ''))), 'A') || "
+        "setweight(to_tsvector('spanish', inmutable_unaccent(coalesce(descripcion, ''))), 'B')",
+        persisted=True), deferred=True)
 
     variantes = db.relationship('VarianteProducto', backref='producto', lazy=True, cascade="all, delete-orphan")
     imagenes = db.relationship('ImagenProducto', backref='producto', lazy=True, cascade="all, delete-orphan")
     pedidos_detalle = db.relationship('DetallePedido', backref='producto', lazy=True)
     resenas = db.relationship('Resena', backref='producto', lazy=True)
     carrito_detalle = db.relationship('DetalleCarrito', backref='producto', lazy=True)
+    # Índices compuestos para la paginación por clave del catálogo filtrada por categoría o proveedor
+    __table_args__ = (
+        db.Index('ix_productos_categoria_id', 'id_categoria', 'id'),
+        db.Index('ix_productos_proveedor_id', 'id_proveedor', 'id'),
+        db.Index('ix_productos_calificacion_id', 'calificacion_promedio', 'id'),
+        db.Index('ix_productos_nombre', 'nombre'),
+        # Índice parcial: solo contiene los productos con stock bajo, así que buscarlos no recorre el catálogo
+        db.Index('ix_productos_stock_bajo', 'id_proveedor', 'id', postgresql_where=db.text('stock <= stock_minimo')),
+        db.Index('ix_productos_busqueda', 'busqueda', postgresql_using='gin'),
+        db.Index('ix_productos_nombre_trgm', db.text('inmutable_unaccent(lower(nombre)) gin_trgm_ops'),
+                 postgresql_using='gin'),
+    )
 
 class VarianteProducto(db.Model):
     __tablename__ = 'variantes_producto'
@@ -61,7 +91,11 @@ class VarianteProducto(db.Model):
     valor_variante = db.Column(db.String(50), nullable=False)
     precio_adicional = db.Column(db.Numeric(10, 2), default=0)
     stock_variante = db.Column(db.Integer, nullable=False, default=0)
-    __table_args__ = (db.UniqueConstraint('id_producto', 'nombre_variante', 'valor_variante'),)
+    stock_minimo = db.Column(db.Integer, nullable=False, default=2, server_default='2')
+    __table_args__ = (
+        db.UniqueConstraint('id_producto', 'nombre_variante', 'valor_variante'),
+        db.Index('ix_variantes_stock_bajo', 'id_producto', postgresql_where=db.text('stock_variante <= stock_minimo')),
+    )
 
 class ImagenProducto(db.Model):
     __tablename__ = 'imagenes_producto'
@@ -69,6 +103,12 @@ class ImagenProducto(db.Model):
     id_producto = db.Column(db.Integer, db.ForeignKey('productos.id', ondelete='CASCADE'), nullable=False)
     url_imagen = db.Column(db.String(255), nullable=False)
     es_principal = db.Column(db.Boolean, default=False)
+    # Resultado del procesado de imágenes (app/imagenes.py): hash SHA-256 del original y tamaños generados,
+    # {'miniatura': {'ancho': ..., 'alto': ..., 'webp': ruta, 'jpeg': ruta}, 'mediana': ..., 'grande': ...}
+    hash_contenido = db.Column(db.String(64))
+    variantes = db.Column(JSONB)
+    procesada_en = db.Column(db.TIMESTAMP(timezone=True))
+    __table_args__ = (db.Index('ix_imagenes_producto_producto', 'id_producto'),)
 
 class Pedido(db.Model):
     __tablename__ = 'pedidos'
@@ -81,6 +121,13 @@ class Pedido(db.Model):
     metodo_envio = db.Column(db.String(50))
     numero_seguimiento = db.Column(db.String(100))
     detalles = db.relationship('DetallePedido', backref='pedido', lazy=True)
+    # Índice por fecha para la actualización incremental de los agregados de ventas (app/analitica.py);
+    # los demás sirven para ordenar y filtrar el listado del panel de administración
+    __table_args__ = (
+        db.Index('ix_pedidos_fecha', 'fecha'),
+        db.Index('ix_pedidos_estado_fecha', 'estado_pedido', 'fecha'),
+        db.Index('ix_pedidos_usuario_fecha', 'id_usuario', 'fecha'),
+    )
 
 class DetallePedido(db.Model):
     __tablename__ = 'detalle_pedidos'
@@ -89,13 +136,20 @@ class DetallePedido(db.Model):
     id_producto = db.Column(db.Integer, db.ForeignKey('productos.id'), nullable=False)
     cantidad = db.Column(db.Integer, nullable=False)
     precio_unitario = db.Column(db.Numeric(10, 2), nullable=False)
+    __table_args__ = (
+        db.Index('ix_detalle_pedidos_pedido', 'id_pedido'),
+        db.Index('ix_detalle_pedidos_producto', 'id_producto'),
+    )
 
 class CarritoCompras(db.Model):
     __tablename__ = 'carrito_compras'
     id = db.Column(db.Integer, primary_key=True)
     id_usuario = db.Column(db.Integer, db.ForeignKey('usuarios.id', ondelete='CASCADE'), unique=True, nullable=False)
     creado_en = db.Column(db.TIMESTAMP(timezone=True), default=datetime.now)
+    # Última vez que se añadieron productos; la limpieza periódica borra los carritos abandonados por esta fecha
+    actualizado_en = db.Column(db.TIMESTAMP(timezone=True), default=datetime.now, server_default=db.func.now())
     detalles = db.relationship('DetalleCarrito', backref='carrito', lazy=True, cascade="all, delete-orphan")
+    __table_args__ = (db.Index('ix_carrito_compras_actualizado_en', 'actualizado_en'),)
 
 class DetalleCarrito(db.Model):
     __tablename__ = 'detalle_carrito'
@@ -112,8 +166,14 @@ class Resena(db.Model):
     id_usuario = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
     calificacion = db.Column(db.Integer, nullable=False)
     comentario = db.Column(db.Text)
-    fecha_resena = db.Column(db.TIMESTAMP(timezone=True), default=datetime.now)
-    __table_args__ = (db.UniqueConstraint('id_producto', 'id_usuario'),)
+    fecha_resena = db.Column(db.TIMESTAMP(timezone=True), nullable=False, default=datetime.now,
+                             server_default=db.func.now())
+    __table_args__ = (
+        db.UniqueConstraint('id_producto', 'id_usuario'),
+        db.Index('ix_resenas_usuario', 'id_usuario'),
+        # Paginación por clave de las reseñas de un producto, de la más reciente a la más antigua
+        db.Index('ix_resenas_producto_fecha', 'id_producto', 'fecha_resena', 'id'),
+    )
 
 class Descuento(db.Model):
     __tablename__ = 'descuentos'
@@ -126,4 +186,60 @@ class Descuento(db.Model):
     fecha_fin = db.Column(db.TIMESTAMP(timezone=True))
     usos_maximos = db.Column(db.Integer)
     usos_actuales = db.Column(db.Integer, default=0)
-   
\ No newline at end of file
+
+# Bandeja de salida persistente: los correos se guardan aquí dentro de la misma transacción
+# de la petición y un proceso en segundo plano los envía (ver app/correo.py)
+class CorreoSaliente(db.Model):
+    __tablename__ = 'correos_salientes'
+    id = db.Column(db.Integer, primary_key=True)
+    asunto = db.Column(db.String(255), nullable=False)
+    remitente = db.Column(db.String(100))
+    destinatarios = db.Column(ARRAY(db.String(100)), nullable=False)
+    cuerpo = db.Column(db.Text)
+    html = db.Column(db.Text)
+    estado = db.Column(db.String(20), nullable=False, default='pendiente', server_default='pendiente')
+    intentos = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    ultimo_error = db.Column(db.Text)
+    proximo_intento = db.Column(db.TIMESTAMP(timezone=True), nullable=False, server_default=db.func.now())
+    creado_en = db.Column(db.TIMESTAMP(timezone=True), default=datetime.now)
+    enviado_en = db.Column(db.TIMESTAMP(timezone=True))
+    # Índice para que el despachador encuentre rápidamente los correos listos para enviar
+    __table_args__ = (db.Index('ix_correos_salientes_pendientes', 'estado', 'proximo_intento'),)
+
+# Agregados diarios de ventas por producto (app/analitica.py). Categoría y proveedor se copian del producto al
+# agregar, de modo que los paneles por categoría o proveedor agrupan esta tabla sin volver a leer los pedidos.
+# El coste usa el precio de compra del producto en el momento de la agregación (los pedidos no lo guardan).
+class VentaDiaria(db.Model):
+    __tablename__ = 'ventas_diarias'
+    dia = db.Column(db.Date, primary_key=True)
+    id_producto = db.Column(db.Integer, db.ForeignKey('productos.id', ondelete='CASCADE'), primary_key=True)
+    id_categoria = db.Column(db.Integer)
+    id_proveedor = db.Column(db.Integer)
+    lineas = db.Column(db.Integer, nullable=False, default=0)
+    unidades = db.Column(db.Integer, nullable=False, default=0)
+    ingresos = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    coste = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    __table_args__ = (
+        db.Index('ix_ventas_diarias_categoria_dia', 'id_categoria', 'dia'),
+        db.Index('ix_ventas_diarias_proveedor_dia', 'id_proveedor', 'dia'),
+    )
+
+# Marcas de agua de los procesos incrementales: hasta qué instante se han procesado los datos de origen
+class MarcaAgua(db.Model):
+    __tablename__ = 'marcas_agua'
+    nombre = db.Column(db.String(50), primary_key=True)
+    valor = db.Column(db.TIMESTAMP(timezone=True))
+    actualizado_en = db.Column(db.TIMESTAMP(timezone=True))
+
+# Estado del proceso de reposición (app/reposicion.py): la última evaluación de cada producto con stock bajo.
+# Guarda el stock con el que se evaluó para que la siguiente pasada solo revise los productos que cambiaron.
+class SugerenciaReposicion(db.Model):
+    __tablename__ = 'sugerencias_reposicion'
+    id_producto = db.Column(db.Integer, db.ForeignKey('productos.id', ondelete='CASCADE'), primary_key=True)
+    id_proveedor = db.Column(db.Integer)
+    stock = db.Column(db.Integer, nullable=False)
+    stock_minimo = db.Column(db.Integer, nullable=False)
+    demanda_diaria = db.Column(db.Numeric(12, 3), nullable=False, default=0)
+    cantidad_sugerida = db.Column(db.Integer, nullable=False, default=0)
+    evaluado_en = db.Column(db.TIMESTAMP(timezone=True), nullable=False)
+    __table_args__ = (db.Index('ix_sugerencias_reposicion_proveedor', 'id_proveedor'),)
@@ -0,0 +1,88 @@
+from decimal import Decimal
+from sqlalchemy import values, column, Integer
+from app import db
+from app.models import Producto, CarritoCompras, DetalleCarrito, Pedido, DetallePedido
+from app.fragmentos import invalidar_producto
+from app.descuentos import buscar_codigo, calcular_descuento, canjear
+
+# Proceso de compra: convierte el carrito del usuario en un pedido dentro de una sola transacción.
+# Las líneas del carrito y los productos afectados se bloquean con SELECT ... FOR UPDATE ordenados por
+# id de producto; al bloquear siempre en el mismo orden, dos compras simultáneas no pueden esperarse
+# mutuamente (interbloqueo). El stock se descuenta con un único UPDATE ... FROM (VALUES ...).
+# Si se indica un código de descuento, su uso se canjea en la misma transacción como última sentencia antes
+# del COMMIT: el bloqueo de la fila del descuento (muy disputada durante una promoción) se mantiene el menor
+# tiempo posible y siempre se toma después de los de productos, en el mismo orden para todas las compras.
+
+
+class CarritoVacio(Exception):
+    pass
+
+
+class StockInsuficiente(Exception):
+    def __init__(self, productos):
+        super().__init__(', '.join(productos))
+        self.productos = productos
+
+
+def procesar_pedido(id_usuario, metodo_pago=None, metodo_envio=None, codigo_descuento=None):
+    # Lanza DescuentoInvalido si el código no es válido o se agotaron sus usos; en ese caso no se crea el pedido
+    try:
+        descuento = buscar_codigo(codigo_descuento) if codigo_descuento else None
+        lineas = db.session.execute(
+            db.select(DetalleCarrito.id_producto, DetalleCarrito.cantidad,
+                      Producto.nombre, Producto.precio_venta, Producto.stock)
+            .join(CarritoCompras, DetalleCarrito.id_carrito == CarritoCompras.id)
+            .join(Producto, DetalleCarrito.id_producto == Producto.id)
+            .where(CarritoCompras.id_usuario == id_usuario)
+            .order_by(Producto.id)
+            .with_for_update(of=[DetalleCarrito, Producto])
+        ).all()
+
+        if not lineas:
+            raise CarritoVacio()
+
+        sin_stock = [linea.nombre for linea in lineas if linea.stock < linea.cantidad]
+        if sin_stock:
+            raise StockInsuficiente(sin_stock)
+
+        total = sum((linea.precio_venta * linea.cantidad for linea in lineas), Decimal(0))
+        if descuento:
+            total -= calcular_descuento(descuento, total)
+        pedido = Pedido(id_usuario=id_usuario, total=total, metodo_pago=metodo_pago, metodo_envio=metodo_envio)
+        db.session.add(pedido)
+        db.session.flush()
+
+        db.session.execute(db.insert(DetallePedido), [
+            {'id_pedido': pedido.id, 'id_producto': linea.id_producto,
+             'cantidad': linea.cantidad, 'precio_unitario': linea.precio_venta}
+            for linea in lineas
+        ])
+
+        # UPDATE productos SET stock = productos.stock - v.cantidad FROM (VALUES (...), ...) AS v WHERE productos.id = v.id
+        cantidades = values(column('id', Integer), column('cantidad', Integer), name='v').data(
+            [(linea.id_producto, linea.cantidad) for linea in lineas]
+        )
+        db.session.execute(
+            db.update(Producto)
+            .where(Producto.id == cantidades.c.id)
+            .values(stock=Producto.stock - cantidades.c.cantidad)
+            .execution_options(synchronize_session=False)
+        )
+
+        db.session.execute(
+            db.delete(DetalleCarrito)
+            .where(DetalleCarrito.id_carrito == CarritoCompras.id, CarritoCompras.id_usuario == id_usuario)
+            .execution_options(synchronize_session=False)
+        )
+
+        if descuento:
+            canjear(descuento)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    # El UPDATE masivo no pasa por los eventos del ORM, así que se invalidan las tarjetas a mano
+    for linea in lineas:
+        invalidar_producto(linea.id_producto)
+    return pedido
@@ -0,0 +1,220 @@
+import os
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from flask import current_app, render_template
+from app import db
+from app.correo import encolar_correo
+
+# Alertas de stock bajo y sugerencias de reposición por proveedor.
+# Cada pasada (flask reposicion evaluar, o el planificador dentro del proceso web) revisa solo los productos
+# que pueden haber cambiado desde la anterior:
+# - los que tienen stock bajo (stock <= stock_minimo, leídos del índice parcial ix_productos_stock_bajo) y cuyo
+#   stock o mínimo difiere del guardado en sugerencias_reposicion en la última evaluación;
+# - los que ya tenían sugerencia y cuyo stock cambió (por ejemplo, porque se repuso);
+# - los de stock bajo vendidos desde la marca de agua 'reposicion' (menos ANALITICA_RETRASO_MINUTOS, por los
+#   pedidos que se confirman con una fecha algo anterior).
+# Para esos productos se calcula la demanda diaria con las ventas de los últimos REPOSICION_DIAS_VENTAS días
+# (detalle_pedidos) y la cantidad a pedir para cubrir el plazo de entrega y REPOSICION_COBERTURA_DIAS más el
+# stock mínimo. Después se genera un resumen de pedido de compra por cada proveedor afectado, con sus productos
+# y las variantes con stock bajo, y si hay REPOSICION_DESTINATARIOS se encola un correo por proveedor en la
+# misma transacción que el estado. La fila de la marca se bloquea con FOR UPDATE SKIP LOCKED: si otra pasada
+# está en curso (otro worker, otra máquina), esta se omite.
+
+MARCA = 'reposicion'
+
+_CANDIDATOS = """
+    SELECT p.id
+    FROM productos p
+    LEFT JOIN sugerencias_reposicion s ON s.id_producto = p.id
+    WHERE p.stock <= p.stock_minimo
+      AND (:completo OR s.id_producto IS NULL OR s.stock <> p.stock OR s.stock_minimo <> p.stock_minimo
+           OR s.id_proveedor IS DISTINCT FROM p.id_proveedor)
+    UNION
+    SELECT s.id_producto
+    FROM sugerencias_reposicion s
+    JOIN productos p ON p.id = s.id_producto
+    WHERE :completo OR p.stock <> s.stock OR p.stock_minimo <> s.stock_minimo
+    UNION
+    SELECT p.id
+    FROM productos p
+    WHERE p.stock <= p.stock_minimo
+      AND EXISTS (SELECT 1 FROM detalle_pedidos d JOIN pedidos pe ON pe.id = d.id_pedido
+                  WHERE d.id_producto = p.id AND pe.fecha > :desde)
+"""
+
+_RETIRAR = """
+    DELETE FROM sugerencias_reposicion s
+    USING productos p
+    WHERE s.id_producto = p.id AND s.id_producto = ANY(:ids) AND p.stock > p.stock_minimo
+    RETURNING s.id_proveedor
+"""
+
+_EVALUAR = """
+    WITH ventas AS (
+        SELECT d.id_producto, sum(d.cantidad) AS unidades
+        FROM detalle_pedidos d
+        JOIN pedidos pe ON pe.id = d.id_pedido
+        WHERE d.id_producto = ANY(:ids)
+          AND pe.fecha >= now() - make_interval(days => :dias)
+          AND coalesce(pe.estado_pedido, '') <> ALL(CAST(:excluidos AS text[]))
+        GROUP BY d.id_producto
+    )
+    INSERT INTO sugerencias_reposicion AS s
+        (id_producto, id_proveedor, stock, stock_minimo, demanda_diaria, cantidad_sugerida, evaluado_en)
+    SELECT p.id, p.id_proveedor, p.stock, p.stock_minimo,
+           coalesce(v.unidades, 0)::numeric / :dias,
+           GREATEST(ceil(coalesce(v.unidades, 0)::numeric / :dias * (:plazo + :cobertura))::int
+                    + p.stock_minimo - p.stock, 0),
+           now()
+    FROM productos p
+    LEFT JOIN ventas v ON v.id_producto = p.id
+    WHERE p.id = ANY(:ids) AND p.stock <= p.stock_minimo
+    ON CONFLICT (id_producto) DO UPDATE SET
+        id_proveedor = EXCLUDED.id_proveedor,
+        stock = EXCLUDED.stock,
+        stock_minimo = EXCLUDED.stock_minimo,
+        demanda_diaria = EXCLUDED.demanda_diaria,
+        cantidad_sugerida = EXCLUDED.cantidad_sugerida,
+        evaluado_en = EXCLUDED.evaluado_en
+    RETURNING s.id_proveedor
+"""
+
+_LINEAS = """
+    SELECT s.id_proveedor, pv.nombre AS proveedor, pv.email, p.id AS id_producto, p.sku, p.nombre,
+           s.stock, s.stock_minimo, s.demanda_diaria, s.cantidad_sugerida, p.precio_compra
+    FROM sugerencias_reposicion s
+    JOIN productos p ON p.id = s.id_producto
+    LEFT JOIN proveedores pv ON pv.id = s.id_proveedor
+    WHERE s.cantidad_sugerida > 0
+      AND (:todos OR s.id_proveedor = ANY(CAST(:proveedores AS int[])) OR (:sin_proveedor AND s.id_proveedor IS NULL))
+    ORDER BY s.id_proveedor NULLS LAST, s.cantidad_sugerida DESC, p.id
+"""
+
+_VARIANTES = """
+    SELECT p.id_proveedor, p.id AS id_producto, p.nombre, v.nombre_variante, v.valor_variante,
+           v.stock_variante, v.stock_minimo
+    FROM variantes_producto v
+    JOIN productos p ON p.id = v.id_producto
+    WHERE v.stock_variante <= v.stock_minimo
+      AND (:todos OR p.id_proveedor = ANY(CAST(:proveedores AS int[])) OR (:sin_proveedor AND p.id_proveedor IS NULL))
+    ORDER BY p.id_proveedor NULLS LAST, p.id, v.id
+"""
+
+
+def _resumenes(proveedores, todos):
+    # Los productos sin proveedor forman su propio grupo (id_proveedor None), igual que en la evaluación completa
+    parametros = {'proveedores': [p for p in proveedores if p is not None], 'sin_proveedor': None in proveedores,
+                  'todos': todos}
+    resumenes = {}
+    for fila in db.session.execute(db.text(_LINEAS), parametros).mappings():
+        resumen = resumenes.setdefault(fila['id_proveedor'], {
+            'id_proveedor': fila['id_proveedor'],
+            'proveedor': fila['proveedor'] or 'Sin proveedor',
+            'email': fila['email'],
+            'lineas': [],
+            'variantes': [],
+            'unidades': 0,
+            'coste': Decimal(0),
+        })
+        coste = fila['precio_compra'] * fila['cantidad_sugerida']
+        resumen['lineas'].append(dict(fila, coste=coste))
+        resumen['unidades'] += fila['cantidad_sugerida']
+        resumen['coste'] += coste
+    # Las variantes con stock bajo se añaden al resumen de su proveedor (no hay ventas por variante)
+    for fila in db.session.execute(db.text(_VARIANTES), parametros).mappings():
+        if fila['id_proveedor'] in resumenes:
+            resumenes[fila['id_proveedor']]['variantes'].append(dict(fila))
+    return list(resumenes.values())
+
+
+def _encolar_resumenes(resumenes):
+    destinatarios = [d.strip() for d in current_app.config['REPOSICION_DESTINATARIOS'].split(',') if d.strip()]
+    if not destinatarios:
+        return 0
+    for resumen in resumenes:
+        encolar_correo(
+            asunto=f"Reposición de stock: {resumen['proveedor']} ({len(resumen['lineas'])} productos)",
+            destinatarios=destinatarios,
+            cuerpo='\n'.join(f"{linea['sku'] or linea['id_producto']}\t{linea['nombre']}\t"
+                             f"{linea['cantidad_sugerida']}" for linea in resumen['lineas']),
+            html=render_template('email_reposicion.html', resumen=resumen),
+        )
+    return len(resumenes)
+
+
+def evaluar_reposicion(completo=False, enviar=True, intervalo_minimo=None):
+    # Ejecuta una pasada y devuelve {'evaluados', 'retirados', 'resumenes', 'correos'}, o None si otra pasada
+    # está en curso o (con intervalo_minimo, en segundos) la última terminó hace menos de ese tiempo.
+    # completo=True vuelve a evaluar todos los productos con stock bajo (la demanda cambia también cuando las
+    # ventas antiguas salen de la ventana de días).
+    config = current_app.config
+    marca = db.session.execute(db.text(
+        'SELECT valor, actualizado_en, now() AS ahora FROM marcas_agua WHERE nombre = :nombre '
+        'FOR UPDATE SKIP LOCKED'), {'nombre': MARCA}).mappings().first()
+    if marca is None or (intervalo_minimo and marca['actualizado_en']
+                         and marca['ahora'] - marca['actualizado_en'] < timedelta(seconds=intervalo_minimo)):
+        db.session.rollback()
+        return None
+
+    completo = completo or marca['valor'] is None
+    desde = (marca['valor'] or marca['ahora']) - timedelta(minutes=config['ANALITICA_RETRASO_MINUTOS'])
+    ids = db.session.scalars(db.text(_CANDIDATOS), {'completo': completo, 'desde': desde}).all()
+
+    proveedores = set()
+    retirados = 0
+    if ids:
+        retirados_proveedores = db.session.scalars(db.text(_RETIRAR), {'ids': ids}).all()
+        retirados = len(retirados_proveedores)
+        proveedores.update(retirados_proveedores)
+        proveedores.update(db.session.scalars(db.text(_EVALUAR), {
+            'ids': ids,
+            'dias': config['REPOSICION_DIAS_VENTAS'],
+            'plazo': config['REPOSICION_PLAZO_DIAS'],
+            'cobertura': config['REPOSICION_COBERTURA_DIAS'],
+            'excluidos': list(config['ANALITICA_ESTADOS_EXCLUIDOS']),
+        }).all())
+
+    resumenes = _resumenes(proveedores, todos=completo) if (proveedores or completo) else []
+    correos = _encolar_resumenes(resumenes) if enviar else 0
+    db.session.execute(db.text('UPDATE marcas_agua SET valor = :ahora, actualizado_en = now() '
+                               'WHERE nombre = :nombre'), {'ahora': marca['ahora'], 'nombre': MARCA})
+    db.session.commit()
+    return {'evaluados': len(ids), 'retirados': retirados, 'resumenes': resumenes, 'correos': correos}
+
+
+# -- Planificador dentro del proceso web (opcional, REPOSICION_INTERVALO_SEGUNDOS > 0) --
+
+def _bucle_planificador(app, intervalo):
+    while True:
+        time.sleep(intervalo)
+        with app.app_context():
+            try:
+                # Con varios workers cada uno tiene su hilo; el intervalo mínimo y SKIP LOCKED hacen que solo uno
+                # ejecute la pasada en cada intervalo
+                evaluar_reposicion(intervalo_minimo=intervalo * 0.9)
+            except Exception:
+                app.logger.exception('Error en la evaluación de reposición')
+                db.session.rollback()
+            finally:
+                db.session.remove()
+
+
+def init_app(app):
+    intervalo = app.config['REPOSICION_INTERVALO_SEGUNDOS']
+    if intervalo <= 0:
+        return
+    candado = threading.Lock()
+
+    # El hilo se arranca en la primera petición de cada proceso: así cada worker de gunicorn (incluso con
+    # --preload, donde los hilos del padre no sobreviven al fork) tiene el suyo
+    @app.before_request
+    def arrancar_planificador():
+        if app.extensions.get('planificador_reposicion') == os.getpid():
+            return
+        with candado:
+            if app.extensions.get('planificador_reposicion') != os.getpid():
+                threading.Thread(target=_bucle_planificador, args=(app, intervalo),
+                                 name='planificador-reposicion', daemon=True).start()
+                app.extensions['planificador_reposicion'] = os.getpid()
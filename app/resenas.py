@@ -0,0 +1,42 @@
+from app import db
+from app.cache_http import marcar_catalogo_modificado
+
+# Conciliación del resumen de reseñas de productos.
+# El trigger trg_resenas_resumen mantiene num_resenas, suma_calificaciones y calificacion_promedio de forma
+# incremental. Si alguna vez se desvían (triggers desactivados durante una carga, ediciones manuales...),
+# estas funciones detectan la diferencia comparando con un agregado completo de resenas y la corrigen.
+
+_AGREGADO_REAL = """
+    SELECT p.id AS id_producto,
+           p.num_resenas, p.suma_calificaciones,
+           coalesce(r.num_resenas, 0) AS num_resenas_real,
+           coalesce(r.suma_calificaciones, 0) AS suma_calificaciones_real
+    FROM productos p
+    LEFT JOIN (SELECT id_producto, count(*) AS num_resenas, sum(calificacion) AS suma_calificaciones
+               FROM resenas GROUP BY id_producto) r ON r.id_producto = p.id
+    WHERE p.num_resenas <> coalesce(r.num_resenas, 0)
+       OR p.suma_calificaciones <> coalesce(r.suma_calificaciones, 0)
+"""
+
+
+def detectar_desviaciones():
+    # Devuelve las filas de productos cuyo resumen no coincide con sus reseñas
+    return db.session.execute(db.text(_AGREGADO_REAL)).mappings().all()
+
+
+def reconstruir_resumenes():
+    # Corrige en una sola sentencia todos los productos desviados y devuelve sus ids
+    ids = db.session.scalars(db.text(f"""
+        UPDATE productos p SET
+            num_resenas = d.num_resenas_real,
+            suma_calificaciones = d.suma_calificaciones_real,
+            calificacion_promedio = CASE WHEN d.num_resenas_real > 0
+                THEN round(d.suma_calificaciones_real::numeric / d.num_resenas_real, 2) ELSE 0 END
+        FROM ({_AGREGADO_REAL}) d
+        WHERE p.id = d.id_producto
+        RETURNING p.id
+    """)).all()
+    if ids:
+        marcar_catalogo_modificado(db.session)
+    db.session.commit()
+    return ids
@@ -0,0 +1,120 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import bcrypt as bcrypt_lib
+from flask import current_app
+
+# Hash de contraseñas fuera del hilo de la petición y limitación de intentos.
+# Cada cálculo de bcrypt cuesta cientos de milisegundos de CPU. Se ejecutan en un pool acotado de hilos
+# (bcrypt libera el GIL) o de procesos, y una cola acotada rechaza el trabajo cuando el pool está saturado
+# en lugar de dejar que una ola de inicios de sesión bloquee al resto de rutas.
+# El coste se configura con BCRYPT_LOG_ROUNDS; al iniciar sesión, los hashes con otro coste se recalculan.
+# Los limitadores de cubeta de tokens (por IP y por correo) se consultan antes de hacer cualquier hash.
+
+
+class ServicioSaturado(Exception):
+    pass
+
+
+class LimitadorTokens:
+    # Cubeta de tokens por clave: admite ráfagas de hasta 'capacidad' intentos y recarga 'recarga' tokens por segundo
+    def __init__(self, capacidad, recarga, maximo_claves=100000):
+        self.capacidad = capacidad
+        self.recarga = recarga
+        self.maximo_claves = maximo_claves
+        self._cubetas = {}
+        self._candado = threading.Lock()
+
+    def permitir(self, clave):
+        ahora = time.monotonic()
+        with self._candado:
+            tokens, ultimo = self._cubetas.get(clave, (self.capacidad, ahora))
+            tokens = min(self.capacidad, tokens + (ahora - ultimo) * self.recarga)
+            permitido = tokens >= 1
+            if permitido:
+                tokens -= 1
+            self._cubetas[clave] = (tokens, ahora)
+            if len(self._cubetas) > self.maximo_claves:
+                self._purgar(ahora)
+            return permitido
+
+    def _purgar(self, ahora):
+        # Descarta las cubetas que ya se habrían rellenado por completo
+        llenas = [clave for clave, (tokens, ultimo) in self._cubetas.items()
+                  if tokens + (ahora - ultimo) * self.recarga >= self.capacidad]
+        for clave in llenas:
+            del self._cubetas[clave]
+
+
+def _hashear(password, rondas):
+    return bcrypt_lib.hashpw(password.encode('utf-8'), bcrypt_lib.gensalt(rounds=rondas)).decode('utf-8')
+
+
+def _verificar(password_hash, password):
+    try:
+        return bcrypt_lib.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+    except ValueError:
+        # Hash con formato inválido
+        return False
+
+
+class PoolHash:
+    def __init__(self, tipo, trabajadores, cola, espera):
+        clase = ProcessPoolExecutor if tipo == 'procesos' else ThreadPoolExecutor
+        self._ejecutor = clase(max_workers=trabajadores)
+        self._plazas = threading.BoundedSemaphore(trabajadores + cola)
+        self._espera = espera
+
+    def ejecutar(self, funcion, *args):
+        if not self._plazas.acquire(timeout=self._espera):
+            raise ServicioSaturado()
+        try:
+            return self._ejecutor.submit(funcion, *args).result()
+        finally:
+            self._plazas.release()
+
+
+def _pool():
+    pool = current_app.extensions.get('pool_hash')
+    if pool is None:
+        config = current_app.config
+        pool = PoolHash(config['BCRYPT_POOL'], config['BCRYPT_TRABAJADORES'],
+                        config['BCRYPT_COLA'], config['BCRYPT_ESPERA_SEGUNDOS'])
+        current_app.extensions['pool_hash'] = pool
+    return pool
+
+
+def generar_hash(password):
+    return _pool().ejecutar(_hashear, password or '', current_app.config['BCRYPT_LOG_ROUNDS'])
+
+
+def verificar_password(password_hash, password):
+    return _pool().ejecutar(_verificar, password_hash, password or '')
+
+
+def necesita_rehash(password_hash):
+    # Los hashes bcrypt tienen la forma $2b$<coste>$...
+    try:
+        return int(password_hash.split('$')[2]) != current_app.config['BCRYPT_LOG_ROUNDS']
+    except (IndexError, ValueError):
+        return True
+
+
+def _limitador(nombre, capacidad, recarga):
+    limitadores = current_app.extensions.setdefault('limitadores', {})
+    if nombre not in limitadores:
+        limitadores[nombre] = LimitadorTokens(current_app.config[capacidad], current_app.config[recarga])
+    return limitadores[nombre]
+
+
+def intento_permitido(ip, email=None):
+    # Consume un token de la cubeta de la IP y, si se indica, de la del correo
+    if not current_app.config['LIMITE_INTENTOS_HABILITADO']:
+        return True
+    por_ip = _limitador('ip', 'LIMITE_IP_CAPACIDAD', 'LIMITE_IP_RECARGA')
+    if not por_ip.permitir(ip):
+        return False
+    if email:
+        por_email = _limitador('email', 'LIMITE_EMAIL_CAPACIDAD', 'LIMITE_EMAIL_RECARGA')
+        return por_email.permitir(email.strip().lower())
+    return True
@@ -0,0 +1,168 @@
+import os
+import random
+import secrets
+import sqlite3
+import threading
+import time
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+try:
+    import redis
+except ImportError:  # Redis es opcional; solo se necesita con el backend 'redis'
+    redis = None
+
+# Sesiones guardadas en el servidor.
+# La cookie solo contiene un identificador aleatorio; los datos de la sesión (usuario, mensajes flash,
+# carrito de los visitantes y contador de artículos del carrito) se guardan serializados en un almacén
+# clave-valor con expiración. Hay dos almacenes con la misma interfaz (obtener/guardar/eliminar):
+#   - AlmacenLocal: un archivo SQLite en la carpeta instance/, compartido por los procesos de la máquina;
+#   - AlmacenRedis: un servidor compatible con Redis, compartido entre máquinas.
+# Con SESIONES_BACKEND = 'cookie' se mantiene la sesión firmada en la cookie que Flask usa por defecto.
+
+
+class AlmacenLocal:
+    # Almacén clave-valor sobre SQLite (modo WAL). Cada hilo y cada proceso abre su propia conexión.
+    PROBABILIDAD_PURGA = 0.01
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._local = threading.local()
+        with self._conexion() as conexion:
+            conexion.execute('PRAGMA journal_mode=WAL')
+            conexion.execute('CREATE TABLE IF NOT EXISTS sesiones (sid TEXT PRIMARY KEY, datos TEXT NOT NULL, '
+                             'expira REAL NOT NULL)')
+
+    def _conexion(self):
+        # Una conexión heredada a través de un fork no se puede reutilizar: se abre otra si cambió el pid
+        conexion = getattr(self._local, 'conexion', None)
+        if conexion is None or self._local.pid != os.getpid():
+            conexion = sqlite3.connect(self.ruta, timeout=5, isolation_level=None)
+            conexion.execute('PRAGMA synchronous=NORMAL')
+            self._local.conexion, self._local.pid = conexion, os.getpid()
+        return conexion
+
+    def obtener(self, sid):
+        fila = self._conexion().execute('SELECT datos FROM sesiones WHERE sid = ? AND expira > ?',
+                                        (sid, time.time())).fetchone()
+        return fila[0] if fila else None
+
+    def guardar(self, sid, datos, ttl):
+        conexion = self._conexion()
+        conexion.execute('INSERT OR REPLACE INTO sesiones (sid, datos, expira) VALUES (?, ?, ?)',
+                         (sid, datos, time.time() + ttl))
+        # De vez en cuando se borran las sesiones caducadas para que el archivo no crezca sin límite
+        if random.random() < self.PROBABILIDAD_PURGA:
+            conexion.execute('DELETE FROM sesiones WHERE expira <= ?', (time.time(),))
+
+    def eliminar(self, sid):
+        self._conexion().execute('DELETE FROM sesiones WHERE sid = ?', (sid,))
+
+
+class AlmacenRedis:
+    # Almacén sobre un cliente compatible con Redis (redis.Redis o un sustituto local en pruebas)
+    def __init__(self, cliente, prefijo='tienda:sesion:'):
+        self.cliente = cliente
+        self.prefijo = prefijo
+
+    @classmethod
+    def desde_url(cls, url, **kwargs):
+        if redis is None:
+            raise RuntimeError('El backend de sesiones "redis" requiere el paquete redis (pip install redis).')
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def obtener(self, sid):
+        datos = self.cliente.get(self.prefijo + sid)
+        return datos.decode('utf-8') if isinstance(datos, bytes) else datos
+
+    def guardar(self, sid, datos, ttl):
+        self.cliente.set(self.prefijo + sid, datos, ex=ttl)
+
+    def eliminar(self, sid):
+        self.cliente.delete(self.prefijo + sid)
+
+
+class SesionServidor(CallbackDict, SessionMixin):
+    def __init__(self, datos=None, sid=None):
+        def al_modificar(sesion):
+            sesion.modified = True
+
+        super().__init__(datos, al_modificar)
+        self.sid = sid
+        self.modified = False
+        # rotar() pide un identificador nuevo al guardar (por ejemplo, al iniciar sesión)
+        self.rotar_sid = False
+
+    def rotar(self):
+        self.rotar_sid = True
+        self.modified = True
+
+
+class InterfazSesiones(SessionInterface):
+    serializador = TaggedJSONSerializer()
+
+    def __init__(self, almacen):
+        self.almacen = almacen
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            datos = self.almacen.obtener(sid)
+            if datos is not None:
+                try:
+                    return SesionServidor(self.serializador.loads(datos), sid=sid)
+                except ValueError:
+                    pass
+        return SesionServidor()
+
+    def save_session(self, app, session, response):
+        nombre = self.get_cookie_name(app)
+        dominio = self.get_cookie_domain(app)
+        ruta = self.get_cookie_path(app)
+
+        if session.sid:
+            response.vary.add('Cookie')
+
+        # Sesión vaciada: se borra del almacén y del navegador
+        if not session:
+            if session.sid and session.modified:
+                self.almacen.eliminar(session.sid)
+                response.delete_cookie(nombre, domain=dominio, path=ruta)
+            return
+
+        if not self.should_set_cookie(app, session):
+            return
+
+        # Un identificador nuevo tras iniciar sesión impide la fijación de sesión
+        if session.rotar_sid and session.sid:
+            self.almacen.eliminar(session.sid)
+            session.sid = None
+        if session.sid is None:
+            session.sid = secrets.token_urlsafe(32)
+            response.vary.add('Cookie')
+
+        ttl = int(app.permanent_session_lifetime.total_seconds())
+        self.almacen.guardar(session.sid, self.serializador.dumps(dict(session)), ttl)
+        response.set_cookie(nombre, session.sid, expires=self.get_expiration_time(app, session),
+                            httponly=self.get_cookie_httponly(app), domain=dominio, path=ruta,
+                            secure=self.get_cookie_secure(app), samesite=self.get_cookie_samesite(app))
+
+
+def rotar_sesion(session):
+    # Con la sesión en cookie no hay identificador que rotar
+    if isinstance(session, SesionServidor):
+        session.rotar()
+
+
+def init_app(app):
+    backend = app.config['SESIONES_BACKEND']
+    if backend == 'cookie':
+        return
+    if backend == 'redis':
+        almacen = AlmacenRedis.desde_url(app.config['SESIONES_REDIS_URL'])
+    else:
+        ruta = app.config['SESIONES_LOCAL_RUTA'] or os.path.join(app.instance_path, 'sesiones.sqlite3')
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        almacen = AlmacenLocal(ruta)
+    app.session_interface = InterfazSesiones(almacen)
@@ -0,0 +1,8 @@
+from app.vistas import api, auth, carrito, catalogo
+
+
+def init_app(app):
+    app.register_blueprint(catalogo.bp)
+    app.register_blueprint(auth.bp)
+    app.register_blueprint(carrito.bp)
+    app.register_blueprint(api.bp)
@@ -0,0 +1,211 @@
+import asyncio
+from decimal import Decimal
+from flask import Blueprint, jsonify, request, session
+from flask_login import current_user, login_user, logout_user
+from app import db
+from app.models import Usuario, Producto, VarianteProducto, ImagenProducto, Resena, CarritoCompras, DetalleCarrito
+from app.asincrono import consultar, consultar_en_paralelo
+from app.catalogo import consulta_catalogo, cortar_pagina, producto_a_dict
+from app.carrito import (consulta_detalles_carrito, consulta_productos_invitado, lineas_invitado,
+                         consulta_contar_articulos, sentencia_anadir, sentencia_fusionar, carrito_invitado,
+                         anadir_invitado, eliminar_invitado, recordar_cantidad)
+from app.identidad import invalidar_usuario
+from app.seguridad import (verificar_password, generar_hash, necesita_rehash,
+                           intento_permitido, ServicioSaturado)
+from app.sesiones import rotar_sesion
+
+# API JSON asíncrona de la tienda (/api/v1): catálogo, detalle de producto, carrito y autenticación.
+# Comparte modelos, consultas y sesión con las vistas HTML, pero ejecuta las consultas con el motor asíncrono
+# (app/asincrono.py). El detalle de producto lanza sus cuatro consultas en paralelo.
+bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+RESENAS_DETALLE = 10
+
+
+def _error(mensaje, estado):
+    return jsonify({'error': mensaje}), estado
+
+
+def _linea_a_dict(producto, cantidad):
+    return {'producto': producto_a_dict(producto), 'cantidad': cantidad,
+            'subtotal': str(producto.precio_venta * cantidad)}
+
+
+# -- Consultas (se ejecutan en el bucle de la base de datos con su propia sesión) --
+
+async def _todos(sesion, consulta):
+    return (await sesion.scalars(consulta)).all()
+
+
+async def _filas(sesion, consulta):
+    return (await sesion.execute(consulta)).all()
+
+
+async def _uno(sesion, consulta):
+    return await sesion.scalar(consulta)
+
+
+async def _modificar(sesion, *sentencias):
+    # Ejecuta las sentencias en una transacción y devuelve el valor de RETURNING de la última (si lo tiene)
+    for sentencia in sentencias:
+        resultado = await sesion.execute(sentencia)
+    valor = resultado.scalar() if resultado.returns_rows else None
+    await sesion.commit()
+    return valor
+
+
+# -- Catálogo --
+
+@bp.route('/productos')
+async def productos():
+    orden = request.args.get('orden', 'recientes')
+    orden = orden if orden in ('recientes', 'calificacion') else 'recientes'
+    consulta, por_pagina = consulta_catalogo(
+        despues_de=request.args.get('despues'),
+        id_categoria=request.args.get('categoria', type=int),
+        id_proveedor=request.args.get('proveedor', type=int),
+        por_pagina=request.args.get('por_pagina', type=int),
+        orden=orden,
+        calificacion_minima=request.args.get('calificacion_minima', type=float),
+    )
+    pagina, siguiente = cortar_pagina(await consultar(_todos, consulta), por_pagina, orden)
+    return jsonify({'productos': [producto_a_dict(p) for p in pagina], 'siguiente': siguiente})
+
+
+@bp.route('/productos/<int:id_producto>')
+async def producto(id_producto):
+    # Producto, variantes, imágenes y últimas reseñas: cuatro consultas a la vez en cuatro conexiones
+    producto, variantes, imagenes, resenas = await consultar_en_paralelo(
+        (_uno, db.select(Producto).where(Producto.id == id_producto)),
+        (_todos, db.select(VarianteProducto).where(VarianteProducto.id_producto == id_producto)
+         .order_by(VarianteProducto.id)),
+        (_todos, db.select(ImagenProducto).where(ImagenProducto.id_producto == id_producto)
+         .order_by(ImagenProducto.es_principal.desc(), ImagenProducto.id)),
+        (_filas, db.select(Resena, Usuario.nombre).join(Usuario, Resena.id_usuario == Usuario.id)
+         .where(Resena.id_producto == id_producto)
+         .order_by(Resena.fecha_resena.desc(), Resena.id.desc()).limit(RESENAS_DETALLE)),
+    )
+    if producto is None:
+        return _error('Producto no encontrado.', 404)
+
+    return jsonify(dict(
+        producto_a_dict(producto),
+        variantes=[{'id': v.id, 'nombre': v.nombre_variante, 'valor': v.valor_variante,
+                    'precio_adicional': str(v.precio_adicional), 'stock': v.stock_variante} for v in variantes],
+        imagenes=[{'id': i.id, 'url': i.url_imagen, 'es_principal': i.es_principal, 'variantes': i.variantes}
+                  for i in imagenes],
+        resenas=[{'id': r.id, 'usuario': nombre, 'calificacion': r.calificacion, 'comentario': r.comentario,
+                  'fecha': r.fecha_resena.isoformat() if r.fecha_resena else None} for r, nombre in resenas],
+    ))
+
+
+# -- Carrito --
+
+@bp.route('/carrito')
+async def carrito():
+    if current_user.is_authenticated:
+        detalles = await consultar(_todos, consulta_detalles_carrito(current_user.id))
+        lineas = [(detalle.producto, detalle.cantidad) for detalle in detalles]
+        recordar_cantidad(current_user.id, sum(cantidad for _, cantidad in lineas))
+    else:
+        invitado = carrito_invitado()
+        productos = await consultar(_todos, consulta_productos_invitado(invitado)) if invitado else []
+        lineas = [(linea.producto, linea.cantidad) for linea in lineas_invitado(invitado, productos)]
+
+    return jsonify({
+        'lineas': [_linea_a_dict(producto, cantidad) for producto, cantidad in lineas],
+        'cantidad': sum(cantidad for _, cantidad in lineas),
+        'total': str(sum((producto.precio_venta * cantidad for producto, cantidad in lineas), Decimal(0))),
+    })
+
+
+@bp.route('/carrito/productos', methods=['POST'])
+async def anadir_al_carrito():
+    datos = request.get_json(silent=True) or {}
+    try:
+        id_producto = int(datos['id_producto'])
+        cantidad = int(datos.get('cantidad', 1))
+    except (KeyError, ValueError, TypeError):
+        return _error('Se esperan "id_producto" y "cantidad" enteros.', 400)
+    if cantidad <= 0:
+        return _error('La cantidad debe ser un número positivo.', 400)
+
+    if current_user.is_authenticated:
+        if await consultar(_modificar, sentencia_anadir(current_user.id, id_producto, cantidad)) is None:
+            return _error('Producto no encontrado.', 404)
+        cantidad_total = await consultar(_uno, consulta_contar_articulos(current_user.id))
+        recordar_cantidad(current_user.id, int(cantidad_total))
+        return jsonify({'cantidad': int(cantidad_total)}), 201
+
+    existe = await consultar(_uno, db.select(Producto.id).where(Producto.id == id_producto)) is not None
+    if not anadir_invitado(id_producto, cantidad, existe=existe):
+        return _error('No se pudo añadir el producto al carrito.', 404 if not existe else 409)
+    return jsonify({'cantidad': sum(carrito_invitado().values())}), 201
+
+
+@bp.route('/carrito/productos/<int:id_producto>', methods=['DELETE'])
+async def eliminar_del_carrito(id_producto):
+    if not current_user.is_authenticated:
+        if not eliminar_invitado(id_producto):
+            return _error('El producto no está en el carrito.', 404)
+        return jsonify({'cantidad': sum(carrito_invitado().values())})
+
+    eliminado = await consultar(_modificar, db.delete(DetalleCarrito)
+                                .where(DetalleCarrito.id_carrito == CarritoCompras.id,
+                                       CarritoCompras.id_usuario == current_user.id,
+                                       DetalleCarrito.id_producto == id_producto)
+                                .returning(DetalleCarrito.id))
+    if eliminado is None:
+        return _error('El producto no está en el carrito.', 404)
+    cantidad_total = int(await consultar(_uno, consulta_contar_articulos(current_user.id)))
+    recordar_cantidad(current_user.id, cantidad_total)
+    return jsonify({'cantidad': cantidad_total})
+
+
+# -- Autenticación (la sesión es la misma que la de las vistas HTML) --
+
+@bp.route('/sesion', methods=['POST'])
+async def iniciar_sesion():
+    datos = request.get_json(silent=True) or {}
+    email, password = datos.get('email'), datos.get('password')
+    if not intento_permitido(request.remote_addr, email):
+        return _error('Demasiados intentos. Espera un momento antes de volver a intentarlo.', 429)
+
+    usuario = await consultar(_uno, db.select(Usuario).where(Usuario.email == email))
+    try:
+        # El hash se calcula en el pool acotado de seguridad.py; se espera en un hilo para no bloquear el bucle
+        valido = usuario is not None and await asyncio.to_thread(verificar_password, usuario.password_hash, password)
+        if valido and necesita_rehash(usuario.password_hash):
+            nuevo_hash = await asyncio.to_thread(generar_hash, password)
+            await consultar(_modificar, db.update(Usuario).where(Usuario.id == usuario.id)
+                            .values(password_hash=nuevo_hash))
+            invalidar_usuario(usuario.id)
+    except ServicioSaturado:
+        return _error('El servicio está muy ocupado. Inténtalo de nuevo en unos segundos.', 503)
+    if not valido:
+        return _error('Correo electrónico o contraseña incorrectos.', 401)
+
+    rotar_sesion(session)
+    login_user(usuario)
+    invitado = session.pop('carrito', None)
+    if invitado:
+        await consultar(_modificar, sentencia_fusionar(usuario.id, invitado))
+    cantidad_total = int(await consultar(_uno, consulta_contar_articulos(usuario.id)))
+    recordar_cantidad(usuario.id, cantidad_total)
+    return jsonify({'id': usuario.id, 'nombre': usuario.nombre, 'cantidad_carrito': cantidad_total})
+
+
+@bp.route('/sesion', methods=['DELETE'])
+async def cerrar_sesion():
+    logout_user()
+    session.pop('carrito_cantidad', None)
+    session.pop('codigo_descuento', None)
+    return '', 204
+
+
+@bp.route('/sesion')
+async def sesion_actual():
+    if not current_user.is_authenticated:
+        return _error('No has iniciado sesión.', 401)
+    return jsonify({'id': current_user.id, 'nombre': current_user.nombre, 'email': current_user.email,
+                    'cantidad_carrito': session.get('carrito_cantidad')})
@@ -0,0 +1,250 @@
+from flask import Blueprint, current_app, render_template, url_for, flash, redirect, request, session
+from flask_login import login_user, current_user, logout_user, login_required
+from sqlalchemy.exc import IntegrityError
+from itsdangerous import URLSafeTimedSerializer, SignatureExpired
+from app import db
+from app.models import Usuario
+from app.correo import encolar_correo
+from app.carrito import fusionar_carrito, recordar_cantidad
+from app.sesiones import rotar_sesion
+from app.seguridad import (generar_hash, verificar_password, necesita_rehash,
+                           intento_permitido, ServicioSaturado)
+
+# Autenticación: registro, inicio y cierre de sesión, confirmación de correo, recuperación de contraseña y perfil
+bp = Blueprint('auth', __name__)
+
+
+# Serializador para crear tokens seguros; usa la misma clave secreta de la app
+def _serializador():
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'])
+
+# Función para enviar el correo de recuperación
+# El correo se guarda en la bandeja de salida y lo envía el despachador en segundo plano
+def enviar_email_recuperacion(usuario):
+    token = _serializador().dumps(usuario.email, salt='recuperacion-sal')
+    link = url_for('auth.restablecer_contrasena', token=token, _external=True)
+    
+    encolar_correo(
+        asunto="Restablecer tu contraseña",
+        destinatarios=[usuario.email],
+        cuerpo=f"Para restablecer tu contraseña, haz clic en el siguiente enlace: {link}\n\nSi no solicitaste esto, simplemente ignora este correo.",
+        html=render_template('email_recuperacion.html', link=link),
+        remitente=current_app.config['MAIL_USERNAME'],
+    )
+    db.session.commit()
+
+# -- Rutas de Autenticación --
+
+# Ruta para el registro de nuevos usuarios
+@bp.route("/registro", methods=['GET', 'POST'])
+def registro():
+    if current_user.is_authenticated:
+        return redirect(url_for('catalogo.inicio'))
+    
+    if request.method == 'POST':
+        nombre = request.form.get('nombre')
+        email = request.form.get('email')
+        password = request.form.get('password')
+        telefono = request.form.get('telefono')
+        direccion_envio = request.form.get('direccion_envio')
+        direccion_facturacion = request.form.get('direccion_facturacion')
+
+        # Se limita por IP antes de calcular el hash, que es la parte costosa
+        if not intento_permitido(request.remote_addr):
+            flash('Demasiados intentos. Espera un momento antes de volver a intentarlo.', 'danger')
+            return render_template('registro.html', titulo='Registro'), 429
+
+        try:
+            hashed_password = generar_hash(password)
+        except ServicioSaturado:
+            flash('El servicio está muy ocupado. Inténtalo de nuevo en unos segundos.', 'danger')
+            return render_template('registro.html', titulo='Registro'), 503
+        
+        try:
+            nuevo_usuario = Usuario(
+                nombre=nombre,
+                email=email,
+                password_hash=hashed_password,
+                telefono=telefono,
+                direccion_envio=direccion_envio,
+                direccion_facturacion=direccion_facturacion
+            )
+            db.session.add(nuevo_usuario)
+            
+            # Genera el token de confirmación
+            token = _serializador().dumps(email, salt='email-confirm')
+            
+            # Guarda el correo de confirmación en la bandeja de salida dentro de la misma transacción
+            # que el usuario; el despachador lo enviará en segundo plano
+            link = url_for('auth.confirmar_email', token=token, _external=True)
+            encolar_correo(
+                asunto='Confirma tu correo electrónico',
+                destinatarios=[email],
+                cuerpo=f'Tu enlace de confirmación es {link}',
+                html=render_template('email_confirmacion.html', link=link),
+                remitente='tienda_papeleria@gmail.com', # Cambia esto a un correo real si no usas la variable de entorno
+            )
+            db.session.commit()
+            
+            flash('¡Registro exitoso! Por favor, revisa tu correo electrónico para confirmar tu cuenta.', 'success')
+            return redirect(url_for('auth.login'))
+        
+        except IntegrityError:
+            db.session.rollback()
+            flash('El correo electrónico ya está en uso. Por favor, elige uno diferente.', 'danger')
+            return redirect(url_for('auth.registro'))
+        
+    return render_template('registro.html', titulo='Registro')
+
+
+# Ruta para iniciar sesión
+@bp.route('/login', methods=['GET', 'POST'])
+def login():
+    if current_user.is_authenticated:
+        return redirect(url_for('catalogo.inicio'))
+    
+    if request.method == 'POST':
+        email = request.form.get('email')
+        password = request.form.get('password')
+        
+        # Los intentos abusivos se rechazan por IP y por correo antes de hacer ningún hash
+        if not intento_permitido(request.remote_addr, email):
+            flash('Demasiados intentos de inicio de sesión. Espera un momento antes de volver a intentarlo.', 'danger')
+            return render_template('login.html', titulo='Iniciar Sesión'), 429
+
+        usuario = Usuario.query.filter_by(email=email).first()
+        
+        try:
+            credenciales_validas = usuario is not None and verificar_password(usuario.password_hash, password)
+        except ServicioSaturado:
+            flash('El servicio está muy ocupado. Inténtalo de nuevo en unos segundos.', 'danger')
+            return render_template('login.html', titulo='Iniciar Sesión'), 503
+
+        if credenciales_validas:
+            # Si el coste de bcrypt configurado cambió, se recalcula el hash aprovechando la contraseña en claro
+            if necesita_rehash(usuario.password_hash):
+                try:
+                    usuario.password_hash = generar_hash(password)
+                    db.session.commit()
+                except ServicioSaturado:
+                    pass
+            # Identificador de sesión nuevo al autenticarse; el carrito del visitante pasa a su cuenta
+            rotar_sesion(session)
+            login_user(usuario)
+            fusionar_carrito(usuario.id, session.pop('carrito', None))
+            recordar_cantidad(usuario.id)
+            next_page = request.args.get('next')
+            flash(f'Inicio de sesión exitoso. ¡Bienvenido, {usuario.nombre}!', 'success')
+            return redirect(next_page) if next_page else redirect(url_for('catalogo.inicio'))
+        else:
+            flash('Correo electrónico o contraseña incorrectos.', 'danger')
+            
+    return render_template('login.html', titulo='Iniciar Sesión')
+# Ruta para cerrar sesión
+@bp.route("/logout")
+@login_required
+def logout():
+    logout_user()
+    session.pop('carrito_cantidad', None)
+    session.pop('codigo_descuento', None)
+    flash('Has cerrado sesión exitosamente.', 'success')
+    return redirect(url_for('catalogo.inicio'))
+
+# -- Nuevas rutas para la confirmación de correo --
+
+
+# Nueva ruta para solicitar la recuperación
+@bp.route('/solicitar-recuperacion', methods=['GET', 'POST'])
+def solicitar_recuperacion():
+    if current_user.is_authenticated:
+        return redirect(url_for('catalogo.inicio'))
+    
+    if request.method == 'POST':
+        email = request.form.get('email')
+        if not intento_permitido(request.remote_addr, email):
+            flash('Demasiados intentos. Espera un momento antes de volver a intentarlo.', 'danger')
+            return render_template('recuperar_contrasena.html', titulo='Recuperar Contraseña'), 429
+
+        usuario = Usuario.query.filter_by(email=email).first()
+        
+        if usuario:
+            enviar_email_recuperacion(usuario)
+            flash('Se ha enviado un correo electrónico con instrucciones para restablecer tu contraseña. Revisa tu bandeja de entrada.', 'info')
+        else:
+            flash('Si el correo existe en nuestra base de datos, recibirás un enlace de recuperación.', 'info')
+        
+        return redirect(url_for('auth.login'))
+        
+    return render_template('recuperar_contrasena.html', titulo='Recuperar Contraseña')
+
+# Nueva ruta para restablecer la contraseña
+@bp.route('/restablecer-contrasena/<token>', methods=['GET', 'POST'])
+def restablecer_contrasena(token):
+    try:
+        email = _serializador().loads(token, salt='recuperacion-sal', max_age=1800) # El token expira en 30 minutos
+    except SignatureExpired:
+        flash('El enlace de recuperación ha expirado. Por favor, solicita uno nuevo.', 'danger')
+        return redirect(url_for('auth.solicitar_recuperacion'))
+    except:
+        flash('El enlace de recuperación es inválido.', 'danger')
+        return redirect(url_for('auth.solicitar_recuperacion'))
+        
+    usuario = Usuario.query.filter_by(email=email).first()
+    if not usuario:
+        flash('El usuario no fue encontrado.', 'danger')
+        return redirect(url_for('auth.solicitar_recuperacion'))
+
+    if request.method == 'POST':
+        password = request.form.get('password')
+        password2 = request.form.get('password2')
+        if password != password2:
+            flash('Las contraseñas no coinciden.', 'danger')
+            return redirect(url_for('auth.restablecer_contrasena', token=token))
+        
+        try:
+            usuario.password_hash = generar_hash(password)
+        except ServicioSaturado:
+            flash('El servicio está muy ocupado. Inténtalo de nuevo en unos segundos.', 'danger')
+            return redirect(url_for('auth.restablecer_contrasena', token=token))
+        db.session.commit()
+        
+        flash('Tu contraseña ha sido restablecida exitosamente. Ahora puedes iniciar sesión.', 'success')
+        return redirect(url_for('auth.login'))
+        
+    return render_template('restablecer_contrasena.html', titulo='Restablecer Contraseña')
+
+
+@bp.route('/confirmar/<token>')
+def confirmar_email(token):
+    try:
+        email = _serializador().loads(token, salt='email-confirm', max_age=3600)  # Token válido por 1 hora
+    except:
+        flash('El enlace de confirmación es inválido o ha expirado.', 'danger')
+        return redirect(url_for('auth.email_fallido'))
+
+    usuario = Usuario.query.filter_by(email=email).first_or_404()
+    if usuario.email_confirmado:
+        flash('Tu cuenta ya ha sido confirmada.', 'info')
+        return redirect(url_for('auth.login'))
+    
+    usuario.email_confirmado = True
+    db.session.commit()
+
+    flash('¡Tu cuenta ha sido confirmada exitosamente! Ahora puedes iniciar sesión.', 'success')
+    return redirect(url_for('auth.email_exitoso'))
+
+
+@bp.route("/email_exitoso")
+def email_exitoso():
+    return render_template("email_exitoso.html")
+
+@bp.route("/email_fallido")
+def email_fallido():
+    return render_template("email_fallido.html")
+
+
+# Ruta del perfil del usuario
+@bp.route("/perfil")
+@login_required
+def perfil():
+    return render_template('perfil.html', titulo='Perfil de Usuario')
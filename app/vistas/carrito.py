@@ -0,0 +1,178 @@
+from decimal import Decimal # Importa la clase Decimal para manejar la precisión monetaria
+from flask import Blueprint, render_template, url_for, flash, redirect, request, abort, session
+from flask_login import current_user, login_required
+from app.pedidos import procesar_pedido, CarritoVacio, StockInsuficiente
+from app.descuentos import buscar_codigo, calcular_descuento, DescuentoInvalido
+from app.carrito import (obtener_detalles_carrito, calcular_total_carrito,
+                         anadir_producto, actualizar_cantidad, eliminar_producto,
+                         obtener_detalles_invitado, calcular_total_lineas, anadir_invitado,
+                         actualizar_invitado, eliminar_invitado, cantidad_en_carrito, recordar_cantidad)
+
+# Carrito de compras, códigos de descuento y proceso de compra.
+# Los visitantes sin cuenta pueden llenar el carrito (se guarda en su sesión); para pagar deben iniciar sesión.
+bp = Blueprint('carrito', __name__)
+
+
+# Número de artículos del carrito para la barra de navegación, servido desde la sesión
+@bp.app_context_processor
+def contexto_carrito():
+    return {'cantidad_carrito': lambda: cantidad_en_carrito(current_user)}
+
+# Ruta para mostrar el carrito de compras
+@bp.route("/carrito")
+def carrito():
+    if not current_user.is_authenticated:
+        detalles_carrito = obtener_detalles_invitado()
+        return render_template('carrito.html', titulo='Tu Carrito de Compras', detalles=detalles_carrito,
+                               subtotal=calcular_total_lineas(detalles_carrito), descuento=None,
+                               importe_descuento=Decimal(0), total=calcular_total_lineas(detalles_carrito))
+
+    # Las líneas se cargan con sus productos en una sola consulta y el total se calcula en SQL,
+    # de modo que el número de consultas no depende de cuántas líneas tenga el carrito
+    detalles_carrito = obtener_detalles_carrito(current_user.id)
+    subtotal = calcular_total_carrito(current_user.id) if detalles_carrito else Decimal(0)
+    # Ya que las líneas están cargadas, se corrige el contador de la sesión (por si cambió en otro dispositivo)
+    recordar_cantidad(current_user.id, sum(detalle.cantidad for detalle in detalles_carrito))
+
+    # El código aplicado se guarda en la sesión y se evalúa contra la caché de descuentos, sin consultas
+    descuento, importe_descuento = None, Decimal(0)
+    if session.get('codigo_descuento'):
+        try:
+            descuento = buscar_codigo(session['codigo_descuento'])
+            importe_descuento = calcular_descuento(descuento, subtotal)
+        except DescuentoInvalido as error:
+            session.pop('codigo_descuento')
+            flash(str(error), 'danger')
+
+    return render_template('carrito.html', titulo='Tu Carrito de Compras', detalles=detalles_carrito,
+                           subtotal=subtotal, descuento=descuento, importe_descuento=importe_descuento,
+                           total=subtotal - importe_descuento)
+
+# Ruta para aplicar un código de descuento al carrito
+@bp.route("/carrito/descuento", methods=['POST'])
+@login_required
+def aplicar_descuento():
+    codigo = request.form.get('codigo', '').strip()
+    try:
+        descuento = buscar_codigo(codigo)
+    except DescuentoInvalido as error:
+        flash(str(error), 'danger')
+        return redirect(url_for('carrito.carrito'))
+
+    session['codigo_descuento'] = descuento.codigo
+    flash(f'Código {descuento.codigo} aplicado.', 'success')
+    return redirect(url_for('carrito.carrito'))
+
+# Ruta para quitar el código de descuento del carrito
+@bp.route("/carrito/descuento/quitar", methods=['POST'])
+@login_required
+def quitar_descuento():
+    session.pop('codigo_descuento', None)
+    return redirect(url_for('carrito.carrito'))
+
+# ---
+
+# Ruta para convertir el carrito en un pedido
+@bp.route("/realizar_pedido", methods=['POST'])
+@login_required
+def realizar_pedido():
+    try:
+        pedido = procesar_pedido(current_user.id,
+                                 metodo_pago=request.form.get('metodo_pago'),
+                                 metodo_envio=request.form.get('metodo_envio'),
+                                 codigo_descuento=session.get('codigo_descuento'))
+    except DescuentoInvalido as error:
+        # El código caducó o agotó sus usos mientras el usuario compraba: no se cobra nada
+        session.pop('codigo_descuento', None)
+        flash(f'{error} Revisa el total antes de volver a confirmar el pedido.', 'danger')
+        return redirect(url_for('carrito.carrito'))
+    except CarritoVacio:
+        flash('Tu carrito de compras está vacío.', 'danger')
+        return redirect(url_for('carrito.carrito'))
+    except StockInsuficiente as error:
+        flash(f'No hay stock suficiente de: {", ".join(error.productos)}.', 'danger')
+        return redirect(url_for('carrito.carrito'))
+
+    session.pop('codigo_descuento', None)
+    recordar_cantidad(current_user.id, 0)
+    flash(f'¡Pedido #{pedido.id} realizado con éxito! Total: ${pedido.total:.2f}', 'success')
+    return redirect(url_for('catalogo.inicio'))
+
+# ---
+
+# Ruta para añadir un producto al carrito
+@bp.route("/anadir_al_carrito/<int:producto_id>", methods=['POST'])
+def anadir_al_carrito(producto_id):
+    try:
+        cantidad = int(request.form.get('cantidad', 1))
+    except (ValueError, TypeError):
+        flash('Cantidad no válida. Por favor, introduce un número entero.', 'danger')
+        return redirect(url_for('catalogo.inicio'))
+
+    if cantidad <= 0:
+        flash('La cantidad debe ser un número positivo.', 'danger')
+        return redirect(url_for('catalogo.inicio'))
+
+    if not current_user.is_authenticated:
+        if not anadir_invitado(producto_id, cantidad):
+            flash('No se pudo añadir el producto a tu carrito.', 'danger')
+            return redirect(url_for('catalogo.inicio'))
+        flash('Producto añadido al carrito con éxito.', 'success')
+        return redirect(url_for('carrito.carrito'))
+
+    # Crea el carrito y la línea (o suma la cantidad) en una sola sentencia atómica
+    if not anadir_producto(current_user.id, producto_id, cantidad):
+        abort(404)
+    recordar_cantidad(current_user.id)
+
+    flash('Producto añadido al carrito con éxito.', 'success')
+    return redirect(url_for('carrito.carrito'))
+
+# ---
+
+# Ruta para actualizar la cantidad de un producto en el carrito
+@bp.route("/actualizar_cantidad_carrito/<int:producto_id>", methods=['POST'])
+def actualizar_cantidad_carrito(producto_id):
+    try:
+        nueva_cantidad = int(request.form.get('cantidad'))
+        
+        # Validar que la cantidad sea un número positivo
+        if nueva_cantidad <= 0:
+            flash('La cantidad debe ser un número positivo. Para eliminar un producto, usa el botón "Eliminar".', 'danger')
+            return redirect(url_for('carrito.carrito'))
+
+        if not current_user.is_authenticated:
+            actualizado = actualizar_invitado(producto_id, nueva_cantidad)
+        else:
+            # Actualiza la línea del carrito del usuario en una sola sentencia
+            actualizado = actualizar_cantidad(current_user.id, producto_id, nueva_cantidad)
+            if actualizado:
+                recordar_cantidad(current_user.id)
+        if actualizado:
+            flash('Cantidad actualizada con éxito.', 'success')
+        else:
+            flash('El producto no se encontró en tu carrito.', 'danger')
+
+    except (ValueError, TypeError):
+        flash('Cantidad no válida. Por favor, introduce un número entero.', 'danger')
+
+    return redirect(url_for('carrito.carrito'))
+
+# ---
+
+# Ruta para eliminar un producto del carrito
+@bp.route("/eliminar_del_carrito/<int:producto_id>")
+def eliminar_del_carrito(producto_id):
+    if not current_user.is_authenticated:
+        eliminado = eliminar_invitado(producto_id)
+    else:
+        # Borra la línea del carrito del usuario en una sola sentencia
+        eliminado = eliminar_producto(current_user.id, producto_id)
+        if eliminado:
+            recordar_cantidad(current_user.id)
+    if eliminado:
+        flash('Producto eliminado del carrito.', 'success')
+    else:
+        flash('El producto no se encontró en tu carrito.', 'danger')
+
+    return redirect(url_for('carrito.carrito'))
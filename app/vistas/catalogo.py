@@ -0,0 +1,148 @@
+import json
+from flask import Blueprint, current_app, render_template, request, jsonify, abort
+from flask_login import login_required, current_user
+from markupsafe import Markup
+from app import db
+from app.catalogo import (paginar_productos, producto_a_dict, cargar_detalle_producto, pagina_resenas,
+                          detalle_a_dict, ordenar_variantes, ordenar_imagenes)
+from app.busqueda import buscar_productos
+from app.cache_http import etag_catalogo, no_modificado, respuesta_304, con_etag
+from app.fragmentos import renderizar_tarjetas, estadisticas_fragmentos, fragmento_producto
+from app.carrito import cantidad_en_carrito
+
+# Catálogo: página de inicio, búsqueda, sus APIs JSON y los endpoints de estado para administradores
+bp = Blueprint('catalogo', __name__)
+
+# Filtros, orden y cursor del catálogo comunes a la página de inicio y a la API
+def _argumentos_catalogo():
+    orden = request.args.get('orden', 'recientes')
+    return {
+        'despues_de': request.args.get('despues'),
+        'id_categoria': request.args.get('categoria', type=int),
+        'id_proveedor': request.args.get('proveedor', type=int),
+        'orden': orden if orden in ('recientes', 'calificacion') else 'recientes',
+        'calificacion_minima': request.args.get('calificacion_minima', type=float),
+    }
+
+# La página de inicio, visible para todos los usuarios
+@bp.route("/")
+@bp.route("/inicio")
+def inicio():
+    # Paginación por clave: 'despues' identifica el último producto de la página anterior
+    # Si el catálogo no cambió desde la última visita, se responde 304 sin consultar ni renderizar.
+    # El contador del carrito de la barra de navegación también forma parte del ETag
+    etag = etag_catalogo(cantidad_en_carrito(current_user))
+    if no_modificado(etag):
+        return respuesta_304(etag)
+
+    argumentos = _argumentos_catalogo()
+    productos, siguiente = paginar_productos(**argumentos)
+    # Las tarjetas se sirven desde la caché de fragmentos y solo se renderizan las que faltan
+    tarjetas = renderizar_tarjetas(productos)
+    pagina = render_template('inicio.html', titulo='Inicio', productos=productos, tarjetas=tarjetas,
+                             siguiente=siguiente, categoria=argumentos['id_categoria'],
+                             proveedor=argumentos['id_proveedor'], orden=argumentos['orden'],
+                             calificacion_minima=argumentos['calificacion_minima'],
+                             es_primera_pagina=argumentos['despues_de'] is None)
+    return con_etag(pagina, etag)
+
+# API JSON del catálogo con los mismos filtros y cursor que la página de inicio
+@bp.route("/api/productos")
+def api_productos():
+    etag = etag_catalogo()
+    if no_modificado(etag):
+        return respuesta_304(etag)
+
+    productos, siguiente = paginar_productos(por_pagina=request.args.get('por_pagina', type=int),
+                                             **_argumentos_catalogo())
+    return con_etag(jsonify({
+        'productos': [producto_a_dict(p) for p in productos],
+        'siguiente': siguiente,
+    }), etag)
+
+# Página de detalle de un producto. El contenido (producto, variantes, imágenes y una página de reseñas) no
+# depende del usuario y se guarda en la caché de fragmentos con la versión del producto, que cambia cuando
+# cambian él, sus variantes, imágenes o reseñas; la barra de navegación se renderiza en cada petición
+@bp.route("/producto/<int:id_producto>")
+def producto(id_producto):
+    despues = request.args.get('despues')
+
+    def generar():
+        producto = cargar_detalle_producto(id_producto)
+        if producto is None:
+            return None
+        resenas, siguiente = pagina_resenas(id_producto, despues)
+        imagenes = ordenar_imagenes(producto.imagenes)
+        html = render_template('_detalle_producto.html', producto=producto, imagenes=imagenes,
+                               variantes=ordenar_variantes(producto.variantes), resenas=resenas,
+                               siguiente=siguiente, es_primera_pagina=despues is None)
+        return json.dumps({'titulo': producto.nombre, 'html': html})
+
+    detalle = fragmento_producto(id_producto, f'detalle:{despues or ""}', generar)
+    if detalle is None:
+        abort(404)
+    detalle = json.loads(detalle)
+    return render_template('producto.html', titulo=detalle['titulo'], detalle=Markup(detalle['html']))
+
+# API JSON del detalle de producto, con la misma caché y el mismo cursor de reseñas que la página
+@bp.route("/api/productos/<int:id_producto>")
+def api_producto(id_producto):
+    despues = request.args.get('despues')
+
+    def generar():
+        producto = cargar_detalle_producto(id_producto)
+        if producto is None:
+            return None
+        return json.dumps(detalle_a_dict(producto, *pagina_resenas(id_producto, despues)))
+
+    detalle = fragmento_producto(id_producto, f'detalle-json:{despues or ""}', generar)
+    if detalle is None:
+        return jsonify({'error': 'Producto no encontrado.'}), 404
+    return current_app.response_class(detalle, mimetype='application/json')
+
+# Búsqueda de productos por texto completo y similitud
+@bp.route("/buscar")
+def buscar():
+    texto = request.args.get('q', '')
+    resultados = buscar_productos(texto)
+    productos = [producto for producto, _, _ in resultados]
+    tarjetas = renderizar_tarjetas(productos)
+    return render_template('buscar.html', titulo='Buscar', texto=texto, productos=productos, tarjetas=tarjetas)
+
+# API JSON de búsqueda: incluye la relevancia y la similitud de cada resultado
+@bp.route("/api/buscar")
+def api_buscar():
+    resultados = buscar_productos(request.args.get('q', ''), limite=request.args.get('limite', type=int))
+    return jsonify({
+        'resultados': [
+            dict(producto_a_dict(producto), rango=float(rango), similitud=float(similitud))
+            for producto, rango, similitud in resultados
+        ],
+    })
+
+# Contadores de aciertos y fallos de la caché de fragmentos de este proceso (solo administradores)
+@bp.route("/cache/estadisticas")
+@login_required
+def estadisticas_cache():
+    if current_user.rol != 'admin':
+        abort(403)
+    return jsonify(estadisticas_fragmentos())
+
+# Estado del pool de conexiones de este proceso para cada motor (principal y réplica)
+@bp.route("/estado/pool")
+@login_required
+def estado_pool():
+    if current_user.rol != 'admin':
+        abort(403)
+    motores = {'principal': db.engine}
+    motores.update({nombre: motor for nombre, motor in db.engines.items() if nombre is not None})
+    return jsonify({
+        nombre: {
+            'tamano': motor.pool.size(),
+            'libres': motor.pool.checkedin(),
+            'en_uso': motor.pool.checkedout(),
+            'desbordamiento': motor.pool.overflow(),
+            'estado': motor.pool.status(),
+        }
+        for nombre, motor in motores.items()
+    })
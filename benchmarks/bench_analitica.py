@@ -0,0 +1,138 @@
+"""Benchmark de los agregados de ventas (ventas_diarias) frente a la agregación directa sobre los pedidos.
+
+Siembra pedidos repartidos en los últimos --dias días hasta alcanzar el número de líneas pedido (por ejemplo
+1, 5 y 10 millones), actualiza los agregados y, en cada etapa, mide para cada dimensión (día, producto,
+categoría y proveedor) y periodo (7, 30 y 365 días) la latencia del informe leído de ventas_diarias y la del
+mismo informe calculado sobre pedidos y detalle_pedidos. También comprueba que ambos dan el mismo resultado
+y mide lo que tarda una actualización incremental tras añadir un pedido.
+
+Inserta pedidos de prueba: ejecútalo contra una base de datos desechable con las migraciones aplicadas y los
+datos de benchmarks.datos.
+
+    DATABASE_URL=postgresql://.../mipap_bench python -m benchmarks.datos --productos 10000
+    DATABASE_URL=postgresql://.../mipap_bench python -m benchmarks.bench_analitica --lineas 1000000 5000000
+"""
+import argparse
+import json
+import statistics
+import time
+from datetime import date, timedelta
+
+from app import create_app, db
+from app.analitica import DIMENSIONES, actualizar_ventas, resumen_ventas, resumen_en_bruto
+from benchmarks.carga import percentil
+
+PERIODOS = [7, 30, 365]
+LINEAS_POR_PEDIDO = 4
+
+SEMBRAR_PEDIDOS = db.text("""
+    INSERT INTO pedidos (fecha, total, id_usuario, estado_pedido, metodo_pago, metodo_envio)
+    SELECT now() - random() * make_interval(days => :dias), 0, (SELECT min(id) FROM usuarios),
+           'pagado', 'tarjeta', 'estandar'
+    FROM generate_series(1, :pedidos)
+""")
+
+# Cada pedido toma LINEAS_POR_PEDIDO productos consecutivos a partir de uno elegido por su id (por índice)
+SEMBRAR_LINEAS = db.text("""
+    INSERT INTO detalle_pedidos (id_pedido, id_producto, cantidad, precio_unitario)
+    SELECT p.id, pr.id, 1 + (p.id + pr.id) % 5, pr.precio_venta
+    FROM pedidos p
+    CROSS JOIN LATERAL (
+        SELECT id, precio_venta FROM productos
+        WHERE id >= :primero + (p.id * 7919) % :productos
+        ORDER BY id LIMIT :lineas
+    ) AS pr
+    WHERE p.id > :ultimo
+""")
+
+
+def sembrar(lineas, dias):
+    actuales = db.session.scalar(db.text('SELECT count(*) FROM detalle_pedidos'))
+    if actuales >= lineas:
+        return actuales
+    ultimo = db.session.scalar(db.text('SELECT coalesce(max(id), 0) FROM pedidos'))
+    primero, productos = db.session.execute(db.text('SELECT min(id), count(*) FROM productos')).one()
+    if not productos:
+        raise SystemExit('No hay productos: ejecuta antes python -m benchmarks.datos')
+    db.session.execute(SEMBRAR_PEDIDOS, {'pedidos': (lineas - actuales) // LINEAS_POR_PEDIDO + 1, 'dias': dias})
+    db.session.execute(SEMBRAR_LINEAS, {'primero': primero, 'productos': max(productos - LINEAS_POR_PEDIDO, 1),
+                                        'lineas': LINEAS_POR_PEDIDO, 'ultimo': ultimo})
+    db.session.commit()
+    db.session.execute(db.text('ANALYZE pedidos'))
+    db.session.execute(db.text('ANALYZE detalle_pedidos'))
+    db.session.commit()
+    return db.session.scalar(db.text('SELECT count(*) FROM detalle_pedidos'))
+
+
+def cronometrar(funcion, repeticiones):
+    tiempos = []
+    resultado = None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+        db.session.rollback()
+    return resultado, tiempos
+
+
+def _normalizar(filas):
+    return sorted((str(f.clave), int(f.unidades), round(float(f.ingresos), 2), round(float(f.coste), 2))
+                  for f in filas)
+
+
+def medir(lineas, repeticiones):
+    resultados = []
+    hoy = date.today()
+    for dimension in DIMENSIONES:
+        for periodo in PERIODOS:
+            desde = hoy - timedelta(days=periodo - 1)
+            agregado, t_agregado = cronometrar(lambda: resumen_ventas(dimension, desde, hoy), repeticiones)
+            bruto, t_bruto = cronometrar(lambda: resumen_en_bruto(dimension, desde, hoy), repeticiones)
+            resultados.append({
+                'lineas': lineas,
+                'dimension': dimension,
+                'dias': periodo,
+                'filas': len(agregado),
+                'coinciden': _normalizar(agregado) == _normalizar(bruto),
+                'agregado_p50_ms': round(statistics.median(t_agregado), 3),
+                'agregado_p95_ms': round(percentil(t_agregado, 95), 3),
+                'bruto_p50_ms': round(statistics.median(t_bruto), 3),
+                'bruto_p95_ms': round(percentil(t_bruto, 95), 3),
+                'aceleracion': round(statistics.median(t_bruto) / max(statistics.median(t_agregado), 1e-6), 1),
+            })
+            print(json.dumps(resultados[-1]))
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lineas', type=int, nargs='+', default=[1000000, 5000000])
+    parser.add_argument('--dias', type=int, default=730, help='Antigüedad máxima de los pedidos sembrados')
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--salida', help='Archivo JSON donde guardar los resultados')
+    args = parser.parse_args()
+
+    resultados = []
+    with create_app().app_context():
+        for objetivo in sorted(args.lineas):
+            lineas = sembrar(objetivo, args.dias)
+
+            inicio = time.perf_counter()
+            actualizar_ventas(reconstruir=True)
+            reconstruccion = (time.perf_counter() - inicio) * 1000
+            inicio = time.perf_counter()
+            actualizar_ventas()
+            incremental = (time.perf_counter() - inicio) * 1000
+            actualizacion = {'lineas': lineas, 'reconstruccion_ms': round(reconstruccion, 3),
+                             'incremental_ms': round(incremental, 3)}
+            print(json.dumps(actualizacion))
+            resultados.append(actualizacion)
+            resultados.extend(medir(lineas, args.repeticiones))
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as archivo:
+            json.dump(resultados, archivo, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""Benchmark de la API JSON asíncrona (/api/v1) frente a las rutas WSGI equivalentes.
+
+Se ejecuta contra un servidor en marcha (por ejemplo gunicorn con varios workers) para medir el
+comportamiento real con muchas conexiones simultáneas. Para cada nivel de concurrencia lanza ese número de
+clientes HTTP, cada uno con su propia sesión iniciada como un usuario bench<N>@ejemplo.test, y mide
+p50/p95/p99 y peticiones por segundo de cada ruta:
+
+    catalogo   /api/productos           frente a /api/v1/productos
+    carrito    /carrito (HTML)          frente a /api/v1/carrito
+    detalle    /api/v1/productos/<id>   (producto, variantes, imágenes y reseñas en paralelo)
+
+    python -m benchmarks.datos --usuarios 256 --productos 10000
+    LIMITE_INTENTOS_HABILITADO=false gunicorn -w 4 --threads 8 'app:create_app()'
+    python -m benchmarks.bench_api --url http://localhost:8000 --concurrencias 16 64 256 --salida api.json
+"""
+import argparse
+import http.cookiejar
+import json
+import statistics
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.carga import percentil
+from benchmarks.datos import PASSWORD
+
+RUTAS = [
+    ('catalogo', 'wsgi', '/api/productos'),
+    ('catalogo', 'async', '/api/v1/productos'),
+    ('carrito', 'wsgi', '/carrito'),
+    ('carrito', 'async', '/api/v1/carrito'),
+    ('detalle', 'async', '/api/v1/productos/{id}'),
+]
+
+
+class Cliente:
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+        self._abridor = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def pedir(self, ruta, datos=None, metodo=None):
+        cuerpo = json.dumps(datos).encode('utf-8') if datos is not None else None
+        peticion = urllib.request.Request(self.url + ruta, data=cuerpo, method=metodo,
+                                          headers={'Content-Type': 'application/json'} if cuerpo else {})
+        try:
+            with self._abridor.open(peticion, timeout=60) as respuesta:
+                respuesta.read()
+                return respuesta.status
+        except urllib.error.HTTPError as error:
+            return error.code
+        except OSError:
+            return 599
+
+
+def _trabajador(url, indice, peticiones, ids_productos):
+    cliente = Cliente(url)
+    cliente.pedir('/api/v1/sesion', {'email': f'bench{indice + 1}@ejemplo.test', 'password': PASSWORD}, 'POST')
+    muestras = defaultdict(list)
+    for n in range(peticiones):
+        id_producto = ids_productos[(indice * peticiones + n) % len(ids_productos)]
+        for nombre, tipo, ruta in RUTAS:
+            inicio = time.perf_counter()
+            estado = cliente.pedir(ruta.format(id=id_producto))
+            muestras[(nombre, tipo)].append(((time.perf_counter() - inicio) * 1000, estado))
+    return muestras
+
+
+def medir(url, concurrencia, peticiones, ids_productos):
+    muestras = defaultdict(list)
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrencia) as ejecutor:
+        futuros = [ejecutor.submit(_trabajador, url, i, peticiones, ids_productos) for i in range(concurrencia)]
+        for futuro in futuros:
+            for clave, filas in futuro.result().items():
+                muestras[clave].extend(filas)
+    duracion = time.perf_counter() - inicio
+
+    resultados = []
+    for (nombre, tipo), filas in sorted(muestras.items()):
+        latencias = [fila[0] for fila in filas]
+        resultados.append({
+            'concurrencia': concurrencia,
+            'ruta': nombre,
+            'tipo': tipo,
+            'peticiones': len(filas),
+            'errores': sum(1 for fila in filas if fila[1] >= 500),
+            'p50_ms': round(percentil(latencias, 50), 3),
+            'p95_ms': round(percentil(latencias, 95), 3),
+            'p99_ms': round(percentil(latencias, 99), 3),
+            'media_ms': round(statistics.mean(latencias), 3),
+            'peticiones_por_segundo': round(len(filas) / duracion, 2),
+        })
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:8000', help='Servidor de la tienda en marcha')
+    parser.add_argument('--concurrencias', type=int, nargs='+', default=[16, 64, 256])
+    parser.add_argument('--peticiones', type=int, default=20, help='Iteraciones por cliente y ruta')
+    parser.add_argument('--salida', help='Archivo JSON donde guardar los resultados')
+    args = parser.parse_args()
+
+    with urllib.request.urlopen(f'{args.url.rstrip("/")}/api/v1/productos?por_pagina=100') as respuesta:
+        ids_productos = [p['id'] for p in json.load(respuesta)['productos']]
+    if not ids_productos:
+        raise SystemExit('No hay productos: ejecuta antes python -m benchmarks.datos')
+
+    resultados = []
+    for concurrencia in args.concurrencias:
+        for fila in medir(args.url, concurrencia, args.peticiones, ids_productos):
+            resultados.append(fila)
+            print(json.dumps(fila))
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as archivo:
+            json.dump(resultados, archivo, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Benchmark del arranque de la aplicación.
+
+Cada medición se hace en un intérprete nuevo, como un trabajador recién creado, y separa tres fases:
+importar el paquete, crear la aplicación con create_app() y atender la primera petición con el cliente de
+pruebas. Se mide con y sin el panel de administración para ver lo que cuesta cargar Flask-Admin.
+
+    python -m benchmarks.bench_arranque --repeticiones 10 --ruta / --salida arranque.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Se ejecuta en el proceso hijo: imprime una línea JSON con la duración de cada fase en milisegundos
+_MEDIR = """
+import json, sys, time
+inicio = time.perf_counter()
+from app import create_app
+importado = time.perf_counter()
+app = create_app()
+creado = time.perf_counter()
+respuesta = app.test_client().get(sys.argv[1])
+servido = time.perf_counter()
+print(json.dumps({
+    'importar_ms': (importado - inicio) * 1000,
+    'crear_ms': (creado - importado) * 1000,
+    'primera_peticion_ms': (servido - creado) * 1000,
+    'total_ms': (servido - inicio) * 1000,
+    'estado': respuesta.status_code,
+}))
+"""
+
+
+def medir(ruta, repeticiones, admin):
+    entorno = dict(os.environ, ADMIN_HABILITADO='true' if admin else 'false')
+    muestras = []
+    for _ in range(repeticiones):
+        salida = subprocess.check_output([sys.executable, '-c', _MEDIR, ruta], env=entorno, text=True)
+        muestras.append(json.loads(salida.strip().splitlines()[-1]))
+
+    resumen = {'admin': admin, 'estado': muestras[-1]['estado']}
+    for fase in ('importar_ms', 'crear_ms', 'primera_peticion_ms', 'total_ms'):
+        valores = [muestra[fase] for muestra in muestras]
+        resumen[fase] = round(statistics.median(valores), 2)
+        resumen[fase.replace('_ms', '_max_ms')] = round(max(valores), 2)
+    return resumen
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeticiones', type=int, default=10, help='Procesos nuevos por configuración')
+    parser.add_argument('--ruta', default='/', help='Ruta de la primera petición')
+    parser.add_argument('--salida', help='Archivo JSON donde guardar los resultados')
+    args = parser.parse_args()
+
+    resultados = []
+    for admin in (True, False):
+        fila = medir(args.ruta, args.repeticiones, admin)
+        resultados.append(fila)
+        print(json.dumps(fila))
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as archivo:
+            json.dump(resultados, archivo, indent=2)
+
+
+if __name__ == '__main__':
+    main()
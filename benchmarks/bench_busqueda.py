@@ -0,0 +1,78 @@
+"""Benchmark de la búsqueda de productos.
+
+Hace crecer el catálogo por etapas (por ejemplo 1.000, 10.000 y 100.000 productos) y, en cada etapa,
+mide la latencia de buscar_productos() para un conjunto fijo de consultas, incluidas algunas con errores
+tipográficos. Con los índices GIN la latencia debe mantenerse prácticamente plana entre etapas.
+
+Inserta productos de prueba: ejecútalo contra una base de datos desechable con las migraciones aplicadas.
+
+    DATABASE_URL=postgresql://.../mipap_bench python -m benchmarks.bench_busqueda --tamanos 1000 10000 100000
+"""
+import argparse
+import json
+import statistics
+import time
+
+from app import create_app, db
+from app.busqueda import buscar_productos
+
+CONSULTAS = ['lápiz', 'lapis', 'cuaderno a4', 'boligrafo azul', 'marcadr', 'tijeras escolares']
+
+SEMBRAR = db.text("""
+    INSERT INTO productos (nombre, descripcion, precio_compra, precio_venta, stock)
+    SELECT (ARRAY['Lápiz', 'Cuaderno', 'Bolígrafo', 'Goma', 'Regla', 'Carpeta', 'Marcador', 'Tijeras'])[1 + i % 8]
+           || ' ' || (ARRAY['azul', 'rojo', 'HB', 'profesional', 'escolar', 'A4', 'reciclado'])[1 + (i / 8) % 7]
+           || ' ' || i,
+           'Artículo de papelería número ' || i || ' para oficina y escuela',
+           1.00, 2.50, 10
+    FROM generate_series(:desde, :hasta) AS i
+""")
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def medir(repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        for consulta in CONSULTAS:
+            inicio = time.perf_counter()
+            buscar_productos(consulta)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+    db.session.rollback()
+    return {
+        'p50_ms': round(statistics.median(tiempos), 3),
+        'p95_ms': round(percentil(tiempos, 95), 3),
+        'max_ms': round(max(tiempos), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tamanos', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeticiones', type=int, default=20)
+    parser.add_argument('--salida', help='Archivo JSON donde guardar los resultados')
+    args = parser.parse_args()
+
+    resultados = []
+    with create_app().app_context():
+        for tamano in sorted(args.tamanos):
+            actuales = db.session.scalar(db.text('SELECT count(*) FROM productos'))
+            if actuales < tamano:
+                db.session.execute(SEMBRAR, {'desde': actuales + 1, 'hasta': tamano})
+                db.session.commit()
+                db.session.execute(db.text('ANALYZE productos'))
+                db.session.commit()
+            fila = dict(productos=max(actuales, tamano), **medir(args.repeticiones))
+            resultados.append(fila)
+            print(json.dumps(fila))
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as archivo:
+            json.dump(resultados, archivo, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""Benchmark de la página de detalle de producto.
+
+Crea (o reutiliza) un producto con cientos de variantes, varias imágenes y miles de reseñas, y mide:
+
+    perezosa    cargar el producto y recorrer producto.variantes / imagenes / resenas con carga perezosa
+    consultas   cargar_detalle_producto() + pagina_resenas() (selectinload y paginación por clave)
+    fria        GET /producto/<id> con la caché de fragmentos invalidada antes de cada petición
+    caliente    GET /producto/<id> servida desde la caché de fragmentos
+    profunda    GET /producto/<id>?despues=<cursor> de una página de reseñas cercana al final
+
+Para cada escenario informa p50/p95 y el número de sentencias SQL por petición.
+Inserta datos de prueba: ejecútalo contra una base de datos desechable con las migraciones aplicadas.
+
+    DATABASE_URL=postgresql://.../mipap_bench python -m benchmarks.bench_detalle --variantes 500 --resenas 5000
+"""
+import argparse
+import json
+import statistics
+import time
+
+from sqlalchemy import event
+
+from app import create_app, db
+from app.catalogo import cargar_detalle_producto, pagina_resenas
+from app.fragmentos import invalidar_producto
+from app.models import Producto
+from benchmarks.carga import percentil
+
+NOMBRE = 'Producto detalle bench'
+
+SEMBRAR = [
+    """INSERT INTO productos (nombre, descripcion, precio_compra, precio_venta, stock)
+       SELECT :nombre, 'Producto con muchas variantes y reseñas para el benchmark del detalle', 2.00, 5.00, 1000
+       WHERE NOT EXISTS (SELECT 1 FROM productos WHERE nombre = :nombre)""",
+    """INSERT INTO variantes_producto (id_producto, nombre_variante, valor_variante, precio_adicional, stock_variante)
+       SELECT p.id, 'Modelo', 'Modelo ' || i, (i % 5) * 0.25, 10
+       FROM productos p CROSS JOIN generate_series(1, :variantes) AS i
+       WHERE p.nombre = :nombre
+       ON CONFLICT DO NOTHING""",
+    """INSERT INTO imagenes_producto (id_producto, url_imagen, es_principal)
+       SELECT p.id, 'https://ejemplo.test/imagenes/detalle-' || i || '.jpg', i = 1
+       FROM productos p CROSS JOIN generate_series(1, :imagenes) AS i
+       WHERE p.nombre = :nombre
+         AND NOT EXISTS (SELECT 1 FROM imagenes_producto WHERE id_producto = p.id)""",
+    """INSERT INTO usuarios (nombre, email, password_hash, rol, email_confirmado, creado_en)
+       SELECT 'Reseñador ' || i, 'resena' || i || '@ejemplo.test', 'x', 'cliente', true, now()
+       FROM generate_series(1, :resenas) AS i
+       ON CONFLICT (email) DO NOTHING""",
+    """INSERT INTO resenas (id_producto, id_usuario, calificacion, comentario, fecha_resena)
+       SELECT p.id, u.id, 1 + u.id % 5, 'Comentario de prueba del usuario ' || u.id,
+              now() - (u.id % 1000) * interval '1 hour'
+       FROM productos p
+       JOIN usuarios u ON u.email LIKE 'resena%@ejemplo.test'
+       WHERE p.nombre = :nombre
+       ON CONFLICT DO NOTHING""",
+]
+
+
+def sembrar(variantes, imagenes, resenas):
+    parametros = {'nombre': NOMBRE, 'variantes': variantes, 'imagenes': imagenes, 'resenas': resenas}
+    for sql in SEMBRAR:
+        db.session.execute(db.text(sql), parametros)
+    db.session.commit()
+    db.session.execute(db.text('ANALYZE'))
+    db.session.commit()
+    return db.session.scalar(db.select(Producto.id).where(Producto.nombre == NOMBRE))
+
+
+class ContadorSQL:
+    def __init__(self, motor):
+        self.sentencias = 0
+        event.listen(motor, 'before_cursor_execute', self._contar)
+
+    def _contar(self, *args):
+        self.sentencias += 1
+
+
+def medir(nombre, funcion, repeticiones, contador, preparar=None):
+    tiempos, sentencias = [], []
+    for _ in range(repeticiones):
+        if preparar:
+            preparar()
+        antes = contador.sentencias
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+        sentencias.append(contador.sentencias - antes)
+    return {
+        'escenario': nombre,
+        'p50_ms': round(statistics.median(tiempos), 3),
+        'p95_ms': round(percentil(tiempos, 95), 3),
+        'sql_por_peticion': round(statistics.mean(sentencias), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--variantes', type=int, default=500)
+    parser.add_argument('--imagenes', type=int, default=8)
+    parser.add_argument('--resenas', type=int, default=5000)
+    parser.add_argument('--repeticiones', type=int, default=50)
+    parser.add_argument('--salida', help='Archivo JSON donde guardar los resultados')
+    args = parser.parse_args()
+
+    app = create_app()
+    resultados = []
+    with app.app_context():
+        id_producto = sembrar(args.variantes, args.imagenes, args.resenas)
+        contador = ContadorSQL(db.engine)
+
+        def perezosa():
+            producto = db.session.get(Producto, id_producto)
+            len(producto.variantes), len(producto.imagenes), len(producto.resenas)
+            db.session.rollback()
+
+        def consultas():
+            cargar_detalle_producto(id_producto)
+            pagina_resenas(id_producto)
+            db.session.rollback()
+
+        # Cursor de una página cercana al final para comprobar que las páginas profundas cuestan lo mismo
+        cursor, paginas = None, 0
+        while paginas < args.resenas // app.config['RESENAS_POR_PAGINA'] - 1:
+            _, siguiente = pagina_resenas(id_producto, cursor)
+            if siguiente is None:
+                break
+            cursor, paginas = siguiente, paginas + 1
+        db.session.rollback()
+
+        cliente = app.test_client()
+        url = f'/producto/{id_producto}'
+        resultados.append(medir('perezosa', perezosa, args.repeticiones, contador))
+        resultados.append(medir('consultas', consultas, args.repeticiones, contador))
+        resultados.append(medir('fria', lambda: cliente.get(url), args.repeticiones, contador,
+                                preparar=lambda: invalidar_producto(id_producto)))
+        cliente.get(url)
+        resultados.append(medir('caliente', lambda: cliente.get(url), args.repeticiones, contador))
+        resultados.append(medir('profunda', lambda: cliente.get(url, query_string={'despues': cursor}),
+                                args.repeticiones, contador, preparar=lambda: invalidar_producto(id_producto)))
+
+    for fila in resultados:
+        fila.update(variantes=args.variantes, resenas=args.resenas)
+        print(json.dumps(fila))
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as archivo:
+            json.dump(resultados, archivo, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""Prueba de carga de las rutas de la tienda.
+
+Lanza varios hilos que recorren las rutas principales (inicio, login, carrito y anadir_al_carrito) con el
+cliente de pruebas de Flask y mide, para cada ruta, la latencia p50/p95/p99, el rendimiento (peticiones
+por segundo) y el número medio de sentencias SQL por petición. Los resultados se escriben en JSON para
+poder compararlos entre commits con --comparar.
+
+Usa los usuarios creados por benchmarks.datos (bench<N>@ejemplo.test):
+
+    python -m benchmarks.datos --usuarios 200 --productos 10000
+    python -m benchmarks.carga --hilos 16 --peticiones 200 --salida resultados.json
+    python -m benchmarks.carga --hilos 16 --peticiones 200 --comparar resultados.json
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from sqlalchemy import event
+
+from app import create_app, db
+from benchmarks.datos import PASSWORD
+
+# Contador de sentencias SQL del hilo actual
+_local = threading.local()
+
+
+def _contar_sentencia(conn, cursor, statement, parameters, context, executemany):
+    _local.sentencias = getattr(_local, 'sentencias', 0) + 1
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def _medir(muestras, ruta, funcion):
+    _local.sentencias = 0
+    inicio = time.perf_counter()
+    respuesta = funcion()
+    duracion = (time.perf_counter() - inicio) * 1000
+    muestras[ruta].append((duracion, _local.sentencias, respuesta.status_code))
+
+
+def _iniciar_sesion(cliente, email):
+    return cliente.post('/login', data={'email': email, 'password': PASSWORD})
+
+
+def _trabajador(app, indice, peticiones, ids_productos):
+    muestras = defaultdict(list)
+    email = f'bench{indice + 1}@ejemplo.test'
+
+    anonimo = app.test_client()
+    autenticado = app.test_client()
+    _iniciar_sesion(autenticado, email)
+
+    for n in range(peticiones):
+        id_producto = ids_productos[(indice * peticiones + n) % len(ids_productos)]
+        _medir(muestras, 'inicio', lambda: anonimo.get('/'))
+        # Cada login usa un cliente nuevo para que la petición haga el trabajo completo (bcrypt incluido)
+        _medir(muestras, 'login', lambda: _iniciar_sesion(app.test_client(), email))
+        _medir(muestras, 'carrito', lambda: autenticado.get('/carrito'))
+        _medir(muestras, 'anadir_al_carrito',
+               lambda: autenticado.post(f'/anadir_al_carrito/{id_producto}', data={'cantidad': 1}))
+    return muestras
+
+
+def _resumen(muestras, duracion_total):
+    resumen = {}
+    for ruta, filas in sorted(muestras.items()):
+        latencias = [fila[0] for fila in filas]
+        resumen[ruta] = {
+            'peticiones': len(filas),
+            'errores': sum(1 for fila in filas if fila[2] >= 500),
+            'p50_ms': round(percentil(latencias, 50), 3),
+            'p95_ms': round(percentil(latencias, 95), 3),
+            'p99_ms': round(percentil(latencias, 99), 3),
+            'media_ms': round(statistics.mean(latencias), 3),
+            'peticiones_por_segundo': round(len(filas) / duracion_total, 2),
+            'sql_por_peticion': round(statistics.mean(fila[1] for fila in filas), 2),
+        }
+    return resumen
+
+
+def _commit_actual():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _comparar(actual, base):
+    print(f"\nComparación con {base.get('commit')} ({base.get('fecha')}):")
+    for ruta, datos in actual['rutas'].items():
+        anterior = base['rutas'].get(ruta)
+        if not anterior:
+            continue
+        for metrica in ('p50_ms', 'p95_ms', 'p99_ms', 'sql_por_peticion'):
+            antes, ahora = anterior[metrica], datos[metrica]
+            cambio = (ahora - antes) / antes * 100 if antes else 0
+            print(f'  {ruta:20} {metrica:18} {antes:>10} -> {ahora:>10} ({cambio:+.1f}%)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hilos', type=int, default=8, help='Clientes concurrentes (uno por usuario bench)')
+    parser.add_argument('--peticiones', type=int, default=50, help='Iteraciones por hilo y ruta')
+    parser.add_argument('--salida', help='Archivo JSON donde guardar los resultados')
+    parser.add_argument('--comparar', help='Archivo JSON de una ejecución anterior para comparar')
+    args = parser.parse_args()
+
+    app = create_app()
+    # El benchmark repite inicios de sesión con los mismos correos: se desactiva la limitación de intentos
+    app.config['LIMITE_INTENTOS_HABILITADO'] = False
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', _contar_sentencia)
+        ids_productos = db.session.scalars(db.text(
+            "SELECT id FROM productos WHERE nombre LIKE 'Producto bench %' ORDER BY id LIMIT 1000")).all()
+        db.session.remove()
+    if not ids_productos:
+        raise SystemExit('No hay datos de prueba: ejecuta antes python -m benchmarks.datos')
+
+    muestras = defaultdict(list)
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.hilos) as ejecutor:
+        futuros = [ejecutor.submit(_trabajador, app, i, args.peticiones, ids_productos) for i in range(args.hilos)]
+        for futuro in futuros:
+            for ruta, filas in futuro.result().items():
+                muestras[ruta].extend(filas)
+    duracion_total = time.perf_counter() - inicio
+
+    resultado = {
+        'commit': _commit_actual(),
+        'fecha': datetime.now(timezone.utc).isoformat(),
+        'hilos': args.hilos,
+        'peticiones_por_hilo': args.peticiones,
+        'duracion_s': round(duracion_total, 3),
+        'rutas': _resumen(muestras, duracion_total),
+    }
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as archivo:
+            json.dump(resultado, archivo, indent=2, ensure_ascii=False)
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as archivo:
+            _comparar(resultado, json.load(archivo))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Generador de datos para los benchmarks.
+
+Siembra usuarios, categorías, proveedores, productos, variantes y carritos con sentencias
+INSERT ... SELECT generate_series, de modo que incluso cientos de miles de filas se crean en segundos.
+Todos los usuarios comparten la contraseña PASSWORD y tienen el correo bench<N>@ejemplo.test.
+
+    DATABASE_URL=postgresql://.../mipap_bench python -m benchmarks.datos --usuarios 1000 --productos 100000
+"""
+import argparse
+
+from app import create_app, db, bcrypt
+
+PASSWORD = 'benchmark123'
+
+
+def sembrar(usuarios=100, productos=1000, variantes_por_producto=2, lineas_por_carrito=3):
+    # Un único hash bcrypt para todos los usuarios: calcularlo por usuario dominaría el tiempo de siembra
+    hash_password = bcrypt.generate_password_hash(PASSWORD).decode('utf-8')
+    sentencias = [
+        ("""INSERT INTO categorias (nombre)
+            SELECT 'Categoría bench ' || i FROM generate_series(1, 20) AS i
+            ON CONFLICT (nombre) DO NOTHING""", {}),
+        ("""INSERT INTO proveedores (nombre, email)
+            SELECT 'Proveedor bench ' || i, 'proveedor' || i || '@ejemplo.test' FROM generate_series(1, 10) AS i
+            ON CONFLICT (email) DO NOTHING""", {}),
+        ("""INSERT INTO productos (nombre, descripcion, precio_compra, precio_venta, stock, id_categoria, id_proveedor)
+            SELECT 'Producto bench ' || i, 'Artículo de papelería de prueba número ' || i,
+                   round((1 + random() * 20)::numeric, 2), round((25 + random() * 50)::numeric, 2),
+                   1000000,
+                   (SELECT id FROM categorias ORDER BY id OFFSET (i % 20) LIMIT 1),
+                   (SELECT id FROM proveedores ORDER BY id OFFSET (i % 10) LIMIT 1)
+            FROM generate_series(1, :productos) AS i""", {'productos': productos}),
+        ("""INSERT INTO variantes_producto (id_producto, nombre_variante, valor_variante, precio_adicional, stock_variante)
+            SELECT p.id, 'Color', 'Color ' || v, 0, 100
+            FROM productos p CROSS JOIN generate_series(1, :variantes) AS v
+            WHERE p.nombre LIKE 'Producto bench %'
+            ON CONFLICT DO NOTHING""", {'variantes': variantes_por_producto}),
+        ("""INSERT INTO usuarios (nombre, email, password_hash, rol, email_confirmado, creado_en)
+            SELECT 'Usuario bench ' || i, 'bench' || i || '@ejemplo.test', :hash, 'cliente', true, now()
+            FROM generate_series(1, :usuarios) AS i
+            ON CONFLICT (email) DO NOTHING""", {'usuarios': usuarios, 'hash': hash_password}),
+        ("""INSERT INTO carrito_compras (id_usuario, creado_en)
+            SELECT id, now() FROM usuarios WHERE email LIKE 'bench%@ejemplo.test'
+            ON CONFLICT (id_usuario) DO NOTHING""", {}),
+        ("""INSERT INTO detalle_carrito (id_carrito, id_producto, cantidad)
+            SELECT c.id, p.id, 1
+            FROM carrito_compras c
+            JOIN usuarios u ON u.id = c.id_usuario AND u.email LIKE 'bench%@ejemplo.test'
+            CROSS JOIN LATERAL (
+                SELECT id FROM productos WHERE nombre LIKE 'Producto bench %'
+                ORDER BY id OFFSET (c.id * 7) % GREATEST(:productos - :lineas, 1) LIMIT :lineas
+            ) AS p
+            ON CONFLICT DO NOTHING""", {'productos': productos, 'lineas': lineas_por_carrito}),
+    ]
+    for sql, parametros in sentencias:
+        db.session.execute(db.text(sql), parametros)
+    db.session.commit()
+    db.session.execute(db.text('ANALYZE'))
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--usuarios', type=int, default=100)
+    parser.add_argument('--productos', type=int, default=1000)
+    parser.add_argument('--variantes', type=int, default=2, help='Variantes por producto')
+    parser.add_argument('--lineas', type=int, default=3, help='Líneas por carrito')
+    args = parser.parse_args()
+
+    with create_app().app_context():
+        sembrar(args.usuarios, args.productos, args.variantes, args.lineas)
+    print(f'Sembrados {args.usuarios} usuarios y {args.productos} productos.')
+
+
+if __name__ == '__main__':
+    main()
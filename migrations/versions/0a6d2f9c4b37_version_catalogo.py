@@ -0,0 +1,47 @@
+"""Contador de versión del catálogo para las respuestas condicionales (ETag)
+
+Revision ID: 0a6d2f9c4b37
+Revises: f17b3d8e2c64
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0a6d2f9c4b37'
+down_revision = 'f17b3d8e2c64'
+branch_labels = None
+depends_on = None
+
+TABLAS = ('productos', 'imagenes_producto', 'variantes_producto')
+
+
+def upgrade():
+    # Se usa una secuencia y no una fila contador: nextval() no es transaccional ni bloquea,
+    # así que las escrituras concurrentes del catálogo (por ejemplo, el descuento de stock en cada compra)
+    # no se serializan esperando a una misma fila
+    op.execute('CREATE SEQUENCE version_catalogo_seq')
+    op.execute("""
+        CREATE OR REPLACE FUNCTION incrementar_version_catalogo() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            PERFORM nextval('version_catalogo_seq');
+            RETURN NULL;
+        END
+        $$
+    """)
+    for tabla in TABLAS:
+        op.execute(f"""
+            CREATE TRIGGER trg_{tabla}_version_catalogo
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {tabla}
+            FOR EACH STATEMENT EXECUTE FUNCTION incrementar_version_catalogo()
+        """)
+
+
+def downgrade():
+    for tabla in TABLAS:
+        op.execute(f'DROP TRIGGER IF EXISTS trg_{tabla}_version_catalogo ON {tabla}')
+    op.execute('DROP FUNCTION IF EXISTS incrementar_version_catalogo()')
+    op.execute('DROP SEQUENCE IF EXISTS version_catalogo_seq')
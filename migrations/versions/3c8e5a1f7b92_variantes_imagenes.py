@@ -0,0 +1,33 @@
+"""Variantes redimensionadas de las imágenes de producto
+
+Revision ID: 3c8e5a1f7b92
+Revises: 0a6d2f9c4b37
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '3c8e5a1f7b92'
+down_revision = '0a6d2f9c4b37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # hash_contenido: SHA-256 del original procesado; si no cambia, el reprocesado se salta la imagen.
+    # variantes: tamaños generados (ancho, alto y rutas WebP/JPEG) que las plantillas usan para el srcset
+    with op.batch_alter_table('imagenes_producto', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('hash_contenido', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('variantes', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+        batch_op.add_column(sa.Column('procesada_en', sa.TIMESTAMP(timezone=True), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('imagenes_producto', schema=None) as batch_op:
+        batch_op.drop_column('procesada_en')
+        batch_op.drop_column('variantes')
+        batch_op.drop_column('hash_contenido')
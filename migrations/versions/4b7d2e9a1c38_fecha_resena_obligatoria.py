@@ -0,0 +1,47 @@
+"""Fecha obligatoria en las reseñas
+
+Revision ID: 4b7d2e9a1c38
+Revises: e9b4c7a2d615
+Create Date: 2026-10-18 22:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b7d2e9a1c38'
+down_revision = 'e9b4c7a2d615'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # La paginación por clave de las reseñas compara (fecha_resena, id) con el cursor: una reseña sin fecha
+    # no aparecería en ninguna página y no se podría construir el cursor a partir de ella.
+    # Las reseñas antiguas sin fecha reciben la fecha de alta de su autor (la más temprana posible).
+    op.execute("""
+        UPDATE resenas r SET fecha_resena = coalesce(u.creado_en, now())
+        FROM usuarios u
+        WHERE u.id = r.id_usuario AND r.fecha_resena IS NULL
+    """)
+    with op.batch_alter_table('resenas', schema=None) as batch_op:
+        batch_op.alter_column('fecha_resena', server_default=sa.text('now()'))
+    # NOT VALID no revisa las filas existentes (el bloqueo exclusivo dura un instante) pero ya rechaza las
+    # nuevas sin fecha. Es la última sentencia de la transacción de la migración, que se confirma aquí
+    op.execute('ALTER TABLE resenas ADD CONSTRAINT resenas_fecha_resena_no_nula '
+               'CHECK (fecha_resena IS NOT NULL) NOT VALID')
+
+    # Cada sentencia en su propia transacción: VALIDATE recorre la tabla con un bloqueo que permite leer y
+    # escribir, y SET NOT NULL aprovecha la restricción ya validada en lugar de recorrerla otra vez con el
+    # bloqueo exclusivo
+    with op.get_context().autocommit_block():
+        op.execute('ALTER TABLE resenas VALIDATE CONSTRAINT resenas_fecha_resena_no_nula')
+        op.alter_column('resenas', 'fecha_resena', existing_type=sa.TIMESTAMP(timezone=True), nullable=False)
+        op.execute('ALTER TABLE resenas DROP CONSTRAINT resenas_fecha_resena_no_nula')
+
+
+def downgrade():
+    with op.batch_alter_table('resenas', schema=None) as batch_op:
+        batch_op.alter_column('fecha_resena', existing_type=sa.TIMESTAMP(timezone=True), nullable=True,
+                              server_default=None)
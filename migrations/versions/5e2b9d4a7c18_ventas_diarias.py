@@ -0,0 +1,62 @@
+"""Agregados diarios de ventas y marcas de agua
+
+Revision ID: 5e2b9d4a7c18
+Revises: 3c8e5a1f7b92
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e2b9d4a7c18'
+down_revision = '3c8e5a1f7b92'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ventas_diarias',
+        sa.Column('dia', sa.Date(), nullable=False),
+        sa.Column('id_producto', sa.Integer(), nullable=False),
+        sa.Column('id_categoria', sa.Integer(), nullable=True),
+        sa.Column('id_proveedor', sa.Integer(), nullable=True),
+        sa.Column('lineas', sa.Integer(), nullable=False),
+        sa.Column('unidades', sa.Integer(), nullable=False),
+        sa.Column('ingresos', sa.Numeric(precision=14, scale=2), nullable=False),
+        sa.Column('coste', sa.Numeric(precision=14, scale=2), nullable=False),
+        sa.ForeignKeyConstraint(['id_producto'], ['productos.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('dia', 'id_producto')
+    )
+    op.create_index('ix_ventas_diarias_categoria_dia', 'ventas_diarias', ['id_categoria', 'dia'], unique=False)
+    op.create_index('ix_ventas_diarias_proveedor_dia', 'ventas_diarias', ['id_proveedor', 'dia'], unique=False)
+
+    op.create_table('marcas_agua',
+        sa.Column('nombre', sa.String(length=50), nullable=False),
+        sa.Column('valor', sa.TIMESTAMP(timezone=True), nullable=True),
+        sa.Column('actualizado_en', sa.TIMESTAMP(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('nombre')
+    )
+    # La fila existe desde el principio: la actualización la bloquea con FOR UPDATE para no solaparse
+    op.execute("INSERT INTO marcas_agua (nombre) VALUES ('ventas_diarias')")
+
+    # La actualización incremental filtra los pedidos por fecha y los une con sus líneas.
+    # pedidos y detalle_pedidos reciben escrituras en cada compra: los índices se construyen con CONCURRENTLY,
+    # que no bloquea las escrituras mientras dura la construcción (fuera de la transacción de la migración)
+    with op.get_context().autocommit_block():
+        op.create_index('ix_pedidos_fecha', 'pedidos', ['fecha'], unique=False, postgresql_concurrently=True,
+                        if_not_exists=True)
+        op.create_index('ix_detalle_pedidos_pedido', 'detalle_pedidos', ['id_pedido'], unique=False,
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_detalle_pedidos_pedido', table_name='detalle_pedidos', postgresql_concurrently=True,
+                      if_exists=True)
+        op.drop_index('ix_pedidos_fecha', table_name='pedidos', postgresql_concurrently=True, if_exists=True)
+    op.drop_table('marcas_agua')
+    op.drop_index('ix_ventas_diarias_proveedor_dia', table_name='ventas_diarias')
+    op.drop_index('ix_ventas_diarias_categoria_dia', table_name='ventas_diarias')
+    op.drop_table('ventas_diarias')
@@ -0,0 +1,33 @@
+"""Índices para la paginación por clave del catálogo
+
+Revision ID: 7c1e4b2a9d10
+Revises: 2455230fdb5a
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '7c1e4b2a9d10'
+down_revision = '2455230fdb5a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # CREATE INDEX CONCURRENTLY no bloquea las escrituras en productos mientras se construye, pero no puede
+    # ejecutarse dentro de una transacción
+    with op.get_context().autocommit_block():
+        op.create_index('ix_productos_categoria_id', 'productos', ['id_categoria', 'id'], unique=False,
+                        postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_productos_proveedor_id', 'productos', ['id_proveedor', 'id'], unique=False,
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_productos_proveedor_id', table_name='productos', postgresql_concurrently=True,
+                      if_exists=True)
+        op.drop_index('ix_productos_categoria_id', table_name='productos', postgresql_concurrently=True,
+                      if_exists=True)
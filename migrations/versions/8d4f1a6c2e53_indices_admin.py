@@ -0,0 +1,40 @@
+"""Índices para ordenar y filtrar los listados del panel de administración
+
+Revision ID: 8d4f1a6c2e53
+Revises: 5e2b9d4a7c18
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '8d4f1a6c2e53'
+down_revision = '5e2b9d4a7c18'
+branch_labels = None
+depends_on = None
+
+# (nombre, tabla, columnas). Las tablas de pedidos pueden tener millones de filas: los índices se crean con
+# CREATE INDEX CONCURRENTLY (fuera de la transacción de la migración) para no bloquear las compras mientras tanto
+INDICES = [
+    ('ix_pedidos_estado_fecha', 'pedidos', ['estado_pedido', 'fecha']),
+    ('ix_pedidos_usuario_fecha', 'pedidos', ['id_usuario', 'fecha']),
+    ('ix_detalle_pedidos_producto', 'detalle_pedidos', ['id_producto']),
+    ('ix_usuarios_creado_en', 'usuarios', ['creado_en']),
+    ('ix_productos_nombre', 'productos', ['nombre']),
+    ('ix_imagenes_producto_producto', 'imagenes_producto', ['id_producto']),
+    ('ix_resenas_usuario', 'resenas', ['id_usuario']),
+]
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for nombre, tabla, columnas in INDICES:
+            op.create_index(nombre, tabla, columnas, unique=False, postgresql_concurrently=True,
+                            if_not_exists=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for nombre, tabla, _ in reversed(INDICES):
+            op.drop_index(nombre, table_name=tabla, postgresql_concurrently=True, if_exists=True)
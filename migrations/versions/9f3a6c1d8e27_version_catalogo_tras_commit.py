@@ -0,0 +1,44 @@
+"""La versión del catálogo se incrementa después del COMMIT, desde la aplicación
+
+Revision ID: 9f3a6c1d8e27
+Revises: 4b7d2e9a1c38
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '9f3a6c1d8e27'
+down_revision = '4b7d2e9a1c38'
+branch_labels = None
+depends_on = None
+
+TABLAS = ('productos', 'imagenes_producto', 'variantes_producto')
+
+
+def upgrade():
+    # Los triggers llamaban a nextval() dentro de la transacción de quien escribía, y la versión nueva era
+    # visible antes del COMMIT; ahora la incrementa la aplicación tras el COMMIT (ver app/cache_http.py).
+    # La secuencia se conserva
+    for tabla in TABLAS:
+        op.execute(f'DROP TRIGGER IF EXISTS trg_{tabla}_version_catalogo ON {tabla}')
+    op.execute('DROP FUNCTION IF EXISTS incrementar_version_catalogo()')
+
+
+def downgrade():
+    op.execute("""
+        CREATE OR REPLACE FUNCTION incrementar_version_catalogo() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            PERFORM nextval('version_catalogo_seq');
+            RETURN NULL;
+        END
+        $$
+    """)
+    for tabla in TABLAS:
+        op.execute(f"""
+            CREATE TRIGGER trg_{tabla}_version_catalogo
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {tabla}
+            FOR EACH STATEMENT EXECUTE FUNCTION incrementar_version_catalogo()
+        """)
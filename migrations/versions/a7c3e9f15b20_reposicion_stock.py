@@ -0,0 +1,62 @@
+"""Stock mínimo, índices parciales de stock bajo y sugerencias de reposición
+
+Revision ID: a7c3e9f15b20
+Revises: 8d4f1a6c2e53
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c3e9f15b20'
+down_revision = '8d4f1a6c2e53'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('productos', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('stock_minimo', sa.Integer(), server_default='5', nullable=False))
+    with op.batch_alter_table('variantes_producto', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('stock_minimo', sa.Integer(), server_default='2', nullable=False))
+
+    op.create_table('sugerencias_reposicion',
+        sa.Column('id_producto', sa.Integer(), nullable=False),
+        sa.Column('id_proveedor', sa.Integer(), nullable=True),
+        sa.Column('stock', sa.Integer(), nullable=False),
+        sa.Column('stock_minimo', sa.Integer(), nullable=False),
+        sa.Column('demanda_diaria', sa.Numeric(precision=12, scale=3), nullable=False),
+        sa.Column('cantidad_sugerida', sa.Integer(), nullable=False),
+        sa.Column('evaluado_en', sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['id_producto'], ['productos.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id_producto')
+    )
+    op.create_index('ix_sugerencias_reposicion_proveedor', 'sugerencias_reposicion', ['id_proveedor'], unique=False)
+    op.execute("INSERT INTO marcas_agua (nombre) VALUES ('reposicion')")
+
+    # Índices parciales: solo las filas con stock bajo (normalmente una fracción mínima del catálogo).
+    # productos y variantes_producto reciben escrituras en cada compra: se construyen con CONCURRENTLY
+    with op.get_context().autocommit_block():
+        op.create_index('ix_productos_stock_bajo', 'productos', ['id_proveedor', 'id'], unique=False,
+                        postgresql_where=sa.text('stock <= stock_minimo'), postgresql_concurrently=True,
+                        if_not_exists=True)
+        op.create_index('ix_variantes_stock_bajo', 'variantes_producto', ['id_producto'], unique=False,
+                        postgresql_where=sa.text('stock_variante <= stock_minimo'), postgresql_concurrently=True,
+                        if_not_exists=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_variantes_stock_bajo', table_name='variantes_producto', postgresql_concurrently=True,
+                      if_exists=True)
+        op.drop_index('ix_productos_stock_bajo', table_name='productos', postgresql_concurrently=True,
+                      if_exists=True)
+    op.execute("DELETE FROM marcas_agua WHERE nombre = 'reposicion'")
+    op.drop_index('ix_sugerencias_reposicion_proveedor', table_name='sugerencias_reposicion')
+    op.drop_table('sugerencias_reposicion')
+    with op.batch_alter_table('variantes_producto', schema=None) as batch_op:
+        batch_op.drop_column('stock_minimo')
+    with op.batch_alter_table('productos', schema=None) as batch_op:
+        batch_op.drop_column('stock_minimo')
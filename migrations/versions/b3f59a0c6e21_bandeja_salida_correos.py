@@ -0,0 +1,44 @@
+"""Bandeja de salida persistente de correos
+
+Revision ID: b3f59a0c6e21
+Revises: 7c1e4b2a9d10
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3f59a0c6e21'
+down_revision = '7c1e4b2a9d10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('correos_salientes',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('asunto', sa.String(length=255), nullable=False),
+    sa.Column('remitente', sa.String(length=100), nullable=True),
+    sa.Column('destinatarios', postgresql.ARRAY(sa.String(length=100)), nullable=False),
+    sa.Column('cuerpo', sa.Text(), nullable=True),
+    sa.Column('html', sa.Text(), nullable=True),
+    sa.Column('estado', sa.String(length=20), server_default='pendiente', nullable=False),
+    sa.Column('intentos', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('ultimo_error', sa.Text(), nullable=True),
+    sa.Column('proximo_intento', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('creado_en', sa.TIMESTAMP(timezone=True), nullable=True),
+    sa.Column('enviado_en', sa.TIMESTAMP(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('correos_salientes', schema=None) as batch_op:
+        batch_op.create_index('ix_correos_salientes_pendientes', ['estado', 'proximo_intento'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('correos_salientes', schema=None) as batch_op:
+        batch_op.drop_index('ix_correos_salientes_pendientes')
+
+    op.drop_table('correos_salientes')
@@ -0,0 +1,29 @@
+"""Índice para paginar las reseñas de un producto por fecha
+
+Revision ID: c1f8b6d3a924
+Revises: a7c3e9f15b20
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c1f8b6d3a924'
+down_revision = 'a7c3e9f15b20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # La página de detalle recorre este índice hacia atrás (fecha_resena DESC, id DESC) y continúa desde el
+    # cursor (fecha_resena, id) de la página anterior con una comparación de filas que el índice resuelve
+    with op.get_context().autocommit_block():
+        op.create_index('ix_resenas_producto_fecha', 'resenas', ['id_producto', 'fecha_resena', 'id'],
+                        unique=False, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_resenas_producto_fecha', table_name='resenas', postgresql_concurrently=True,
+                      if_exists=True)
@@ -0,0 +1,49 @@
+"""Búsqueda de texto completo y por similitud en productos
+
+Revision ID: d82c7f3e1b45
+Revises: b3f59a0c6e21
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'd82c7f3e1b45'
+down_revision = 'b3f59a0c6e21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS unaccent')
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+    # unaccent() no es IMMUTABLE, así que no puede usarse en columnas generadas ni índices;
+    # este envoltorio fija el diccionario y sí puede declararse inmutable
+    op.execute("""
+        CREATE OR REPLACE FUNCTION inmutable_unaccent(text) RETURNS text
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+        AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$
+    """)
+
+    # Columna generada: PostgreSQL la calcula (y rellena para las filas existentes al añadirla)
+    op.execute("""
+        ALTER TABLE productos ADD COLUMN busqueda tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('spanish', inmutable_unaccent(coalesce(nombre, ''))), 'A') ||
+            setweight(to_tsvector('spanish', inmutable_unaccent(coalesce(descripcion, ''))), 'B')
+        ) STORED
+    """)
+    # Los índices GIN se construyen con CONCURRENTLY para no bloquear las escrituras en productos mientras tanto
+    with op.get_context().autocommit_block():
+        op.execute('CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_productos_busqueda ON productos USING gin (busqueda)')
+        op.execute('CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_productos_nombre_trgm '
+                   'ON productos USING gin (inmutable_unaccent(lower(nombre)) gin_trgm_ops)')
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_productos_nombre_trgm')
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_productos_busqueda')
+    op.execute('ALTER TABLE productos DROP COLUMN IF EXISTS busqueda')
+    op.execute('DROP FUNCTION IF EXISTS inmutable_unaccent(text)')
@@ -0,0 +1,28 @@
+"""Añadir SKU a productos para la importación masiva
+
+Revision ID: e4a91c5d7f02
+Revises: d82c7f3e1b45
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a91c5d7f02'
+down_revision = 'd82c7f3e1b45'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('productos', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('sku', sa.String(length=64), nullable=True))
+        batch_op.create_unique_constraint('productos_sku_key', ['sku'])
+
+
+def downgrade():
+    with op.batch_alter_table('productos', schema=None) as batch_op:
+        batch_op.drop_constraint('productos_sku_key', type_='unique')
+        batch_op.drop_column('sku')
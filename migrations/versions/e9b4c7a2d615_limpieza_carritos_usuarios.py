@@ -0,0 +1,43 @@
+"""Fecha de actualización de los carritos e índices para la limpieza periódica
+
+Revision ID: e9b4c7a2d615
+Revises: c1f8b6d3a924
+Create Date: 2026-10-18 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e9b4c7a2d615'
+down_revision = 'c1f8b6d3a924'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # La columna se añade sin valor por defecto (no reescribe la tabla) y se rellena con la fecha de creación;
+    # el valor por defecto now() solo se aplica a los carritos nuevos
+    with op.batch_alter_table('carrito_compras', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('actualizado_en', sa.TIMESTAMP(timezone=True), nullable=True))
+    op.execute('UPDATE carrito_compras SET actualizado_en = coalesce(creado_en, now())')
+    with op.batch_alter_table('carrito_compras', schema=None) as batch_op:
+        batch_op.alter_column('actualizado_en', server_default=sa.text('now()'))
+
+    with op.get_context().autocommit_block():
+        op.create_index('ix_carrito_compras_actualizado_en', 'carrito_compras', ['actualizado_en'],
+                        unique=False, postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_usuarios_sin_confirmar', 'usuarios', ['creado_en'], unique=False,
+                        postgresql_where=sa.text('NOT email_confirmado'), postgresql_concurrently=True,
+                        if_not_exists=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_usuarios_sin_confirmar', table_name='usuarios', postgresql_concurrently=True,
+                      if_exists=True)
+        op.drop_index('ix_carrito_compras_actualizado_en', table_name='carrito_compras',
+                      postgresql_concurrently=True, if_exists=True)
+    with op.batch_alter_table('carrito_compras', schema=None) as batch_op:
+        batch_op.drop_column('actualizado_en')
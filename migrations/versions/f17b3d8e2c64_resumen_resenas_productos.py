@@ -0,0 +1,77 @@
+"""Resumen de reseñas desnormalizado en productos
+
+Revision ID: f17b3d8e2c64
+Revises: e4a91c5d7f02
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f17b3d8e2c64'
+down_revision = 'e4a91c5d7f02'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('productos', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('num_resenas', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('suma_calificaciones', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('calificacion_promedio', sa.Numeric(precision=3, scale=2), server_default='0', nullable=False))
+        batch_op.create_index('ix_productos_calificacion_id', ['calificacion_promedio', 'id'], unique=False)
+
+    # Mantiene el resumen de forma incremental: cada fila insertada, modificada o borrada en resenas
+    # ajusta el contador y la suma del producto afectado (y del anterior, si la reseña cambia de producto)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION actualizar_resumen_resenas() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                UPDATE productos SET
+                    num_resenas = num_resenas - 1,
+                    suma_calificaciones = suma_calificaciones - OLD.calificacion,
+                    calificacion_promedio = CASE WHEN num_resenas > 1
+                        THEN round((suma_calificaciones - OLD.calificacion)::numeric / (num_resenas - 1), 2)
+                        ELSE 0 END
+                WHERE id = OLD.id_producto;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                UPDATE productos SET
+                    num_resenas = num_resenas + 1,
+                    suma_calificaciones = suma_calificaciones + NEW.calificacion,
+                    calificacion_promedio = round((suma_calificaciones + NEW.calificacion)::numeric / (num_resenas + 1), 2)
+                WHERE id = NEW.id_producto;
+            END IF;
+            RETURN NULL;
+        END
+        $$
+    """)
+    op.execute("""
+        CREATE TRIGGER trg_resenas_resumen
+        AFTER INSERT OR DELETE OR UPDATE OF calificacion, id_producto ON resenas
+        FOR EACH ROW EXECUTE FUNCTION actualizar_resumen_resenas()
+    """)
+
+    # Relleno inicial a partir de las reseñas existentes
+    op.execute("""
+        UPDATE productos p SET
+            num_resenas = r.num_resenas,
+            suma_calificaciones = r.suma_calificaciones,
+            calificacion_promedio = round(r.suma_calificaciones::numeric / r.num_resenas, 2)
+        FROM (SELECT id_producto, count(*) AS num_resenas, sum(calificacion) AS suma_calificaciones
+              FROM resenas GROUP BY id_producto) r
+        WHERE p.id = r.id_producto
+    """)
+
+
+def downgrade():
+    op.execute('DROP TRIGGER IF EXISTS trg_resenas_resumen ON resenas')
+    op.execute('DROP FUNCTION IF EXISTS actualizar_resumen_resenas()')
+    with op.batch_alter_table('productos', schema=None) as batch_op:
+        batch_op.drop_index('ix_productos_calificacion_id')
+        batch_op.drop_column('calificacion_promedio')
+        batch_op.drop_column('suma_calificaciones')
+        batch_op.drop_column('num_resenas')
@@ -0,0 +1,8 @@
+/** Configuración de Tailwind para 'flask estaticos construir': solo se incluyen las clases usadas en las plantillas. */
+module.exports = {
+    content: ['./app/templates/**/*.html', './app/templates/email_fallido'],
+    theme: {
+        extend: {},
+    },
+    plugins: [],
+};
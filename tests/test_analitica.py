@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from app import db
+from app.analitica import actualizar_ventas, resumen_ventas, resumen_en_bruto, DIMENSIONES, MARCA
+from app.models import Categoria, Proveedor, Pedido, DetallePedido, VentaDiaria, MarcaAgua
+from tests.utilidades import crear_usuario, crear_producto, hace
+
+# Agregados de ventas: los informes sobre ventas_diarias deben coincidir con el mismo informe calculado sobre
+# pedidos y líneas de pedido, también después de una actualización incremental
+
+
+def _pedido(id_usuario, lineas, dias, estado='pendiente'):
+    # lineas: [(producto, cantidad)]
+    pedido = Pedido(id_usuario=id_usuario, fecha=hace(dias), estado_pedido=estado,
+                    total=sum((producto.precio_venta * cantidad for producto, cantidad in lineas), Decimal(0)))
+    db.session.add(pedido)
+    db.session.flush()
+    db.session.add_all([DetallePedido(id_pedido=pedido.id, id_producto=producto.id, cantidad=cantidad,
+                                      precio_unitario=producto.precio_venta) for producto, cantidad in lineas])
+    db.session.commit()
+
+
+def _periodo():
+    hoy = datetime.now(timezone.utc).date()
+    return hoy - timedelta(days=30), hoy + timedelta(days=1)
+
+
+def _comprobar_informes():
+    desde, hasta = _periodo()
+    for dimension in DIMENSIONES:
+        agregado = [tuple(fila) for fila in resumen_ventas(dimension, desde, hasta)]
+        en_bruto = [tuple(fila) for fila in resumen_en_bruto(dimension, desde, hasta)]
+        assert agregado == en_bruto, dimension
+
+
+def test_agregados_coinciden_con_los_pedidos(app):
+    papeleria, escritura = Categoria(nombre='Papelería'), Categoria(nombre='Escritura')
+    proveedor = Proveedor(nombre='Papeles SL')
+    db.session.add_all([papeleria, escritura, proveedor, MarcaAgua(nombre=MARCA)])
+    db.session.commit()
+    cuaderno = crear_producto(id_categoria=papeleria.id, id_proveedor=proveedor.id)
+    boligrafo = crear_producto(nombre='Bolígrafo', precio_venta=Decimal('0.90'), id_categoria=escritura.id)
+    id_usuario = crear_usuario().id
+    _pedido(id_usuario, [(cuaderno, 2), (boligrafo, 10)], dias=5)
+    _pedido(id_usuario, [(cuaderno, 1)], dias=5)
+    _pedido(id_usuario, [(boligrafo, 3)], dias=2)
+    _pedido(id_usuario, [(cuaderno, 50)], dias=2, estado='cancelado')
+
+    assert actualizar_ventas(reconstruir=True)['filas'] == 3
+    _comprobar_informes()
+    unidades = dict(db.session.execute(db.select(VentaDiaria.id_producto, db.func.sum(VentaDiaria.unidades))
+                                       .group_by(VentaDiaria.id_producto)).all())
+    # El pedido cancelado no cuenta
+    assert unidades == {cuaderno.id: 3, boligrafo.id: 13}
+
+    # Actualización incremental: recalcula los días recientes e incorpora el pedido nuevo una sola vez
+    _pedido(id_usuario, [(cuaderno, 4), (boligrafo, 1)], dias=0)
+    actualizar_ventas()
+    actualizar_ventas()
+    _comprobar_informes()
+    total = db.session.scalar(db.select(db.func.sum(VentaDiaria.unidades)))
+    assert total == 3 + 13 + 5
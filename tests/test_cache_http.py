@@ -0,0 +1,58 @@
+from decimal import Decimal
+from app import db
+from app.models import Producto
+from tests.utilidades import crear_producto
+
+# ETag del catálogo: 304 mientras el catálogo no cambie y un ETag nuevo solo cuando se confirma un cambio
+
+
+def _pedir(cliente, etag=None):
+    respuesta = cliente.get('/api/productos', headers={'If-None-Match': etag} if etag else {})
+    return respuesta.status_code, respuesta.headers.get('ETag')
+
+
+def test_304_hasta_que_se_confirma_un_cambio(app):
+    producto = crear_producto()
+    cliente = app.test_client()
+    estado, etag = _pedir(cliente)
+    assert estado == 200 and etag
+
+    assert _pedir(cliente, etag) == (304, etag)
+
+    producto.precio_venta = Decimal('4.25')
+    db.session.commit()
+    estado, etag_nuevo = _pedir(cliente, etag)
+    assert estado == 200
+    assert etag_nuevo != etag
+
+
+def test_cambio_sin_confirmar_no_cambia_el_etag(app):
+    # Mientras la transacción que escribe sigue abierta, las demás peticiones ven las filas anteriores:
+    # si el ETag cambiara ya, la página anterior quedaría guardada con el ETag nuevo
+    producto = crear_producto()
+    cliente = app.test_client()
+    _, etag = _pedir(cliente)
+
+    producto.precio_venta = Decimal('4.25')
+    db.session.flush()
+    assert _pedir(cliente, etag) == (304, etag)
+
+    db.session.rollback()
+    assert _pedir(cliente, etag) == (304, etag)
+
+    producto.precio_venta = Decimal('4.25')
+    db.session.commit()
+    estado, etag_nuevo = _pedir(cliente, etag)
+    assert estado == 200 and etag_nuevo != etag
+
+
+def test_escritura_masiva_confirmada_cambia_el_etag(app):
+    # Las sentencias db.update() de la sesión no pasan por los eventos del mapper
+    id_producto = crear_producto().id
+    cliente = app.test_client()
+    _, etag = _pedir(cliente)
+
+    db.session.execute(db.update(Producto).where(Producto.id == id_producto).values(stock=Producto.stock - 1))
+    assert _pedir(cliente, etag) == (304, etag)
+    db.session.commit()
+    assert _pedir(cliente, etag)[0] == 200
@@ -0,0 +1,24 @@
+import pytest
+from app import db
+from tests.utilidades import crear_usuario, crear_producto, llenar_carrito, cliente_de
+
+# La página del carrito carga las líneas con sus productos en una consulta (JOIN) y calcula el total en SQL:
+# el número de sentencias no debe depender del número de líneas
+
+
+@pytest.mark.parametrize('lineas', [1, 10, 50])
+def test_pagina_carrito_con_consultas_constantes(app, contador_sql, lineas):
+    id_usuario = crear_usuario().id
+    productos = [crear_producto(nombre=f'Producto {i}') for i in range(lineas)]
+    llenar_carrito(id_usuario, {producto.id: 1 + i % 3 for i, producto in enumerate(productos)})
+    db.session.remove()
+    cliente = cliente_de(app, id_usuario)
+    # La primera petición carga el usuario de la sesión y lo deja en la caché de identidad
+    assert cliente.get('/carrito').status_code == 200
+
+    antes = contador_sql.sentencias
+    respuesta = cliente.get('/carrito')
+    assert respuesta.status_code == 200
+    assert 'Producto 0' in respuesta.get_data(as_text=True)
+    # Una consulta para las líneas con sus productos y otra para el total
+    assert contador_sql.sentencias - antes == 2
@@ -0,0 +1,50 @@
+from concurrent.futures import ThreadPoolExecutor
+from app import db
+from app.models import CarritoCompras, DetalleCarrito
+from tests.utilidades import crear_usuario, crear_producto, cliente_de
+
+# Añadir al carrito es un único upsert (carrito y línea): los clics simultáneos del mismo usuario no pueden
+# chocar con las restricciones únicas (id_usuario) ni (id_carrito, id_producto) ni perder cantidades
+
+HILOS = 16
+PETICIONES = 200
+
+
+def test_anadir_al_carrito_en_paralelo(app):
+    id_usuario = crear_usuario().id
+    id_producto = crear_producto().id
+    db.session.remove()
+
+    def anadir(posicion):
+        cliente = cliente_de(app, id_usuario)
+        respuesta = cliente.post(f'/anadir_al_carrito/{id_producto}', data={'cantidad': 1 + posicion % 2})
+        return respuesta.status_code
+
+    with ThreadPoolExecutor(max_workers=HILOS) as pool:
+        estados = list(pool.map(anadir, range(PETICIONES)))
+
+    # Todas redirigen al carrito: ninguna terminó en un 500 por una violación de la restricción única
+    assert estados == [302] * PETICIONES
+    assert db.session.scalar(db.select(db.func.count()).select_from(CarritoCompras)) == 1
+    lineas = db.session.execute(db.select(DetalleCarrito.id_producto, DetalleCarrito.cantidad)).all()
+    assert lineas == [(id_producto, sum(1 + posicion % 2 for posicion in range(PETICIONES)))]
+
+
+def test_actualizar_y_eliminar_en_paralelo(app):
+    id_usuario = crear_usuario().id
+    id_producto = crear_producto().id
+    db.session.remove()
+    cliente_de(app, id_usuario).post(f'/anadir_al_carrito/{id_producto}', data={'cantidad': 1})
+
+    def modificar(posicion):
+        cliente = cliente_de(app, id_usuario)
+        if posicion % 2:
+            return cliente.post(f'/actualizar_cantidad_carrito/{id_producto}', data={'cantidad': 5}).status_code
+        return cliente.post(f'/anadir_al_carrito/{id_producto}', data={'cantidad': 1}).status_code
+
+    with ThreadPoolExecutor(max_workers=HILOS) as pool:
+        estados = list(pool.map(modificar, range(PETICIONES)))
+    assert estados == [302] * PETICIONES
+
+    assert cliente_de(app, id_usuario).get(f'/eliminar_del_carrito/{id_producto}').status_code == 302
+    assert db.session.scalar(db.select(db.func.count()).select_from(DetalleCarrito)) == 0
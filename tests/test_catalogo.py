@@ -0,0 +1,38 @@
+from app import db
+from app.catalogo import pagina_resenas
+from app.models import Resena
+from tests.utilidades import crear_usuario, crear_producto, hace
+
+# Paginación por clave de las reseñas del detalle de producto: recorrer las páginas con el cursor devuelve
+# todas las reseñas una sola vez, de la más reciente a la más antigua, aunque varias compartan fecha
+
+
+def test_paginas_de_resenas_sin_huecos_ni_repeticiones(app):
+    id_producto = crear_producto().id
+    instantes = {dias: hace(dias) for dias in (1, 2, 5, 9)}
+    fechas = [instantes[dias] for dias in (1, 2, 2, 2, 5, 9, 9)]
+    for i, fecha in enumerate(fechas):
+        db.session.add(Resena(id_producto=id_producto, id_usuario=crear_usuario(email=f'autor{i}@ejemplo.test').id,
+                              calificacion=1 + i % 5, fecha_resena=fecha))
+    db.session.commit()
+
+    vistas, cursor, paginas = [], None, 0
+    while True:
+        filas, cursor = pagina_resenas(id_producto, cursor, por_pagina=3)
+        vistas += [(resena.fecha_resena, resena.id) for resena, _ in filas]
+        paginas += 1
+        if cursor is None:
+            break
+
+    assert paginas == 3
+    assert len(vistas) == len(set(vistas)) == len(fechas)
+    assert vistas == sorted(vistas, reverse=True)
+
+
+def test_cursor_invalido_empieza_por_el_principio(app):
+    id_producto = crear_producto().id
+    db.session.add(Resena(id_producto=id_producto, id_usuario=crear_usuario().id, calificacion=4))
+    db.session.commit()
+
+    filas, siguiente = pagina_resenas(id_producto, 'no-es-un-cursor', por_pagina=3)
+    assert len(filas) == 1 and siguiente is None
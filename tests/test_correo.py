@@ -0,0 +1,113 @@
+import smtplib
+from datetime import datetime, timedelta, timezone
+import pytest
+from app import db, mail
+from app.correo import encolar_correo, despachar_lote
+from app.models import CorreoSaliente
+
+# Despachador de la bandeja de salida contra un servidor SMTP falso (mail.connect sustituido): envía los
+# pendientes por una sola conexión, reprograma los fallos con espera exponencial y marca como fallidos los
+# que agotan CORREO_MAX_INTENTOS
+
+
+class ServidorFalso:
+    def __init__(self, rechazados=(), caido=False):
+        self.rechazados = set(rechazados)
+        self.caido = caido
+        self.conexiones = 0
+        self.enviados = []
+
+    def connect(self):
+        if self.caido:
+            raise ConnectionRefusedError('servidor SMTP no disponible')
+        self.conexiones += 1
+        return ConexionFalsa(self)
+
+
+class ConexionFalsa:
+    def __init__(self, servidor):
+        self.servidor = servidor
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcion):
+        return False
+
+    def send(self, mensaje):
+        rechazados = self.servidor.rechazados.intersection(mensaje.recipients)
+        if rechazados:
+            raise smtplib.SMTPRecipientsRefused({destino: (550, b'buzon inexistente') for destino in rechazados})
+        self.servidor.enviados.append(mensaje)
+
+
+@pytest.fixture
+def servidor(app, monkeypatch):
+    servidor = ServidorFalso()
+    monkeypatch.setattr(mail, 'connect', servidor.connect)
+    return servidor
+
+
+def _encolar(*destinatarios):
+    correos = [encolar_correo(asunto=f'Hola {destino}', destinatarios=[destino], cuerpo='Texto')
+               for destino in destinatarios]
+    db.session.commit()
+    return [correo.id for correo in correos]
+
+
+def _correo(id_correo):
+    return db.session.get(CorreoSaliente, id_correo, populate_existing=True)
+
+
+def test_envia_los_pendientes_por_una_conexion(app, servidor):
+    ids = _encolar('a@ejemplo.test', 'b@ejemplo.test', 'c@ejemplo.test')
+
+    assert despachar_lote() == 3
+    assert servidor.conexiones == 1
+    assert [mensaje.recipients for mensaje in servidor.enviados] == [['a@ejemplo.test'], ['b@ejemplo.test'],
+                                                                      ['c@ejemplo.test']]
+    assert {_correo(i).estado for i in ids} == {'enviado'}
+    # Nada pendiente: no se abre otra conexión
+    assert despachar_lote() == 0
+    assert servidor.conexiones == 1
+
+
+def test_un_fallo_se_reprograma_con_espera(app, servidor):
+    servidor.rechazados.add('b@ejemplo.test')
+    ids = _encolar('a@ejemplo.test', 'b@ejemplo.test', 'c@ejemplo.test')
+
+    antes = datetime.now(timezone.utc)
+    assert despachar_lote() == 2
+    fallido = _correo(ids[1])
+    assert (fallido.estado, fallido.intentos) == ('pendiente', 1)
+    assert 'buzon inexistente' in fallido.ultimo_error
+    espera = timedelta(seconds=app.config['CORREO_REINTENTO_SEGUNDOS'])
+    assert antes + espera <= fallido.proximo_intento <= datetime.now(timezone.utc) + espera
+    # Hasta que pase la espera no se vuelve a intentar
+    assert despachar_lote() == 0
+    assert servidor.conexiones == 1
+
+
+def test_se_marca_fallido_al_agotar_los_intentos(app, servidor, monkeypatch):
+    monkeypatch.setitem(app.config, 'CORREO_MAX_INTENTOS', 3)
+    servidor.caido = True
+    id_correo = _encolar('a@ejemplo.test')[0]
+
+    esperas = []
+    for intento in range(1, 4):
+        assert despachar_lote() == 0
+        correo = _correo(id_correo)
+        assert correo.intentos == intento
+        if intento < 3:
+            esperas.append(correo.proximo_intento - datetime.now(timezone.utc))
+            # Se adelanta el reintento en lugar de esperar
+            correo.proximo_intento = datetime.now(timezone.utc) - timedelta(seconds=1)
+            db.session.commit()
+
+    assert _correo(id_correo).estado == 'fallido'
+    # La espera se duplica en cada intento
+    assert esperas[1] > esperas[0] * 1.5
+    # Un correo fallido ya no se intenta aunque el servidor vuelva
+    servidor.caido = False
+    assert despachar_lote() == 0
+    assert servidor.conexiones == 0
@@ -0,0 +1,73 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+import pytest
+from app import db
+from app.descuentos import buscar_codigo, canjear, DescuentoInvalido
+from app.models import Descuento
+
+# Prueba de carga del canje de códigos: cientos de canjes a la vez de un código con límite de usos.
+# El UPDATE condicional de canjear() es el que decide: la copia en caché de usos_actuales puede ir por detrás
+# de la base de datos, pero nunca por delante, así que solo rechaza de antemano cuando el código ya está agotado.
+
+CANJES = 300
+HILOS = 32
+
+
+def _crear_descuento(usos_maximos):
+    descuento = Descuento(codigo='PRUEBA10', tipo_descuento='porcentaje', valor=Decimal('10'),
+                          usos_maximos=usos_maximos, usos_actuales=0)
+    db.session.add(descuento)
+    db.session.commit()
+    return descuento.id
+
+
+def _canjear_en_paralelo(app, codigo, canjes):
+    # Cada canje busca el código, lo canjea y confirma su propia transacción, como en el checkout
+    salida = threading.Barrier(HILOS)
+
+    def canjear_uno(indice):
+        with app.app_context():
+            if indice < HILOS:
+                salida.wait()
+            try:
+                canjear(buscar_codigo(codigo))
+                db.session.commit()
+                return 'ok'
+            except DescuentoInvalido:
+                db.session.rollback()
+                return 'agotado'
+            except Exception as error:
+                return error
+            finally:
+                db.session.remove()
+
+    with ThreadPoolExecutor(max_workers=HILOS) as pool:
+        return list(pool.map(canjear_uno, range(canjes)))
+
+
+def test_canjes_simultaneos_respetan_el_limite(app):
+    limite = 25
+    id_descuento = _crear_descuento(limite)
+    db.session.remove()
+
+    resultados = _canjear_en_paralelo(app, 'PRUEBA10', CANJES)
+
+    assert [r for r in resultados if r not in ('ok', 'agotado')] == []
+    assert resultados.count('ok') == limite
+    usos = db.session.scalar(db.select(Descuento.usos_actuales).where(Descuento.id == id_descuento))
+    assert usos == limite
+
+
+def test_la_cache_se_invalida_al_confirmar(app):
+    id_descuento = _crear_descuento(5)
+    assert buscar_codigo('prueba10').usos_maximos == 5
+
+    descuento = db.session.get(Descuento, id_descuento)
+    descuento.usos_maximos = 0
+    db.session.flush()
+    # Antes del COMMIT la caché no se toca: una recarga ahora leería la fila anterior
+    assert buscar_codigo('PRUEBA10').usos_maximos == 5
+    db.session.commit()
+    with pytest.raises(DescuentoInvalido):
+        buscar_codigo('PRUEBA10')
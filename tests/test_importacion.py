@@ -0,0 +1,56 @@
+import io
+from decimal import Decimal
+from app import db
+from app.importacion import importar_catalogo
+from app.models import Producto, VarianteProducto, Categoria, Proveedor
+from tests.utilidades import crear_producto
+
+# Importación masiva: upsert por SKU, errores por fila y categorías/proveedores creados solo para filas válidas
+
+CSV = """sku,nombre,precio_compra,precio_venta,stock,categoria,proveedor,nombre_variante,valor_variante
+CUA-1,Cuaderno A5,1.00,2.95,40,Papelería,Papeles SL,Color,Azul
+CUA-1,Cuaderno A5,1.00,2.95,40,Papelería,Papeles SL,Color,Rojo
+BOL-1,Bolígrafo,0.20,0.90,300,Escritura,Tintas SA,,
+MAL-1,Precio roto,1.00,no-es-precio,5,Categoría huérfana,Proveedor huérfano,,
+MAL-2,Stock negativo,1.00,2.00,-3,Otra huérfana,,,
+,Sin sku,1.00,2.00,1,,,,
+"""
+
+
+def _importar(texto):
+    errores = []
+    resumen = importar_catalogo(io.StringIO(texto), 'csv', tamano_lote=2,
+                                al_error=lambda numero, mensaje: errores.append((numero, mensaje)))
+    return resumen, errores
+
+
+def test_importacion_con_upsert_por_sku_y_errores_por_fila(app):
+    id_existente = crear_producto(nombre='Bolígrafo viejo', sku='BOL-1', precio_venta=Decimal('0.50')).id
+    db.session.remove()
+
+    resumen, errores = _importar(CSV)
+
+    assert resumen == {'filas': 3, 'errores': 3}
+    assert [numero for numero, _ in errores] == [5, 6, 7]
+    productos = {p.sku: p for p in db.session.scalars(db.select(Producto))}
+    assert set(productos) == {'CUA-1', 'BOL-1'}
+    # El SKU existente se actualiza en su sitio
+    assert productos['BOL-1'].id == id_existente
+    assert productos['BOL-1'].nombre == 'Bolígrafo'
+    assert productos['BOL-1'].precio_venta == Decimal('0.90')
+    variantes = db.session.scalars(db.select(VarianteProducto.valor_variante)
+                                   .where(VarianteProducto.id_producto == productos['CUA-1'].id)).all()
+    assert sorted(variantes) == ['Azul', 'Rojo']
+    # Las filas rechazadas no crean categorías ni proveedores
+    assert sorted(db.session.scalars(db.select(Categoria.nombre))) == ['Escritura', 'Papelería']
+    assert sorted(db.session.scalars(db.select(Proveedor.nombre))) == ['Papeles SL', 'Tintas SA']
+
+
+def test_importacion_repetida_no_duplica(app):
+    _importar(CSV)
+    resumen, _ = _importar(CSV)
+
+    assert resumen['filas'] == 3
+    assert db.session.scalar(db.select(db.func.count()).select_from(Producto)) == 2
+    assert db.session.scalar(db.select(db.func.count()).select_from(VarianteProducto)) == 2
+    assert db.session.scalar(db.select(db.func.count()).select_from(Categoria)) == 2
@@ -0,0 +1,71 @@
+from decimal import Decimal
+from app import db
+from app.limpieza import limpiar
+from app.models import Usuario, CarritoCompras, DetalleCarrito, Pedido
+from tests.utilidades import crear_usuario, crear_producto, llenar_carrito, hace
+
+# Limpieza periódica: solo se borran los carritos abandonados y las cuentas sin confirmar antiguas sin pedidos
+# ni reseñas; todo lo demás se conserva
+
+
+def _carrito(id_usuario, id_producto, dias_sin_uso):
+    carrito = llenar_carrito(id_usuario, {id_producto: 1})
+    carrito.actualizado_en = hace(dias_sin_uso)
+    db.session.commit()
+    return carrito.id
+
+
+def _preparar():
+    id_producto = crear_producto().id
+    ids = {
+        'activo': crear_usuario(email='activo@ejemplo.test', creado_en=hace(400)).id,
+        'abandonado': crear_usuario(email='abandonado@ejemplo.test', creado_en=hace(400)).id,
+        'sin_confirmar': crear_usuario(email='sin-confirmar@ejemplo.test', email_confirmado=False,
+                                       creado_en=hace(30)).id,
+        'sin_confirmar_con_pedido': crear_usuario(email='con-pedido@ejemplo.test', email_confirmado=False,
+                                                  creado_en=hace(30)).id,
+        'recien_registrado': crear_usuario(email='nuevo@ejemplo.test', email_confirmado=False,
+                                           creado_en=hace(1)).id,
+    }
+    carritos = {
+        'activo': _carrito(ids['activo'], id_producto, 3),
+        'abandonado': _carrito(ids['abandonado'], id_producto, 90),
+        # Carrito reciente de una cuenta sin confirmar: se borra con la cuenta
+        'sin_confirmar': _carrito(ids['sin_confirmar'], id_producto, 2),
+    }
+    db.session.add(Pedido(id_usuario=ids['sin_confirmar_con_pedido'], total=Decimal('3.50')))
+    db.session.commit()
+    return ids, carritos
+
+
+def test_limpieza_borra_solo_lo_caducado(app):
+    ids, carritos = _preparar()
+
+    resumen = limpiar(pausa=0)
+
+    assert (resumen['carritos'], resumen['lineas'], resumen['usuarios']) == (2, 2, 1)
+    assert set(db.session.scalars(db.select(CarritoCompras.id))) == {carritos['activo']}
+    assert db.session.scalar(db.select(db.func.count()).select_from(DetalleCarrito)) == 1
+    restantes = set(db.session.scalars(db.select(Usuario.id)))
+    assert restantes == set(ids.values()) - {ids['sin_confirmar']}
+
+
+def test_limpieza_por_lotes(app):
+    # Con lotes de una fila, cada tipo necesita varios lotes y el resultado es el mismo
+    _preparar()
+
+    resumen = limpiar(lote=1, pausa=0)
+
+    assert (resumen['carritos'], resumen['lineas'], resumen['usuarios']) == (2, 2, 1)
+    assert resumen['lotes'] >= 3
+
+
+def test_simulacion_no_borra_nada(app):
+    _preparar()
+
+    resumen = limpiar(simular=True)
+
+    assert resumen['simulacion'] and resumen['lotes'] == 0
+    assert (resumen['carritos'], resumen['usuarios']) == (1, 1)
+    assert db.session.scalar(db.select(db.func.count()).select_from(CarritoCompras)) == 3
+    assert db.session.scalar(db.select(db.func.count()).select_from(Usuario)) == 5
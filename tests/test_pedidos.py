@@ -0,0 +1,78 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from app import db
+from app.models import Producto, Pedido, DetallePedido
+from app.pedidos import procesar_pedido, StockInsuficiente
+from tests.utilidades import crear_usuario, crear_producto, llenar_carrito
+
+# Prueba de carga de la compra: muchos compradores a la vez sobre productos con poco stock.
+# Las líneas y los productos se bloquean con FOR UPDATE en orden de id, así que no puede haber sobreventa
+# (cada compra ve el stock que dejó la anterior) ni interbloqueos entre compras de varios productos.
+
+COMPRADORES = 40
+
+
+def _comprar_en_paralelo(app, ids_usuarios):
+    # Todos los hilos empiezan a la vez; devuelve 'ok', 'sin_stock' o la excepción inesperada de cada compra
+    salida = threading.Barrier(len(ids_usuarios))
+
+    def comprar(id_usuario):
+        with app.app_context():
+            salida.wait()
+            try:
+                procesar_pedido(id_usuario)
+                return 'ok'
+            except StockInsuficiente:
+                return 'sin_stock'
+            except Exception as error:
+                return error
+            finally:
+                db.session.remove()
+
+    with ThreadPoolExecutor(max_workers=len(ids_usuarios)) as pool:
+        return list(pool.map(comprar, ids_usuarios))
+
+
+def test_compras_simultaneas_sin_sobreventa(app):
+    stock = 7
+    id_producto = crear_producto(stock=stock).id
+    ids_usuarios = []
+    for i in range(COMPRADORES):
+        id_usuario = crear_usuario(email=f'comprador{i}@ejemplo.test').id
+        llenar_carrito(id_usuario, {id_producto: 1})
+        ids_usuarios.append(id_usuario)
+    db.session.remove()
+
+    resultados = _comprar_en_paralelo(app, ids_usuarios)
+
+    assert [r for r in resultados if r not in ('ok', 'sin_stock')] == []
+    assert resultados.count('ok') == stock
+    assert resultados.count('sin_stock') == COMPRADORES - stock
+    stock_final = db.session.scalar(db.select(Producto.stock).where(Producto.id == id_producto))
+    assert stock_final == 0
+    assert db.session.scalar(db.select(db.func.count()).select_from(Pedido)) == stock
+    assert db.session.scalar(db.select(db.func.sum(DetallePedido.cantidad))) == stock
+
+
+def test_compras_de_varios_productos_sin_interbloqueos(app):
+    # Cada comprador lleva los mismos productos en su carrito, insertados en un orden distinto; sin un orden
+    # de bloqueo fijo, dos compras podrían esperarse mutuamente
+    stocks = [15, 12, 20]
+    ids_productos = [crear_producto(nombre=f'Producto {i}', stock=stock).id for i, stock in enumerate(stocks)]
+    ids_usuarios = []
+    for i in range(COMPRADORES):
+        id_usuario = crear_usuario(email=f'comprador{i}@ejemplo.test').id
+        orden = ids_productos[i % 3:] + ids_productos[:i % 3]
+        llenar_carrito(id_usuario, {id_producto: 1 for id_producto in orden})
+        ids_usuarios.append(id_usuario)
+    db.session.remove()
+
+    resultados = _comprar_en_paralelo(app, ids_usuarios)
+
+    # Un interbloqueo aparecería aquí como DeadlockDetected (OperationalError)
+    assert [r for r in resultados if r not in ('ok', 'sin_stock')] == []
+    # Una compra necesita una unidad de cada producto: solo caben tantas como el menor de los stocks
+    assert resultados.count('ok') == min(stocks)
+    stocks_finales = db.session.scalars(db.select(Producto.stock).order_by(Producto.id)).all()
+    assert stocks_finales == [stock - min(stocks) for stock in stocks]
+    assert min(stocks_finales) >= 0
@@ -0,0 +1,65 @@
+from decimal import Decimal
+from app import db
+from app.models import Proveedor, Producto, Pedido, DetallePedido, SugerenciaReposicion, MarcaAgua
+from app.reposicion import evaluar_reposicion, MARCA
+from tests.utilidades import crear_usuario, crear_producto, hace
+
+# Reposición: la primera pasada evalúa todo; las siguientes solo los productos que cambiaron, y el resumen
+# incremental agrupa por proveedor igual que el completo (los productos sin proveedor forman su propio grupo)
+
+
+def _preparar():
+    proveedor = Proveedor(nombre='Papeles SL')
+    db.session.add_all([proveedor, MarcaAgua(nombre=MARCA)])
+    db.session.commit()
+    ids = {
+        'con_proveedor': crear_producto(stock=2, stock_minimo=5, id_proveedor=proveedor.id).id,
+        'sin_proveedor': crear_producto(nombre='Lápiz', stock=1, stock_minimo=5).id,
+        'con_stock': crear_producto(nombre='Goma', stock=50, stock_minimo=5, id_proveedor=proveedor.id).id,
+    }
+    # 14 unidades en 28 días: medio producto al día, 11 unidades para el plazo y la cobertura (7 + 14 días)
+    pedido = Pedido(id_usuario=crear_usuario().id, fecha=hace(3), total=Decimal('49.00'))
+    db.session.add(pedido)
+    db.session.flush()
+    db.session.add(DetallePedido(id_pedido=pedido.id, id_producto=ids['con_proveedor'], cantidad=14,
+                                 precio_unitario=Decimal('3.50')))
+    db.session.commit()
+    return proveedor.id, ids
+
+
+def _sugerencias():
+    return dict(db.session.execute(db.select(SugerenciaReposicion.id_producto,
+                                             SugerenciaReposicion.cantidad_sugerida)).all())
+
+
+def _cambiar_stock(id_producto, stock):
+    db.session.get(Producto, id_producto).stock = stock
+    db.session.commit()
+
+
+def test_evaluacion_completa_e_incremental(app):
+    id_proveedor, ids = _preparar()
+
+    resultado = evaluar_reposicion(enviar=False)
+    assert resultado['evaluados'] == 2
+    assert _sugerencias() == {ids['con_proveedor']: 11 + 5 - 2, ids['sin_proveedor']: 5 - 1}
+    grupos = {resumen['id_proveedor']: resumen for resumen in resultado['resumenes']}
+    assert set(grupos) == {id_proveedor, None}
+    assert grupos[None]['proveedor'] == 'Sin proveedor'
+
+    # Sin cambios no se evalúa nada
+    assert evaluar_reposicion(enviar=False)['evaluados'] == 0
+
+    # Solo cambia el producto sin proveedor: el resumen incremental contiene solo su grupo
+    _cambiar_stock(ids['sin_proveedor'], 0)
+    resultado = evaluar_reposicion(enviar=False)
+    assert resultado['evaluados'] == 1
+    assert [resumen['id_proveedor'] for resumen in resultado['resumenes']] == [None]
+    assert [linea['cantidad_sugerida'] for linea in resultado['resumenes'][0]['lineas']] == [5]
+
+    # Un producto repuesto deja de tener sugerencia
+    _cambiar_stock(ids['con_proveedor'], 100)
+    resultado = evaluar_reposicion(enviar=False)
+    assert resultado['retirados'] == 1
+    assert resultado['resumenes'] == []
+    assert _sugerencias() == {ids['sin_proveedor']: 5}
@@ -0,0 +1,60 @@
+from decimal import Decimal
+from app import db
+from app.models import Producto, Resena
+from app.resenas import detectar_desviaciones, reconstruir_resumenes
+from tests.utilidades import crear_usuario, crear_producto
+
+# Resumen de reseñas desnormalizado en productos: el trigger lo mantiene con cada alta, cambio o baja, y
+# 'flask resenas reconciliar' lo compara con el agregado real y corrige las desviaciones
+
+
+def _resumen(id_producto):
+    producto = db.session.get(Producto, id_producto, populate_existing=True)
+    return producto.num_resenas, producto.suma_calificaciones, producto.calificacion_promedio
+
+
+def test_el_trigger_coincide_con_el_agregado_real(app):
+    id_producto = crear_producto().id
+    otro = crear_producto(nombre='Lápiz').id
+    autores = [crear_usuario(email=f'autor{i}@ejemplo.test').id for i in range(3)]
+    resenas = [Resena(id_producto=id_producto, id_usuario=autor, calificacion=calificacion)
+               for autor, calificacion in zip(autores, (5, 4, 2))]
+    db.session.add_all(resenas)
+    db.session.commit()
+    assert _resumen(id_producto) == (3, 11, Decimal('3.67'))
+
+    resenas[2].calificacion = 5
+    db.session.commit()
+    assert _resumen(id_producto) == (3, 14, Decimal('4.67'))
+
+    # Cambiar de producto descuenta del anterior y suma al nuevo
+    resenas[1].id_producto = otro
+    db.session.commit()
+    assert _resumen(id_producto) == (2, 10, Decimal('5.00'))
+    assert _resumen(otro) == (1, 4, Decimal('4.00'))
+
+    db.session.delete(resenas[0])
+    db.session.delete(resenas[2])
+    db.session.commit()
+    assert _resumen(id_producto) == (0, 0, Decimal('0.00'))
+    assert detectar_desviaciones() == []
+
+
+def test_reconciliar_corrige_las_desviaciones(app):
+    id_producto = crear_producto().id
+    sin_resenas = crear_producto(nombre='Lápiz').id
+    for i, calificacion in enumerate((3, 4)):
+        db.session.add(Resena(id_producto=id_producto, id_usuario=crear_usuario(email=f'autor{i}@ejemplo.test').id,
+                              calificacion=calificacion))
+    db.session.commit()
+    # Resúmenes desviados, por ejemplo tras una carga con los triggers desactivados
+    db.session.execute(db.update(Producto).values(num_resenas=7, suma_calificaciones=30,
+                                                  calificacion_promedio=Decimal('4.29')))
+    db.session.commit()
+
+    assert {fila['id_producto'] for fila in detectar_desviaciones()} == {id_producto, sin_resenas}
+    assert sorted(reconstruir_resumenes()) == sorted([id_producto, sin_resenas])
+
+    assert detectar_desviaciones() == []
+    assert _resumen(id_producto) == (2, 7, Decimal('3.50'))
+    assert _resumen(sin_resenas) == (0, 0, Decimal('0.00'))
@@ -0,0 +1,57 @@
+import threading
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from app import db
+from app.models import Usuario, Producto, CarritoCompras, DetalleCarrito
+
+# Datos y utilidades compartidos por las pruebas
+
+
+class ContadorSQL:
+    def __init__(self):
+        self.sentencias = 0
+        self._candado = threading.Lock()
+
+    def __call__(self, *args):
+        with self._candado:
+            self.sentencias += 1
+
+
+def hace(dias):
+    return datetime.now(timezone.utc) - timedelta(days=dias)
+
+
+def crear_usuario(email='cliente@ejemplo.test', **columnas):
+    usuario = Usuario(nombre=columnas.pop('nombre', 'Cliente'), email=email, password_hash='x',
+                      email_confirmado=columnas.pop('email_confirmado', True), **columnas)
+    db.session.add(usuario)
+    db.session.commit()
+    return usuario
+
+
+def crear_producto(nombre='Cuaderno', stock=100, precio_venta=Decimal('3.50'), **columnas):
+    producto = Producto(nombre=nombre, precio_compra=Decimal('1.00'), precio_venta=precio_venta, stock=stock,
+                        **columnas)
+    db.session.add(producto)
+    db.session.commit()
+    return producto
+
+
+def llenar_carrito(id_usuario, cantidades):
+    # cantidades: {id_producto: cantidad}
+    carrito = CarritoCompras(id_usuario=id_usuario)
+    db.session.add(carrito)
+    db.session.flush()
+    db.session.add_all([DetalleCarrito(id_carrito=carrito.id, id_producto=id_producto, cantidad=cantidad)
+                        for id_producto, cantidad in cantidades.items()])
+    db.session.commit()
+    return carrito
+
+
+def cliente_de(app, id_usuario):
+    # Cliente de pruebas con la sesión de Flask-Login ya iniciada para el usuario
+    cliente = app.test_client()
+    with cliente.session_transaction() as sesion:
+        sesion['_user_id'] = str(id_usuario)
+        sesion['_fresh'] = True
+    return cliente